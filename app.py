@@ -1,106 +1,149 @@
-from flask import Flask, render_template, request, flash, redirect, jsonify, url_for
+from flask import Flask, render_template, request, flash, redirect, jsonify, url_for, g, has_app_context
 import pandas as pd
-from werkzeug.utils import secure_filename
+import hashlib
+import json
 import os
 import sqlite3
+import profiling
+import backends
+import columnar_store
 from config import SOCIAL_INSURANCE_CONFIG  # 导入配置
+from db import get_pool
 from excel_handler import ExcelHandler
+from export_excel import EXPORT_COLUMNS, XLSX_MIMETYPE, iter_expense_chunks, stream_xlsx
+from ingest import UPLOAD_COLUMN_MAP, format_report, normalize_emp_id, upsert_expense
+from employees import DIMENSIONS, breakdown, get_dimension
+from federation import federation, load_clusters
+from jobs import job_queue
+from workbook_cache import content_digest, workbook_cache
+from preview_sessions import DEFAULT_PAGE_SIZE, preview_store
+from readers import UPLOAD_EXTENSIONS, is_supported_upload, read_table
+from migrations import migrate
+from query_cache import result_cache
+from comparison import COMPARISON_TYPES
+from periods import PeriodRange, base_range, from_period, month_range, parse_range, to_period
+from rates import DEFAULT_REGION
+from reconcile import DEFAULT_TOLERANCE, reconcile
 from datetime import datetime
 
 app = Flask(__name__)
 app.secret_key = 'your_secret_key_here'  # 用于flash消息
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['DATABASE'] = 'Cluster_Expense.db'  # 更新数据库路径
+app.config['DB_POOL_SIZE'] = 8  # 连接池最大连接数
+app.config['INGEST_CHUNK_SIZE'] = 5000  # 批量导入每块写入的行数
+app.config['EXPORT_CHUNK_SIZE'] = 5000  # 流式导出每块读取的行数
+app.config['QUERY_CACHE_MAX_ENTRIES'] = 256  # 查询结果缓存条目上限
+app.config['QUERY_CACHE_MAX_BYTES'] = 32 * 1024 * 1024  # 查询结果缓存内存上限
+app.config['WORKBOOK_CACHE_DIR'] = os.path.join(app.config['UPLOAD_FOLDER'], 'parsed')  # 解析后工作簿的缓存目录
+app.config['WORKBOOK_CACHE_MAX_BYTES'] = 256 * 1024 * 1024  # 工作簿缓存磁盘占用上限
+app.config['EXCEL_ENGINE'] = None  # Excel读取引擎：None 自动选择（calamine > openpyxl-ro）
+app.config['PROFILING'] = True  # 记录请求/查询/Excel读写耗时，/metrics 输出
+app.config['DEBUG_OUTPUT'] = os.environ.get('CLUSTER_EXPENSE_DEBUG') == '1'  # 调试输出开关
+app.config['SLOW_QUERY_SECONDS'] = 0.5  # 慢查询阈值（秒）
+app.config['SLOW_QUERY_LOG'] = 'slow_query.log'  # 慢查询日志文件
+app.config['PREVIEW_MAX_SESSIONS'] = 16  # 同时保留的预览会话数
+app.config['PREVIEW_TTL'] = 3600  # 预览会话闲置过期时间（秒）
+app.config['COLUMNAR_STORE'] = True  # 汇总/明细/对比查询使用内存列式数据
+app.config['COLUMNAR_MAX_BYTES'] = 512 * 1024 * 1024  # 列式数据内存上限，超出时回退到SQL查询
+app.config['STORAGE_BACKEND'] = backends.DEFAULT_BACKEND  # 查询后端：sqlite 或 parquet（DuckDB 查询按月分区的 Parquet）
+app.config['PARQUET_DIR'] = None  # Parquet 分区目录，None 为 <数据库名>_parquet
+app.config['CLUSTER_NAME'] = 'default'  # 本应用数据库在多集群汇总中的名称
+app.config['CLUSTERS'] = {}  # 其他集群 {集群名: 数据库路径}
+app.config['CLUSTERS_FILE'] = 'clusters.json'  # 集群列表JSON文件（存在时加载）
+app.config['FEDERATION_WORKERS'] = 8  # 多集群并行查询的线程数
+
+result_cache.configure(max_entries=app.config['QUERY_CACHE_MAX_ENTRIES'],
+                       max_bytes=app.config['QUERY_CACHE_MAX_BYTES'])
+workbook_cache.configure(directory=app.config['WORKBOOK_CACHE_DIR'],
+                         max_bytes=app.config['WORKBOOK_CACHE_MAX_BYTES'])
+preview_store.max_sessions = app.config['PREVIEW_MAX_SESSIONS']
+profiling.configure(enabled=app.config['PROFILING'], debug=app.config['DEBUG_OUTPUT'],
+                    slow_query_seconds=app.config['SLOW_QUERY_SECONDS'],
+                    slow_query_log=app.config['SLOW_QUERY_LOG'])
+preview_store.ttl = app.config['PREVIEW_TTL']
+columnar_store.configure(enabled=app.config['COLUMNAR_STORE'],
+                         max_bytes=app.config['COLUMNAR_MAX_BYTES'])
+federation.configure(max_workers=app.config['FEDERATION_WORKERS'],
+                     backend=app.config['STORAGE_BACKEND'])
+federation.register(app.config['CLUSTER_NAME'], app.config['DATABASE'], external=False)
+if os.path.exists(app.config['CLUSTERS_FILE']):
+    app.config['CLUSTERS'].update(load_clusters(app.config['CLUSTERS_FILE']))
+for cluster_name, cluster_db in app.config['CLUSTERS'].items():
+    federation.register(cluster_name, cluster_db)
 
 # 确保上传文件夹存在
 if not os.path.exists(app.config['UPLOAD_FOLDER']):
     os.makedirs(app.config['UPLOAD_FOLDER'])
 
 def get_db_connection():
-    """创建数据库连接"""
-    conn = sqlite3.connect(app.config['DATABASE'])
-    conn.row_factory = sqlite3.Row  # 这样可以通过列名访问数据
-    return conn
+    """获取数据库连接
+
+    请求内复用同一个连接池连接（请求结束时归还），
+    请求之外每次从连接池取出，调用 close() 归还。
+    """
+    pool = get_pool(app.config['DATABASE'], max_size=app.config['DB_POOL_SIZE'])
+    if not has_app_context():
+        return pool.acquire()
+    if 'db' not in g:
+        g.db = pool.acquire()
+    return g.db.borrow()
+
+@app.teardown_appcontext
+def release_db_connection(exception):
+    """请求结束时把连接归还到连接池"""
+    conn = g.pop('db', None)
+    if conn is not None:
+        conn.close()
+
+@app.before_request
+def start_profiling():
+    profiling.start_request()
+
+@app.after_request
+def finish_profiling(response):
+    """记录路由耗时，把本次请求的查询/Excel读写汇总写入 Server-Timing 响应头"""
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    seconds, spans = profiling.finish_request(route, request.method, str(response.status_code))
+    if profiling.enabled():
+        response.headers['Server-Timing'] = profiling.server_timing(seconds, spans)
+    profiling.debug('%s %s %d: %.2fms, %d spans', request.method, route,
+                    response.status_code, seconds * 1000, len(spans))
+    return response
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus 文本格式的路由、查询、Excel读写耗时直方图和行数计数"""
+    return app.response_class(profiling.metrics.render(),
+                              mimetype='text/plain; version=0.0.4; charset=utf-8')
 
 def init_db():
-    """初始化数据库表"""
+    """初始化数据库表（执行未完成的结构迁移）"""
     conn = get_db_connection()
-    c = conn.cursor()
-    
-    # 创建expense表
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS expense (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            emp_id TEXT NOT NULL,           -- 员工ID（5位字符）
-            year INTEGER NOT NULL,          -- 年份
-            month INTEGER NOT NULL,         -- 月份
-            SAL REAL NOT NULL,             -- 工资
-            HF REAL NOT NULL,              -- Housing Fund（住房公积金）
-            PEN REAL NOT NULL,             -- Pension（养老保险）
-            UEM REAL NOT NULL,             -- Unemployment（失业保险）
-            MED1 REAL NOT NULL,            -- Medical Insurance 1（医疗保险1）
-            MED2 REAL NOT NULL,            -- Medical Insurance 2（医疗保险2）
-            INJ REAL NOT NULL,             -- Injury Insurance（工伤保险）
-            UF REAL NOT NULL              -- Union Fee（工会经费）
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    try:
+        migrate(conn)
+    finally:
+        conn.close()
 
 # 在应用启动时初始化数据库
 init_db()
 
+def get_backend():
+    """当前配置的查询后端（backends.py），写入始终经由 SQLite"""
+    return backends.get_backend(app.config['STORAGE_BACKEND'], app.config['DATABASE'],
+                                get_db_connection, app.config['PARQUET_DIR'])
+
+def query_monthly_summary():
+    """查询月度汇总（不经过缓存）"""
+    return get_backend().monthly_summary()
+
 def get_monthly_summary():
-    """获取按月份汇总的费用数据"""
+    """获取按月份汇总的费用数据（读取增量维护的monthly_summary表，结果缓存）"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        query = """
-        SELECT 
-            year,
-            month,
-            ROUND(SUM(SAL), 2) as total_salary,
-            ROUND(SUM(PEN), 2) as total_pension,
-            ROUND(SUM(MED1 + MED2), 2) as total_medical,
-            ROUND(SUM(INJ), 2) as total_injury,
-            ROUND(SUM(UEM), 2) as total_unemployment,
-            ROUND(SUM(HF), 2) as total_hf,
-            ROUND(SUM(UF), 2) as total_union_fee,
-            ROUND(SUM(HF + PEN + UEM + MED1 + MED2 + INJ), 2) as total_insurance,
-            ROUND(SUM(SAL + HF + PEN + UEM + MED1 + MED2 + INJ + UF), 2) as grand_total
-        FROM expense
-        GROUP BY year, month
-        ORDER BY year DESC, month DESC;
-        """
-        
-        cursor.execute(query)
-        results = cursor.fetchall()
-        
-        # Convert results to list of dictionaries for easier handling
-        formatted_results = []
-        for row in results:
-            formatted_results.append({
-                'year': row[0],
-                'month': row[1],
-                'total_salary': float(row[2]) if row[2] is not None else 0.0,
-                'total_pension': float(row[3]) if row[3] is not None else 0.0,
-                'total_medical': float(row[4]) if row[4] is not None else 0.0,
-                'total_injury': float(row[5]) if row[5] is not None else 0.0,
-                'total_unemployment': float(row[6]) if row[6] is not None else 0.0,
-                'total_hf': float(row[7]) if row[7] is not None else 0.0,
-                'total_union_fee': float(row[8]) if row[8] is not None else 0.0,
-                'total_insurance': float(row[9]) if row[9] is not None else 0.0,
-                'grand_total': float(row[10]) if row[10] is not None else 0.0
-            })
-            
-        return formatted_results
+        return result_cache.get_or_compute(('monthly_summary',), query_monthly_summary)
     except Exception as e:
-        print(f"Error in get_monthly_summary: {str(e)}")
+        app.logger.error(f"Error in get_monthly_summary: {str(e)}")
         return []
-    finally:
-        conn.close()
 
 def check_db_content():
     """Check if there's any data in the expense table"""
@@ -114,24 +157,22 @@ def check_db_content():
     return count, sample
 
 def get_prev_month(year, month):
-    if month == 1:
-        return year - 1, 12
-    return year, month - 1
+    return from_period(to_period(year, month) - 1)
 
 @app.route('/')
 def index():
-    print("Rendering index.html")  # Debugging statement
+    profiling.debug("Rendering index.html")
     
     try:
-        # Check database content
-        row_count, sample_row = check_db_content()
-        print(f"Database has {row_count} rows")
-        if sample_row:
-            print("Sample row:", dict(sample_row))
+        # 检查数据库内容（只在开启调试输出时查询）
+        if profiling.debug_enabled():
+            row_count, sample_row = check_db_content()
+            profiling.debug("Database has %d rows, sample row: %s", row_count,
+                            dict(sample_row) if sample_row else None)
         
         # Get monthly summary data from database
         monthly_data = get_monthly_summary()
-        print("Monthly data:", monthly_data)  # Debug print
+        profiling.debug("Monthly data: %d months", len(monthly_data))
         
         # Initialize lists for labels and data
         trend_labels = []
@@ -141,7 +182,6 @@ def index():
         
         # Process the monthly data
         for row in monthly_data:
-            print("Processing row:", row)  # Debug print
             # Create label in format "YYYY-MM"
             label = f"{row['year']}-{row['month']:02d}"
             trend_labels.append(label)
@@ -157,10 +197,7 @@ def index():
             total_salary_data.append(total_salary)
             total_insurance_data.append(total_insurance)
         
-        print("Labels:", trend_labels)  # Debug print
-        print("Total amount data:", total_amount_data)  # Debug print
-        print("Total salary data:", total_salary_data)  # Debug print
-        print("Total insurance data:", total_insurance_data)  # Debug print
+        profiling.debug("Labels: %s", trend_labels)
         
         # Structure the data as expected by the template
         trend_values = {
@@ -175,7 +212,7 @@ def index():
                              trend_values=trend_values)
     
     except Exception as e:
-        print(f"Error in index route: {str(e)}")  # Debug print
+        app.logger.error(f"Error in index route: {str(e)}")
         # Return empty data in case of error
         return render_template('index.html', 
                              monthly_data=[],
@@ -196,59 +233,28 @@ def upload_file():
             flash('没有选择文件')
             return redirect(request.url)
         
-        if file and file.filename.endswith('.xlsx'):
-            filename = secure_filename(file.filename)
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
-            
-            try:
-                # 读取Excel文件
-                df = pd.read_excel(filepath)
-                
-                # 获取数据库连接
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                
-                # 清空现有数据
-                cursor.execute("DELETE FROM expense")
-                
-                # 处理每一行数据
-                for index, row in df.iterrows():
-                    # 假设Excel表格的列名与数据库字段对应
-                    cursor.execute("""
-                        INSERT INTO expense (
-                            emp_id, year, month, 
-                            SAL, HF, PEN, UEM, 
-                            MED1, MED2, INJ, UF
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        str(row['员工ID']),
-                        int(row['年份']),
-                        int(row['月份']),
-                        float(row['工资总额']),
-                        float(row['住房公积金']),
-                        float(row['养老保险']),
-                        float(row['失业保险']),
-                        float(row['医疗保险1']),
-                        float(row['医疗保险2']),
-                        float(row['工伤保险']),
-                        float(row['工会经费'])
-                    ))
-                
-                conn.commit()
-                conn.close()
-                
-                flash('文件上传成功并已处理数据')
-            except Exception as e:
-                flash(f'处理文件时出错: {str(e)}')
-            finally:
-                # 删除上传的文件
-                if os.path.exists(filepath):
-                    os.remove(filepath)
-            
+        if file and is_supported_upload(file.filename):
+            data = file.read()
+            digest = content_digest(data)
+            wants_json = request.accept_mimetypes.best == 'application/json'
+
+            # 与上次导入的文件内容相同且之后数据没有变化，直接返回
+            if workbook_cache.is_imported(digest, result_cache.data_version):
+                if wants_json:
+                    return jsonify({'state': 'unchanged', 'digest': digest})
+                flash('文件内容与上次导入的相同，数据无变化')
+                return redirect(url_for('index'))
+
+            # 解析和写入交给后台任务，请求立即返回任务ID
+            job = job_queue.submit(f'upload {file.filename}',
+                                   lambda job: run_upload_job(job, data, digest, file.filename))
+            if wants_json:
+                return jsonify(job_queue.status(job.id)), 202, {
+                    'Location': url_for('get_job', job_id=job.id)}
+            flash(f'文件已提交后台导入，任务ID: {job.id}（进度见 /jobs/{job.id}）')
             return redirect(url_for('index'))
         else:
-            flash('只允许上传.xlsx格式的文件')
+            flash(f"只允许上传{'/'.join(UPLOAD_EXTENSIONS)}格式的文件")
             return redirect(request.url)
     
     # 获取月度汇总数据
@@ -262,135 +268,66 @@ def upload_file():
                          trend_labels=trend_data['labels'],
                          trend_values=trend_data['values'])
 
+def read_workbook(data, digest, filename=None):
+    """解析上传的文件（Excel 第一个工作表 / CSV / Parquet），同一内容只解析一次"""
+    return workbook_cache.get_or_parse(digest, lambda: read_table(
+        data, filename=filename, engine=app.config['EXCEL_ENGINE']))
+
+def run_upload_job(job, data, digest, filename=None):
+    """后台导入任务：解析上传文件、增量写入expense并对账"""
+    job.update(stage='parsing')
+    df = read_workbook(data, digest, filename)
+    job.update(stage='parsed', rows_read=len(df))
+
+    # 增量导入：只写入文件覆盖月份中新增、变化和已删除的行
+    conn = get_db_connection()
+    try:
+        report = upsert_expense(
+            conn, df,
+            column_map=UPLOAD_COLUMN_MAP,
+            chunk_size=app.config['INGEST_CHUNK_SIZE'],
+            progress=job.track
+        )
+        # 记录导入完成时的数据版本，之后重复上传同一文件可直接判定无变化
+        workbook_cache.mark_imported(digest, result_cache.data_version)
+        # 每次导入后按费率表对账有变化的月份
+        mismatches = 0
+        if report['periods']:
+            job.update(stage='reconciling')
+            changed = parse_range(f"{report['periods'][0]}:{report['periods'][-1]}")
+            mismatches = reconcile(conn, changed, limit=0)['mismatches']
+    finally:
+        conn.close()
+    job.update(stage='done')
+    return {'report': report, 'summary': format_report(report), 'mismatches': mismatches}
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    """后台导入任务的状态与进度"""
+    status = job_queue.status(job_id)
+    if status is None:
+        return {'error': f'任务不存在: {job_id}'}, 404
+    return jsonify(status)
+
+def get_monthly_detail(year, month):
+    """获取员工当月与上月的费用对比明细及合计"""
+    # Get previous month
+    prev_year, prev_month = get_prev_month(year, month)
+    
+    # 一次查询得到两个月份的对比明细与合计（包含上月在、本月已离职的员工）
+    return get_backend().compare_months(year, month, prev_year, prev_month)
+
 @app.route('/monthly_detail/<int:year>/<int:month>')
 def monthly_detail_page(year, month):
+    # Get previous month
+    prev_year, prev_month = get_prev_month(year, month)
+    
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get previous month
-        prev_year, prev_month = get_prev_month(year, month)
-        
-        # Get employee details for both current and previous month
-        query = """
-        WITH current_month AS (
-            SELECT 
-                emp_id,
-                SAL as salary,
-                PEN as pension,
-                MED1 + MED2 as medical,
-                INJ as injury,
-                UEM as unemployment,
-                HF as housing_fund,
-                UF as union_fee,
-                SAL + PEN + MED1 + MED2 + INJ + UEM + HF + UF as total
-            FROM expense
-            WHERE year = ? AND month = ?
-        ),
-        prev_month AS (
-            SELECT 
-                emp_id,
-                SAL as salary,
-                PEN as pension,
-                MED1 + MED2 as medical,
-                INJ as injury,
-                UEM as unemployment,
-                HF as housing_fund,
-                UF as union_fee,
-                SAL + PEN + MED1 + MED2 + INJ + UEM + HF + UF as total
-            FROM expense
-            WHERE year = ? AND month = ?
+        employee_data, totals = result_cache.get_or_compute(
+            ('monthly_detail', year, month),
+            lambda: get_monthly_detail(year, month),
+            periods=[(year, month), (prev_year, prev_month)]
         )
-        SELECT 
-            c.emp_id,
-            c.salary as curr_salary,
-            p.salary as prev_salary,
-            c.pension as curr_pension,
-            p.pension as prev_pension,
-            c.medical as curr_medical,
-            p.medical as prev_medical,
-            c.injury as curr_injury,
-            p.injury as prev_injury,
-            c.unemployment as curr_unemployment,
-            p.unemployment as prev_unemployment,
-            c.housing_fund as curr_housing_fund,
-            p.housing_fund as prev_housing_fund,
-            c.union_fee as curr_union_fee,
-            p.union_fee as prev_union_fee,
-            c.total as curr_total,
-            p.total as prev_total
-        FROM current_month c
-        LEFT JOIN prev_month p ON c.emp_id = p.emp_id
-        ORDER BY c.emp_id
-        """
-        
-        cursor.execute(query, (year, month, prev_year, prev_month))
-        results = cursor.fetchall()
-        
-        # Convert results to list of dictionaries with comparison data
-        employee_data = []
-        for row in results:
-            emp_data = {
-                'emp_id': row[0],
-                'salary': {
-                    'current': float(row[1]) if row[1] is not None else 0.0,
-                    'previous': float(row[2]) if row[2] is not None else 0.0
-                },
-                'pension': {
-                    'current': float(row[3]) if row[3] is not None else 0.0,
-                    'previous': float(row[4]) if row[4] is not None else 0.0
-                },
-                'medical': {
-                    'current': float(row[5]) if row[5] is not None else 0.0,
-                    'previous': float(row[6]) if row[6] is not None else 0.0
-                },
-                'injury': {
-                    'current': float(row[7]) if row[7] is not None else 0.0,
-                    'previous': float(row[8]) if row[8] is not None else 0.0
-                },
-                'unemployment': {
-                    'current': float(row[9]) if row[9] is not None else 0.0,
-                    'previous': float(row[10]) if row[10] is not None else 0.0
-                },
-                'housing_fund': {
-                    'current': float(row[11]) if row[11] is not None else 0.0,
-                    'previous': float(row[12]) if row[12] is not None else 0.0
-                },
-                'union_fee': {
-                    'current': float(row[13]) if row[13] is not None else 0.0,
-                    'previous': float(row[14]) if row[14] is not None else 0.0
-                },
-                'total': {
-                    'current': float(row[15]) if row[15] is not None else 0.0,
-                    'previous': float(row[16]) if row[16] is not None else 0.0
-                }
-            }
-            
-            # Calculate changes
-            for key in ['salary', 'pension', 'medical', 'injury', 'unemployment', 'housing_fund', 'union_fee', 'total']:
-                current = emp_data[key]['current']
-                previous = emp_data[key]['previous']
-                emp_data[key]['change'] = current - previous
-                emp_data[key]['change_rate'] = (current - previous) / previous * 100 if previous != 0 else 0
-            
-            employee_data.append(emp_data)
-        
-        # Calculate totals
-        totals = {
-            'current': {},
-            'previous': {},
-            'change': {},
-            'change_rate': {}
-        }
-        
-        for key in ['salary', 'pension', 'medical', 'injury', 'unemployment', 'housing_fund', 'union_fee', 'total']:
-            curr_sum = sum(emp[key]['current'] for emp in employee_data)
-            prev_sum = sum(emp[key]['previous'] for emp in employee_data)
-            totals['current'][key] = curr_sum
-            totals['previous'][key] = prev_sum
-            totals['change'][key] = curr_sum - prev_sum
-            totals['change_rate'][key] = (curr_sum - prev_sum) / prev_sum * 100 if prev_sum != 0 else 0
-        
         return render_template('monthly_detail.html',
                              year=year,
                              month=month,
@@ -400,7 +337,7 @@ def monthly_detail_page(year, month):
                              totals=totals)
     
     except Exception as e:
-        print(f"Error in monthly_detail_page: {str(e)}")
+        app.logger.error(f"Error in monthly_detail_page: {str(e)}")
         return render_template('monthly_detail.html',
                              year=year,
                              month=month,
@@ -408,79 +345,269 @@ def monthly_detail_page(year, month):
                              prev_month=prev_month,
                              employee_data=[],
                              totals={})
-    finally:
-        conn.close()
+
+@app.route('/monthly_detail/<int:year>/<int:month>/reconciliation')
+@app.route('/api/reconciliation')
+def get_reconciliation(year=None, month=None):
+    """按费率表重算缴费并与导入金额对账
+
+    月度路由对账当月；/api/reconciliation 的 range 参数为期间区间（不传为全部数据）。
+    其他参数：tolerance 容差（默认0.01）、region 地区、limit 差异明细条数（默认200）。
+    """
+    try:
+        if year is not None:
+            period_range = month_range(year, month)
+        elif request.args.get('range'):
+            period_range = parse_range(request.args.get('range'))
+        else:
+            period_range = None
+        tolerance = request.args.get('tolerance', DEFAULT_TOLERANCE, type=float)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    region = request.args.get('region', DEFAULT_REGION)
+    limit = request.args.get('limit', 200, type=int)
+
+    def compute():
+        conn = get_db_connection()
+        try:
+            return reconcile(conn, period_range, tolerance, region, limit)
+        finally:
+            conn.close()
+
+    data = result_cache.get_or_compute(
+        ('reconciliation', period_range, tolerance, region, limit),
+        compute,
+        periods=period_range.year_months() if period_range is not None else None
+    )
+    return jsonify(data)
+
+def get_comparison_columns(year, month, prev_year, prev_month):
+    """全部费用类型当月与上月的员工对比数据（列式结构，结果缓存）"""
+    return result_cache.get_or_compute(
+        ('employee_comparison', year, month),
+        lambda: get_backend().compare_expense_types(year, month, prev_year, prev_month),
+        periods=[(year, month), (prev_year, prev_month)]
+    )
 
 @app.route('/api/employee_comparison/<int:year>/<int:month>/<string:expense_type>')
 def get_employee_comparison_by_type(year, month, expense_type):
     """获取特定费用类型的员工对比数据"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
     # 计算上个月的年份和月份
-    prev_month = month - 1
-    prev_year = year
-    if prev_month == 0:
-        prev_month = 12
-        prev_year = year - 1
-    
-    # 映射费用类型到数据库字段
-    field_map = {
-        'salary': 'SAL',
-        'housing_fund': 'HF',
-        'pension': 'PEN',
-        'unemployment': 'UEM',
-        'medical': 'MED1 + MED2',
-        'injury': 'INJ',
-        'total': 'SAL + HF + PEN + UEM + MED1 + MED2 + INJ'
-    }
+    prev_year, prev_month = get_prev_month(year, month)
     
-    if expense_type not in field_map:
+    if expense_type not in COMPARISON_TYPES:
         return {'error': '无效的费用类型'}, 400
     
-    field = field_map[expense_type]
-    
-    # 分别查询当前月和上月的数据
-    current_query = f"""
-    SELECT 
-        emp_id,
-        {field} as amount
-    FROM expense
-    WHERE year = ? AND month = ?
+    # 与批量接口共用同一次查询的结果
+    columns = get_comparison_columns(year, month, prev_year, prev_month)
+    values = columns['types'][expense_type]
+    comparison_data = [
+        {
+            'emp_id': emp_id,
+            'current': values['current'][i],
+            'previous': values['previous'][i],
+            'change': values['change'][i],
+            'change_rate': values['change_rate'][i]
+        }
+        for i, emp_id in enumerate(columns['emp_id'])
+    ]
+    return jsonify({'data': comparison_data})
+
+@app.route('/api/employee_comparison/<int:year>/<int:month>')
+def get_employee_comparison_batch(year, month):
+    """一次返回全部（或 ?types=a,b 指定的）费用类型的员工对比数据
+
+    响应为列式结构：emp_id 数组与每个类型的 current/previous/change/change_rate
+    数组按位置对应。支持 ETag，数据未变化时对 If-None-Match 返回304。
     """
+    prev_year, prev_month = get_prev_month(year, month)
     
-    prev_query = f"""
-    SELECT 
-        emp_id,
-        {field} as amount
-    FROM expense
-    WHERE year = ? AND month = ?
-    """
+    types_arg = request.args.get('types')
+    types = [t for t in types_arg.split(',') if t] if types_arg else COMPARISON_TYPES
+    invalid = [t for t in types if t not in COMPARISON_TYPES]
+    if invalid:
+        return {'error': f"无效的费用类型: {', '.join(invalid)}"}, 400
     
-    current_data = {row['emp_id']: float(row['amount']) for row in cursor.execute(current_query, (year, month)).fetchall()}
-    prev_data = {row['emp_id']: float(row['amount']) for row in cursor.execute(prev_query, (prev_year, prev_month)).fetchall()}
+    def compute():
+        columns = get_comparison_columns(year, month, prev_year, prev_month)
+        payload = {
+            'year': year,
+            'month': month,
+            'prev_year': prev_year,
+            'prev_month': prev_month,
+            'emp_id': columns['emp_id'],
+            'types': {t: columns['types'][t] for t in types}
+        }
+        body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        return body, hashlib.sha1(body).hexdigest()
     
-    # 合并所有员工ID
-    all_emp_ids = set(list(current_data.keys()) + list(prev_data.keys()))
+    body, etag = result_cache.get_or_compute(
+        ('employee_comparison_batch', year, month, tuple(types)),
+        compute,
+        periods=[(year, month), (prev_year, prev_month)]
+    )
     
-    # 计算每个员工的费用变化
-    comparison_data = []
-    for emp_id in sorted(all_emp_ids):
-        curr = current_data.get(emp_id, 0.0)
-        prev = prev_data.get(emp_id, 0.0)
-        change = curr - prev
-        change_rate = ((curr - prev) / prev * 100) if prev != 0 else 100 if curr > 0 else 0
-        
-        comparison_data.append({
-            'emp_id': emp_id,
-            'current': curr,
-            'previous': prev,
-            'change': change,
-            'change_rate': change_rate
-        })
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response
+
+@app.route('/api/period_comparison')
+def get_period_comparison():
+    """任意两个期间区间按员工、费用代码对比
+
+    参数：current 为当前区间（写法见 periods.parse_range），
+    base 为基期区间；不传 base 时按 compare=previous（环比，默认）
+    或 compare=year_ago（同比）由当前区间推算。
+    """
+    try:
+        current = parse_range(request.args.get('current'))
+        if request.args.get('base'):
+            base = parse_range(request.args.get('base'))
+        else:
+            base = base_range(current, request.args.get('compare', 'previous'))
+    except ValueError as e:
+        return {'error': str(e)}, 400
     
-    conn.close()
-    return jsonify({'data': comparison_data})
+    data = result_cache.get_or_compute(
+        ('period_comparison', current, base),
+        lambda: get_backend().compare_ranges(current, base),
+        periods=current.year_months() + base.year_months()
+    )
+    return jsonify(data)
+
+@app.route('/api/trend')
+def get_trend():
+    """月度费用趋势及滚动合计
+
+    参数：range 为展示区间（如 R24@2024-12、2023-01:2024-12），
+    window 为滚动月数（默认12）。数据来自月度汇总表。
+    """
+    try:
+        period_range = parse_range(request.args.get('range'))
+        window = request.args.get('window', 12, type=int)
+        if window < 1:
+            raise ValueError(f'滚动月数必须大于0: {window}')
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    
+    data = result_cache.get_or_compute(
+        ('trend', period_range, window),
+        lambda: get_backend().rolling_trend(period_range, window),
+        periods=PeriodRange(period_range.start - window + 1, period_range.end).year_months()
+    )
+    return jsonify(data)
+
+@app.route('/api/breakdown/<dimension>')
+def get_breakdown(dimension):
+    """按职级(level)、工龄段(tenure)、入职年份(cohort)分组的费用合计
+
+    参数：range 为期间区间（如 2024-06、2024Q1、R12@2024-12）。
+    员工属性来自内存中的 emp_info 维度，表变化后自动刷新。
+    """
+    if dimension not in DIMENSIONS:
+        return {'error': f'无效的分组维度: {dimension}'}, 400
+    try:
+        period_range = parse_range(request.args.get('range'))
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    
+    conn = get_db_connection()
+    try:
+        version = get_dimension(conn).version
+        data = result_cache.get_or_compute(
+            ('breakdown', dimension, period_range, version),
+            lambda: breakdown(conn, dimension, period_range),
+            periods=period_range.year_months()
+        )
+    finally:
+        conn.close()
+    return jsonify(data)
+
+@app.route('/api/cache_stats')
+def cache_stats():
+    """查询结果缓存的命中统计"""
+    return jsonify(result_cache.stats())
+
+@app.route('/api/store_stats')
+def columnar_store_stats():
+    """内存列式数据的加载状态与内存占用，以及当前查询后端的统计"""
+    return jsonify(dict(columnar_store.store_stats(), backend=get_backend().stats()))
+
+def requested_clusters():
+    """?clusters=a,b 指定的集群，不传为全部"""
+    names = request.args.get('clusters')
+    return [name for name in names.split(',') if name] if names else None
+
+@app.route('/api/clusters')
+def list_clusters():
+    """已注册的集群"""
+    return jsonify(federation.stats())
+
+@app.route('/api/federation/summary')
+def federation_summary():
+    """各集群并行计算的月度汇总及合计"""
+    try:
+        return jsonify(federation.monthly_summary(requested_clusters()))
+    except ValueError as e:
+        return {'error': str(e)}, 400
+
+@app.route('/api/federation/period_comparison')
+def federation_period_comparison():
+    """各集群区间对比合计及整体合计
+
+    参数同 /api/period_comparison；clusters 指定集群，detail=1 时附带按集群拼接的员工明细。
+    """
+    try:
+        current = parse_range(request.args.get('current'))
+        if request.args.get('base'):
+            base = parse_range(request.args.get('base'))
+        else:
+            base = base_range(current, request.args.get('compare', 'previous'))
+        return jsonify(federation.compare_ranges(current, base, requested_clusters(),
+                                                 detail=request.args.get('detail') == '1'))
+    except ValueError as e:
+        return {'error': str(e)}, 400
+
+@app.route('/api/federation/employee_comparison/<int:year>/<int:month>')
+def federation_employee_comparison(year, month):
+    """各集群当月与上月的员工对比数据，按集群拼接（cluster 列与 emp_id 按位置对应）"""
+    prev_year, prev_month = get_prev_month(year, month)
+    try:
+        return jsonify(federation.compare_expense_types(year, month, prev_year, prev_month,
+                                                        requested_clusters()))
+    except ValueError as e:
+        return {'error': str(e)}, 400
+
+@app.route('/export')
+def export_expense_xlsx():
+    """流式导出费用明细为xlsx
+
+    参数：range 为期间区间（写法见 periods.parse_range，不传则导出全部），
+    emp_id 为逗号分隔的员工ID。按块读取并边生成边发送，内存占用与行数无关。
+    """
+    try:
+        period_range = parse_range(request.args['range']) if request.args.get('range') else None
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    emp_ids = [e.strip().zfill(5) for e in request.args.get('emp_id', '').split(',') if e.strip()]
+
+    def generate():
+        # 响应体在请求上下文结束后才生成完，单独占用一个连接直到发送完毕
+        conn = get_pool(app.config['DATABASE'], max_size=app.config['DB_POOL_SIZE']).acquire()
+        try:
+            chunks = iter_expense_chunks(conn, period_range, emp_ids,
+                                         chunk_size=app.config['EXPORT_CHUNK_SIZE'])
+            yield from stream_xlsx(EXPORT_COLUMNS, chunks)
+        finally:
+            conn.close()
+
+    suffix = period_range.label.replace(':', '_') if period_range else 'all'
+    response = app.response_class(generate(), mimetype=XLSX_MIMETYPE)
+    response.headers['Content-Disposition'] = f'attachment; filename=expense_{suffix}.xlsx'
+    return response
 
 def monthly_detail(year, month):
     """月度详情页面"""
@@ -548,53 +675,81 @@ def preview_excel():
         flash('No selected file')
         return redirect(request.url)
     
-    if file and file.filename.endswith('.xlsx'):
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
+    if file and is_supported_upload(file.filename):
+        data = file.read()
         try:
-            df = pd.read_excel(filepath)
-            # Convert emp_id to 5-digit string with leading zeros
-            df['emp_id'] = df['emp_id'].astype(str).str.zfill(5)
-            # Convert DataFrame to list of dictionaries for template rendering
-            records = df.to_dict('records')
-            return render_template('preview_excel.html', records=records, columns=df.columns.tolist())
+            # 与随后的 /upload 共用解析缓存，同一文件只解析一次
+            digest = content_digest(data)
+            df = read_workbook(data, digest, file.filename).rename(columns=UPLOAD_COLUMN_MAP)
+            if 'emp_id' in df.columns:
+                df['emp_id'] = normalize_emp_id(df['emp_id'])
+            # 数据保留在服务端，页面只渲染第一页，翻页/排序/过滤走 /api/preview/<session_id>
+            session = preview_store.create(df, filename=file.filename, digest=digest)
+            first_page = session.page(size=DEFAULT_PAGE_SIZE)
+            if request.accept_mimetypes.best == 'application/json':
+                return jsonify(first_page)
+            return render_template('preview_excel.html', session_id=session.id,
+                                   records=first_page['rows'], columns=first_page['columns'],
+                                   total=first_page['total'], pages=first_page['pages'])
         except Exception as e:
             flash(f'Error reading Excel file: {str(e)}')
             return redirect(url_for('index'))
     else:
-        flash('Please upload an Excel file')
+        flash(f"Please upload an Excel/CSV/Parquet file ({', '.join(UPLOAD_EXTENSIONS)})")
         return redirect(url_for('index'))
 
+@app.route('/api/preview/<session_id>')
+def get_preview_page(session_id):
+    """预览分页：?page=1&size=50&sort=SAL&order=desc&filter=month>=3&filter=emp_id~001"""
+    session = preview_store.get(session_id)
+    if session is None:
+        return jsonify({'error': '预览会话不存在或已过期'}), 404
+    try:
+        return jsonify(session.page(page=request.args.get('page', 1, type=int),
+                                    size=request.args.get('size', DEFAULT_PAGE_SIZE, type=int),
+                                    sort=request.args.get('sort') or None,
+                                    descending=request.args.get('order') == 'desc',
+                                    filters=request.args.getlist('filter')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+def selected_preview_rows(session, payload):
+    """按请求中的 ranges（行号闭区间）或 filters（过滤条件）从预览会话中取出要导入的行"""
+    if payload.get('ranges') is not None:
+        rows = session.select_ranges(payload['ranges'])
+    elif payload.get('filters') is not None:
+        rows = session.select(payload['filters'])
+    else:
+        raise ValueError('请提供 ranges 或 filters')
+    return session.frame(rows)
+
 @app.route('/import_selected', methods=['POST'])
 def import_selected():
+    """导入选中的记录
+
+    请求体为 {'session_id': ..., 'ranges': [[0, 99], ...]} 或 {'session_id': ..., 'filters': [...]}
+    时直接导入服务端保存的预览数据；兼容旧的 {'selected_records': [...]}。
+    """
     try:
-        selected_records = request.json.get('selected_records', [])
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        for record in selected_records:
-            cursor.execute('''
-                INSERT INTO expense (emp_id, year, month, SAL, HF, PEN, UEM, MED1, MED2, INJ, UF)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                record['emp_id'],
-                record['year'],
-                record['month'],
-                record['SAL'],
-                record['HF'],
-                record['PEN'],
-                record['UEM'],
-                record['MED1'],
-                record['MED2'],
-                record['INJ'],
-                record['UF']
-            ))
-        
-        conn.commit()
-        conn.close()
-        return jsonify({'success': True, 'message': '选中的记录已成功导入'})
+        payload = request.json or {}
+        if payload.get('session_id'):
+            session = preview_store.get(payload['session_id'])
+            if session is None:
+                return jsonify({'success': False, 'message': '预览会话不存在或已过期'}), 404
+            selected = selected_preview_rows(session, payload)
+        else:
+            selected = pd.DataFrame(payload.get('selected_records', []))
+        report = None
+        if len(selected):
+            conn = get_db_connection()
+            try:
+                # 只写入选中的记录，不删除同月份中未选中的已有数据
+                report = upsert_expense(conn, selected, delete_missing=False,
+                                        chunk_size=app.config['INGEST_CHUNK_SIZE'])
+            finally:
+                conn.close()
+        return jsonify({'success': True, 'message': f'选中的 {len(selected)} 条记录已成功导入',
+                        'report': report})
     except Exception as e:
         return jsonify({'success': False, 'message': f'导入失败: {str(e)}'})
 
@@ -0,0 +1,371 @@
+"""查询后端
+
+app.py 的月度汇总、月度明细、员工对比、区间对比和趋势查询经由后端执行，
+两种实现返回完全相同的结构：
+- SqliteBackend（默认）：直接查询 SQLite，可用时由内存列式数据（columnar_store）应答
+- ParquetBackend：历史数据按月分区保存为 Parquet 文件（<目录>/year=YYYY/month=M/data.parquet），
+  用嵌入式 DuckDB 查询；SQLite 仍是唯一的写入路径，导入提交后
+  result_cache.invalidate() 通知涉及的月份，下次查询前只重写这些分区
+
+用法: python backends.py [--db Cluster_Expense.db] [--dir 分区目录]   同步全部分区并输出统计
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import pandas as pd
+import columnar_store
+import profiling
+from comparison import compare_expense_types, compare_months
+from ingest import AMOUNT_FIELDS
+from periods import compare_ranges, rolling_trend
+from queries import DUCKDB_QUERIES, MONTHLY_SUMMARY_ROLLUP_SQL, MONTHLY_SUMMARY_SELECT
+from query_cache import result_cache
+
+BACKENDS = ['sqlite', 'parquet']
+DEFAULT_BACKEND = 'sqlite'
+MANIFEST = 'manifest.json'
+
+SUMMARY_COLUMNS = ['total_salary', 'total_pension', 'total_medical', 'total_injury',
+                   'total_unemployment', 'total_hf', 'total_union_fee', 'total_insurance',
+                   'grand_total']
+
+PARTITION_SQL = (f"SELECT emp_id, {', '.join(AMOUNT_FIELDS)} FROM expense "
+                 f"WHERE year = ? AND month = ? ORDER BY emp_id")
+# 每个月份的行数与金额合计，用于判断已有分区是否与 SQLite 一致
+_FINGERPRINT_COLUMNS = f"COUNT(*), {', '.join(f'TOTAL({field})' for field in AMOUNT_FIELDS)}"
+PARTITION_FINGERPRINT_SQL = f"SELECT year, month, {_FINGERPRINT_COLUMNS} FROM expense GROUP BY year, month"
+PERIOD_FINGERPRINT_SQL = f"SELECT {_FINGERPRINT_COLUMNS} FROM expense WHERE year = ? AND month = ?"
+
+_PARAM_RE = re.compile(r'(?<![:\w]):(\w+)')
+
+
+def fetch_monthly_summary(conn):
+    """读取增量维护的 monthly_summary 表，按月份倒序"""
+    cursor = conn.execute(MONTHLY_SUMMARY_ROLLUP_SQL)
+    result = []
+    for row in cursor.fetchall():
+        item = {'year': int(row[0]), 'month': int(row[1])}
+        for name, value in zip(SUMMARY_COLUMNS, row[2:]):
+            item[name] = float(value) if value is not None else 0.0
+        result.append(item)
+    return result
+
+
+class SqliteBackend:
+    """默认后端：查询 SQLite；内存列式数据可用时直接由其应答
+
+    connect: 返回连接的函数，连接 close() 时归还（app.get_db_connection）。
+    """
+    name = 'sqlite'
+
+    def __init__(self, connect, database=None):
+        self.connect = connect
+        self.database = database
+
+    def mark_dirty(self, periods=None):
+        """其他进程写入了数据库：内存列式数据随之刷新（本进程的导入已由 result_cache 通知）"""
+        if self.database is not None:
+            columnar_store.mark_database_dirty(self.database, periods)
+
+    def _run(self, query):
+        conn = self.connect()
+        try:
+            return query(conn, columnar_store.get_expense_store(conn))
+        finally:
+            conn.close()
+
+    def monthly_summary(self):
+        return self._run(lambda conn, store: store.monthly_summary() if store is not None
+                         else fetch_monthly_summary(conn))
+
+    def compare_months(self, year, month, prev_year, prev_month):
+        return self._run(lambda conn, store: (
+            store.compare_months(year, month, prev_year, prev_month) if store is not None
+            else compare_months(conn, year, month, prev_year, prev_month)))
+
+    def compare_expense_types(self, year, month, prev_year, prev_month):
+        return self._run(lambda conn, store: (
+            store.compare_expense_types(year, month, prev_year, prev_month) if store is not None
+            else compare_expense_types(conn, year, month, prev_year, prev_month)))
+
+    def compare_ranges(self, current, base):
+        return self._run(lambda conn, store: store.compare_ranges(current, base)
+                         if store is not None else compare_ranges(conn, current, base))
+
+    def rolling_trend(self, period_range, window):
+        conn = self.connect()
+        try:
+            return rolling_trend(conn, period_range, window)
+        finally:
+            conn.close()
+
+    def stats(self):
+        return {'backend': self.name}
+
+
+class _DuckDBConnection:
+    """以 SQLite 连接的方式执行 queries.py 中的语句：换成 DuckDB 方言并改写命名参数，
+    使 comparison/periods 中的查询函数无需修改即可在 DuckDB 上运行
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, params=()):
+        duck_sql = DUCKDB_QUERIES.get(sql, sql)
+        if isinstance(params, dict):
+            duck_sql = _PARAM_RE.sub(r'$\1', duck_sql)
+        with profiling.span('query', 'duckdb:' + profiling.fingerprint(sql)) as info:
+            self._cursor.execute(duck_sql, params)
+            rows = self._cursor.fetchall()
+            info['rows'] = len(rows)
+        return _Result(self._cursor.description, rows)
+
+    def close(self):
+        self._cursor.close()
+
+
+class _Result:
+    def __init__(self, description, rows):
+        self.description = description
+        self._rows = rows
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return self._rows
+
+
+def _fingerprint(row):
+    return [row[0]] + [round(value, 6) for value in row[1:]]
+
+
+def _import_duckdb():
+    try:
+        import duckdb
+    except ImportError:
+        raise ImportError('Parquet 后端需要安装 duckdb') from None
+    return duckdb
+
+
+def _quote(path):
+    return "'" + path.replace("'", "''") + "'"
+
+
+class ParquetBackend:
+    """历史数据保存为按月分区的 Parquet 文件，用嵌入式 DuckDB 查询
+
+    directory: 分区目录；connect: 返回 SQLite 连接的函数（同步分区的数据来源）。
+    首次查询时按行数和金额合计与 SQLite 比对，只重写不一致的分区。
+    """
+    name = 'parquet'
+
+    def __init__(self, directory, connect):
+        self.directory = directory
+        self.connect = connect
+        self._duck = _import_duckdb().connect()
+        self._stale = True            # 需要与 SQLite 全面比对
+        self._dirty = set()           # 需要重写的 (year, month)
+        self._manifest = {}           # 'YYYY-MM' -> 行数与金额合计
+        self._lock = threading.Lock()
+        self.syncs = 0
+        self.partitions_written = 0
+        self.sync_seconds = 0.0
+        os.makedirs(directory, exist_ok=True)
+        self._load_manifest()
+
+    # ---- 分区同步 ----
+
+    def mark_dirty(self, periods=None):
+        """数据变更通知：periods 为 (year, month) 列表，None 表示全部"""
+        with self._lock:
+            if periods is None:
+                self._stale = True
+            else:
+                self._dirty.update((int(y), int(m)) for y, m in periods)
+
+    def _partition_dir(self, year, month):
+        return os.path.join(self.directory, f'year={year}', f'month={month}')
+
+    def _load_manifest(self):
+        path = os.path.join(self.directory, MANIFEST)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self._manifest = json.load(f)
+
+    def _save_manifest(self):
+        path = os.path.join(self.directory, MANIFEST)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self._manifest, f)
+        os.replace(path + '.tmp', path)
+
+    def sync(self):
+        """把有变化的月份从 SQLite 写入 Parquet 分区，返回重写的分区数"""
+        with self._lock:
+            if not self._stale and not self._dirty:
+                return 0
+            started = time.perf_counter()
+            conn = self.connect()
+            try:
+                if self._stale:
+                    written = self._sync_all(conn)
+                else:
+                    written = sum(self._write_partition(conn, year, month)
+                                  for year, month in sorted(self._dirty))
+                self._stale = False
+                self._dirty.clear()
+            finally:
+                conn.close()
+            self._save_manifest()
+            self._create_views()
+            self.syncs += 1
+            self.partitions_written += written
+            self.sync_seconds = round(time.perf_counter() - started, 4)
+            return written
+
+    def _sync_all(self, conn):
+        fingerprints = {f'{row[0]}-{row[1]:02d}': _fingerprint(row[2:])
+                        for row in conn.execute(PARTITION_FINGERPRINT_SQL).fetchall()}
+        written = 0
+        for key in sorted(set(self._manifest) | set(fingerprints)):
+            if self._manifest.get(key) != fingerprints.get(key):
+                year, month = map(int, key.split('-'))
+                written += self._write_partition(conn, year, month, fingerprints.get(key))
+        return written
+
+    def _write_partition(self, conn, year, month, fingerprint=None):
+        """重写一个月份的分区（该月在 SQLite 中无数据时删除分区）"""
+        key = f'{year}-{month:02d}'
+        target = self._partition_dir(year, month)
+        rows = conn.execute(PARTITION_SQL, (year, month)).fetchall()
+        if not rows:
+            shutil.rmtree(target, ignore_errors=True)
+            self._manifest.pop(key, None)
+            return 1
+        frame = pd.DataFrame([tuple(row) for row in rows], columns=['emp_id'] + AMOUNT_FIELDS)
+        frame[AMOUNT_FIELDS] = frame[AMOUNT_FIELDS].astype(float).fillna(0.0)
+        os.makedirs(target, exist_ok=True)
+        path = os.path.join(target, 'data.parquet')
+        duck = self._duck.cursor()
+        try:
+            duck.register('partition_frame', frame)
+            duck.execute(f"COPY (SELECT CAST(emp_id AS VARCHAR) AS emp_id, "
+                         f"{', '.join(f'CAST({f} AS DOUBLE) AS {f}' for f in AMOUNT_FIELDS)} "
+                         f"FROM partition_frame) TO {_quote(path + '.tmp')} (FORMAT PARQUET)")
+        finally:
+            duck.close()
+        os.replace(path + '.tmp', path)
+        if fingerprint is None:
+            fingerprint = _fingerprint(conn.execute(PERIOD_FINGERPRINT_SQL, (year, month)).fetchone())
+        self._manifest[key] = fingerprint
+        return 1
+
+    def _create_views(self):
+        """expense 视图读取全部分区（year/month 来自分区路径），monthly_summary 视图按月聚合"""
+        if self._manifest:
+            pattern = os.path.join(self.directory, 'year=*', 'month=*', '*.parquet')
+            source = f"read_parquet({_quote(pattern)}, hive_partitioning = true)"
+            expense = (f"SELECT emp_id, CAST(year AS INTEGER) AS year, "
+                       f"CAST(month AS INTEGER) AS month, {', '.join(AMOUNT_FIELDS)} FROM {source}")
+        else:
+            expense = (f"SELECT CAST(NULL AS VARCHAR) AS emp_id, 0 AS year, 0 AS month, "
+                       f"{', '.join(f'CAST(0 AS DOUBLE) AS {f}' for f in AMOUNT_FIELDS)} WHERE false")
+        self._duck.execute(f"CREATE OR REPLACE VIEW expense AS {expense}")
+        self._duck.execute(f"CREATE OR REPLACE VIEW monthly_summary AS {MONTHLY_SUMMARY_SELECT}")
+
+    # ---- 查询 ----
+
+    def _run(self, query):
+        self.sync()
+        conn = _DuckDBConnection(self._duck.cursor())
+        try:
+            return query(conn)
+        finally:
+            conn.close()
+
+    def monthly_summary(self):
+        return self._run(fetch_monthly_summary)
+
+    def compare_months(self, year, month, prev_year, prev_month):
+        return self._run(lambda conn: compare_months(conn, year, month, prev_year, prev_month))
+
+    def compare_expense_types(self, year, month, prev_year, prev_month):
+        return self._run(lambda conn: compare_expense_types(conn, year, month, prev_year, prev_month))
+
+    def compare_ranges(self, current, base):
+        return self._run(lambda conn: compare_ranges(conn, current, base))
+
+    def rolling_trend(self, period_range, window):
+        return self._run(lambda conn: rolling_trend(conn, period_range, window))
+
+    def stats(self):
+        size = 0
+        for root, _, files in os.walk(self.directory):
+            size += sum(os.path.getsize(os.path.join(root, name))
+                        for name in files if name.endswith('.parquet'))
+        return {
+            'backend': self.name,
+            'directory': self.directory,
+            'partitions': len(self._manifest),
+            'rows': sum(fingerprint[0] for fingerprint in self._manifest.values()),
+            'bytes': size,
+            'syncs': self.syncs,
+            'partitions_written': self.partitions_written,
+            'sync_seconds': self.sync_seconds
+        }
+
+
+def default_parquet_dir(database):
+    return os.path.splitext(database)[0] + '_parquet'
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name, database, connect, directory=None):
+    """返回数据库对应的查询后端（每种后端、每个数据库一个实例）"""
+    if name not in BACKENDS:
+        raise ValueError(f'无效的查询后端: {name}（可选 {", ".join(BACKENDS)}）')
+    directory = directory or default_parquet_dir(database)
+    key = (name, os.path.abspath(database), os.path.abspath(directory) if name == 'parquet' else None)
+    with _backends_lock:
+        backend = _backends.get(key)
+        if backend is None:
+            backend = (SqliteBackend(connect, database) if name == 'sqlite'
+                       else ParquetBackend(directory, connect))
+            _backends[key] = backend
+    return backend
+
+
+def _on_invalidate(periods):
+    with _backends_lock:
+        backends = [backend for backend in _backends.values() if backend.name == 'parquet']
+    for backend in backends:
+        backend.mark_dirty(periods)
+
+
+# 导入提交后 result_cache.invalidate() 通知有变化的月份
+result_cache.add_listener(_on_invalidate)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='把 expense 表同步为按月分区的 Parquet 文件')
+    parser.add_argument('--db', default='Cluster_Expense.db')
+    parser.add_argument('--dir', help='分区目录，默认为 <数据库名>_parquet')
+    args = parser.parse_args()
+
+    from db import connect
+    backend = get_backend('parquet', args.db, lambda: connect(args.db), args.dir)
+    written = backend.sync()
+    print(f'重写 {written} 个分区')
+    print(json.dumps(backend.stats(), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""对比逐行导入与批量导入的性能
+
+用法: python bench_ingest.py [行数] [--chunk-size N] [--file 输出xlsx路径]
+默认生成10万行合成数据，分别写入临时数据库并输出行数和吞吐量。
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from ingest import (UPLOAD_COLUMN_MAP, DEFAULT_CHUNK_SIZE, bulk_import_expense,
+                    build_report, format_report)
+from migrations import migrate
+
+
+def make_upload_frame(rows, seed=42):
+    """生成与/upload上传文件表头一致的合成数据"""
+    rng = np.random.default_rng(seed)
+    months = 12
+    employees = max(rows // months, 1)
+    idx = np.arange(rows)
+    salary = rng.uniform(3000, 30000, rows).round(2)
+    base = np.clip(salary, 3825, 20826)
+    return pd.DataFrame({
+        '员工ID': idx % employees + 1,
+        '年份': 2024 - idx // (employees * months),
+        '月份': (idx // employees) % months + 1,
+        '工资总额': salary,
+        '住房公积金': (base * 0.12).round(2),
+        '养老保险': (base * 0.16).round(2),
+        '失业保险': (base * 0.005).round(2),
+        '医疗保险1': (base * 0.085).round(2),
+        '医疗保险2': np.full(rows, 6.4),
+        '工伤保险': (base * 0.004).round(2),
+        '工会经费': (salary * 0.02).round(2)
+    })
+
+
+def legacy_import(conn, df):
+    """原/upload实现：iterrows() + 逐行INSERT"""
+    started = time.perf_counter()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM expense")
+    for _, row in df.iterrows():
+        cursor.execute("""
+            INSERT INTO expense (
+                emp_id, year, month,
+                SAL, HF, PEN, UEM,
+                MED1, MED2, INJ, UF
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            str(row['员工ID']),
+            int(row['年份']),
+            int(row['月份']),
+            float(row['工资总额']),
+            float(row['住房公积金']),
+            float(row['养老保险']),
+            float(row['失业保险']),
+            float(row['医疗保险1']),
+            float(row['医疗保险2']),
+            float(row['工伤保险']),
+            float(row['工会经费'])
+        ))
+    conn.commit()
+    return build_report(len(df), len(df), len(df), time.perf_counter() - started)
+
+
+def run(rows, chunk_size, file_path=None):
+    df = make_upload_frame(rows)
+    if file_path:
+        df.to_excel(file_path, index=False)
+        df = pd.read_excel(file_path)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, func in [
+            ('legacy', legacy_import),
+            ('bulk', lambda conn, frame: bulk_import_expense(
+                conn, frame, column_map=UPLOAD_COLUMN_MAP,
+                chunk_size=chunk_size, replace_all=True))
+        ]:
+            conn = sqlite3.connect(os.path.join(tmp, f'{name}.db'))
+            # 与应用相同的表结构（批量导入会在同一事务中重建 monthly_summary）
+            migrate(conn)
+            try:
+                results[name] = func(conn, df)
+            finally:
+                conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='逐行导入与批量导入性能对比')
+    parser.add_argument('rows', nargs='?', type=int, default=100000)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--file', help='先写出为xlsx再读回，包含Excel解析耗时')
+    args = parser.parse_args()
+
+    results = run(args.rows, args.chunk_size, args.file)
+    for name, report in results.items():
+        print(f"{name:>6}: {format_report(report)}")
+    if results['bulk']['seconds'] > 0:
+        print(f"加速比: {results['legacy']['seconds'] / results['bulk']['seconds']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""对比各读取引擎解析上传文件的耗时
+
+用法: python bench_readers.py [员工数] [--months N] [--file 20241125.xlsx] [--repeat N]
+默认按 20241125.xlsx 的版式（Sheet1 明细 + Sal 月工资宽表 + emp_info 员工信息）
+生成合成工作簿；--file 时直接读取给定工作簿。
+依次测量：pandas 默认 openpyxl、openpyxl 只读逐行、calamine（已安装时），
+各自读取 Sheet1、只读需要的列（usecols）和全部三个工作表；
+另把 Sheet1 写成 CSV / Parquet（已安装 pyarrow 时）测量读取耗时。
+各引擎结果先与 pandas 默认读取结果校验一致。
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from readers import _has_module, available_engines, read_sheets, read_table
+
+SHEETS = ['Sheet1', 'Sal', 'emp_info']
+USECOLS = ['emp_id', 'year', 'month', 'SAL']
+LEVELS = ['Blue', 'S', 'AM', 'M', 'SM']
+
+
+def make_workbook(employees, months=12, seed=42):
+    """按 20241125.xlsx 的版式生成 {工作表名: DataFrame}"""
+    rng = np.random.default_rng(seed)
+    emp_ids = np.arange(1, employees + 1)
+    rows = employees * months
+    salary = rng.uniform(3000, 30000, (employees, months)).round(2)
+    sheet1 = pd.DataFrame({
+        'emp_id': np.repeat(emp_ids, months),
+        'year': 2024,
+        'month': np.tile(np.arange(1, months + 1), employees),
+        'HF': rng.integers(500, 2500, rows),
+        'PEN': rng.uniform(500, 3500, rows).round(2),
+        'UEM': rng.uniform(20, 150, rows).round(2),
+        'MED1': rng.uniform(300, 1500, rows).round(2),
+        'MED2': rng.uniform(0, 10, rows).round(1),
+        'INJ': rng.uniform(5, 40, rows).round(2),
+        'UF': rng.uniform(50, 400, rows).round(2),
+        'SAL': salary.ravel()
+    })
+    sal = pd.DataFrame(salary, columns=range(1, months + 1))
+    sal.insert(0, 'emp_id', emp_ids)
+    emp_info = pd.DataFrame({
+        'emp_id': emp_ids,
+        'name': [f'员工{i}' for i in emp_ids],
+        'level': rng.choice(LEVELS, employees),
+        'id_no': [f'6101{i:014d}' for i in emp_ids],
+        'contact_no': [f'139{i:08d}' for i in emp_ids],
+        'join_date': (pd.Timestamp('2015-01-01')
+                      + pd.to_timedelta(rng.integers(0, 3000, employees), unit='D')).strftime('%Y-%m-%d')
+    })
+    return {'Sheet1': sheet1, 'Sal': sal, 'emp_info': emp_info}
+
+
+def _timed(func, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - started
+        best = seconds if best is None else min(best, seconds)
+    return result, best
+
+
+def run(employees, months=12, file_path=None, repeat=1):
+    with tempfile.TemporaryDirectory() as tmp:
+        if file_path is None:
+            file_path = os.path.join(tmp, 'bench.xlsx')
+            with pd.ExcelWriter(file_path) as writer:
+                for name, df in make_workbook(employees, months).items():
+                    df.to_excel(writer, sheet_name=name, index=False)
+
+        expected = read_sheets(file_path, SHEETS, engine='openpyxl')
+        results = {}
+        for engine in available_engines():
+            sheet1, seconds = _timed(lambda: read_table(file_path, 'Sheet1', engine=engine), repeat)
+            pd.testing.assert_frame_equal(sheet1, expected['Sheet1'], check_dtype=False)
+            _, usecols_seconds = _timed(
+                lambda: read_table(file_path, 'Sheet1', usecols=USECOLS, engine=engine), repeat)
+            sheets, all_seconds = _timed(lambda: read_sheets(file_path, SHEETS, engine=engine), repeat)
+            for name, df in sheets.items():
+                pd.testing.assert_frame_equal(df, expected[name], check_dtype=False)
+            results[engine] = {'rows': len(sheet1), 'sheet1': seconds,
+                               'usecols': usecols_seconds, 'all_sheets': all_seconds}
+
+        csv_path = os.path.join(tmp, 'Sheet1.csv')
+        expected['Sheet1'].to_csv(csv_path, index=False)
+        df, seconds = _timed(lambda: read_table(csv_path), repeat)
+        _, usecols_seconds = _timed(lambda: read_table(csv_path, usecols=USECOLS), repeat)
+        results['csv'] = {'rows': len(df), 'sheet1': seconds, 'usecols': usecols_seconds}
+
+        if _has_module('pyarrow') or _has_module('fastparquet'):
+            parquet_path = os.path.join(tmp, 'Sheet1.parquet')
+            expected['Sheet1'].to_parquet(parquet_path, index=False)
+            df, seconds = _timed(lambda: read_table(parquet_path), repeat)
+            _, usecols_seconds = _timed(lambda: read_table(parquet_path, usecols=USECOLS), repeat)
+            results['parquet'] = {'rows': len(df), 'sheet1': seconds, 'usecols': usecols_seconds}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='各读取引擎性能对比')
+    parser.add_argument('employees', nargs='?', type=int, default=2000)
+    parser.add_argument('--months', type=int, default=12)
+    parser.add_argument('--file', help='读取给定的工作簿（需含 Sheet1/Sal/emp_info）而不生成合成数据')
+    parser.add_argument('--repeat', type=int, default=1, help='每项重复次数，取最短耗时')
+    args = parser.parse_args()
+
+    results = run(args.employees, args.months, args.file, args.repeat)
+    baseline = results.get('openpyxl', {}).get('sheet1')
+    for name, result in results.items():
+        line = (f"{name:>12}: {result['rows']} 行, Sheet1 {result['sheet1']:.3f} 秒, "
+                f"usecols {result['usecols']:.3f} 秒")
+        if 'all_sheets' in result:
+            line += f", 全部工作表 {result['all_sheets']:.3f} 秒"
+        if baseline and name != 'openpyxl':
+            line += f", 相对 pandas openpyxl {baseline / result['sheet1']:.1f}x"
+        print(line)
+    print("各Excel引擎结果一致")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""对比逐行工资合并与向量化合并的性能
+
+用法: python bench_salary_merge.py [员工数] [--months N] [--file 输出xlsx路径] [--no-legacy]
+默认生成5000名员工×12个月的合成工作簿：Sheet1 缺少部分月份，Sal 中含有
+空值，两种实现的结果会先校验一致再输出耗时。
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from salary_merge import merge_salary
+
+
+def make_workbook(employees, months=12, seed=42):
+    """生成 (Sheet1, Sal) 合成数据：Sheet1 随机缺少约10%的 (emp_id, month)"""
+    rng = np.random.default_rng(seed)
+    emp_ids = np.arange(1, employees + 1)
+    salary = rng.uniform(3000, 30000, (employees, months)).round(2)
+    salary[rng.random((employees, months)) < 0.05] = np.nan
+    sal_df = pd.DataFrame(salary, columns=range(1, months + 1))
+    sal_df.insert(0, 'emp_id', emp_ids)
+
+    rows = employees * months
+    sheet_df = pd.DataFrame({
+        'emp_id': np.repeat(emp_ids, months),
+        'year': 2024,
+        'month': np.tile(np.arange(1, months + 1), employees),
+        'HF': rng.uniform(500, 2500, rows).round(0),
+        'PEN': rng.uniform(500, 3500, rows).round(2),
+        'SAL': rng.uniform(3000, 30000, rows).round(2)
+    })
+    sheet_df = sheet_df[rng.random(rows) >= 0.1].reset_index(drop=True)
+    return sheet_df, sal_df
+
+
+def legacy_merge(sheet1_df, sal_df, salary_column='SAL'):
+    """原 Convert.py 实现：iterrows() 建字典 + 逐行 .at[] 回填 + 整表布尔掩码查重"""
+    sal_df = sal_df.fillna(0)
+    sheet1_df = sheet1_df.fillna(0)
+
+    salary_dict = {}
+    for _, row in sal_df.iterrows():
+        emp_id = row['emp_id']
+        for month in sal_df.columns:
+            if month != 'emp_id':
+                salary = row[month]
+                if salary != 0:
+                    if emp_id not in salary_dict:
+                        salary_dict[emp_id] = {}
+                    salary_dict[emp_id][int(month)] = salary
+
+    for index, row in sheet1_df.iterrows():
+        emp_id = row['emp_id']
+        month = int(row['month'])
+        if emp_id in salary_dict and month in salary_dict[emp_id]:
+            sheet1_df.at[index, salary_column] = salary_dict[emp_id][month]
+
+    new_rows = []
+    for emp_id, months in salary_dict.items():
+        for month, salary in months.items():
+            if salary != 0 and not ((sheet1_df['emp_id'] == emp_id) & (sheet1_df['month'] == month)).any():
+                new_row = {'emp_id': emp_id, 'month': month, salary_column: salary}
+                for col in sheet1_df.columns:
+                    if col not in new_row:
+                        new_row[col] = 0
+                new_rows.append(new_row)
+
+    if new_rows:
+        sheet1_df = pd.concat([sheet1_df, pd.DataFrame(new_rows)], ignore_index=True)
+    return sheet1_df[sheet1_df[salary_column] != 0]
+
+
+def _timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def run(employees, months=12, file_path=None, legacy=True):
+    sheet_df, sal_df = make_workbook(employees, months)
+    if file_path:
+        with pd.ExcelWriter(file_path) as writer:
+            sheet_df.to_excel(writer, sheet_name='Sheet1', index=False)
+            sal_df.to_excel(writer, sheet_name='Sal', index=False)
+        sheet_df = pd.read_excel(file_path, sheet_name='Sheet1')
+        sal_df = pd.read_excel(file_path, sheet_name='Sal')
+
+    (merged, stats), seconds = _timed(merge_salary, sheet_df, sal_df, 'SAL', 0)
+    results = {'vectorized': {'rows': len(merged), 'seconds': seconds, **stats}}
+    if legacy:
+        expected, seconds = _timed(legacy_merge, sheet_df, sal_df)
+        results['legacy'] = {'rows': len(expected), 'seconds': seconds}
+        pd.testing.assert_frame_equal(merged, expected.reset_index(drop=True),
+                                      check_dtype=False)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='逐行与向量化工资合并性能对比')
+    parser.add_argument('employees', nargs='?', type=int, default=5000)
+    parser.add_argument('--months', type=int, default=12)
+    parser.add_argument('--file', help='先写出为xlsx再读回，与实际工作簿的列类型一致')
+    parser.add_argument('--no-legacy', action='store_true', help='只运行向量化实现')
+    args = parser.parse_args()
+
+    results = run(args.employees, args.months, args.file, legacy=not args.no_legacy)
+    for name, result in results.items():
+        print(f"{name:>10}: {result['rows']} 行, 耗时 {result['seconds']:.3f} 秒")
+    if 'legacy' in results:
+        print("结果一致")
+        if results['vectorized']['seconds'] > 0:
+            print(f"加速比: {results['legacy']['seconds'] / results['vectorized']['seconds']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
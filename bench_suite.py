@@ -0,0 +1,231 @@
+"""热点路径基准测试
+
+用法: python bench_suite.py [--sizes 1000,10000,100000] [--months 12] [--churn 0.02]
+      [--seed 42] [-o bench_results.json] [--compare 上次结果.json]
+
+对每个规模（在职员工数）用 generate_sample_data 生成数据，在临时目录中的空数据库上依次测量：
+- upload：/upload 上传（中文表头）直到后台任务完成；再次上传同一文件（unchanged），
+  以及1%员工工资变化后的增量上传（incremental）
+- monthly_summary：get_monthly_summary 冷（缓存失效后）/ 热
+- monthly_detail：月度详情页的数据查询 get_monthly_detail（模板不在仓库中，不含渲染）
+- comparison：/api/employee_comparison 批量接口和 /api/period_comparison（环比）冷 / 热
+- convert：Convert.py 的工资合并（Sheet1 + Sal 工作簿，读取 + 合并 + 写出）
+- export：/export 流式导出全部数据
+行数超过 Excel 单表上限时上传改用 CSV，convert 跳过并记录原因。
+结果（含环境信息）写入 JSON，--compare 与上次结果逐项对比耗时。
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from generate_sample_data import generate_expense, write_output
+from periods import from_period, to_period
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_MONTHS = 12
+DEFAULT_START = '2024-01'
+DEFAULT_OUTPUT = 'bench_results.json'
+EXCEL_MAX_ROWS = 1048575   # 不含表头
+INCREMENTAL_FRACTION = 0.01
+
+
+def _timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, round(time.perf_counter() - started, 4)
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit or None,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'sqlite': sqlite3.sqlite_version
+    }
+
+
+def _upload(client, job_queue, data, filename):
+    response = client.post('/upload', data={'file': (io.BytesIO(data), filename)},
+                           headers={'Accept': 'application/json'})
+    status = response.get_json()
+    if status.get('state') == 'unchanged':
+        return status
+    job_queue.join()
+    status = job_queue.status(status['id'])
+    if status['state'] != 'succeeded':
+        raise RuntimeError(f"上传任务失败: {status['error']}")
+    return status
+
+
+def _encode_upload(expense, path):
+    write_output(path, expense, None, 'upload')
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def bench_size(app_module, employees, months, start, churn, seed, tmp):
+    """对一个规模运行全部测量，返回 {测量项: 结果}"""
+    app, result_cache = app_module.app, app_module.result_cache
+    app.config['DATABASE'] = os.path.join(tmp, f'bench_{employees}.db')
+    app_module.workbook_cache.configure(directory=os.path.join(tmp, f'parsed_{employees}'))
+    app_module.init_db()
+    client = app.test_client()
+    results = {}
+
+    (expense, emp_info), seconds = _timed(lambda: generate_expense(
+        employees, months, start, churn, seed=seed))
+    rows = len(expense)
+    results['generate'] = {'rows': rows, 'seconds': seconds}
+
+    # 上传：首次导入 / 同一文件再次上传 / 1%员工工资变化后的增量上传
+    extension = '.xlsx' if rows <= EXCEL_MAX_ROWS else '.csv'
+    data = _encode_upload(expense, os.path.join(tmp, f'upload_{employees}{extension}'))
+    status, seconds = _timed(lambda: _upload(client, app_module.job_queue, data, f'upload{extension}'))
+    results['upload'] = {'rows': rows, 'format': extension[1:], 'bytes': len(data),
+                         'seconds': seconds, 'rows_per_sec': round(rows / seconds, 1),
+                         'job_seconds': status['seconds']}
+    status, seconds = _timed(lambda: _upload(client, app_module.job_queue, data, f'upload{extension}'))
+    results['upload_unchanged'] = {'seconds': seconds, 'state': status['state']}
+
+    rng = np.random.default_rng(seed)
+    changed_ids = rng.choice(expense['emp_id'].unique(),
+                             max(1, int(employees * INCREMENTAL_FRACTION)), replace=False)
+    modified = expense.copy()
+    modified.loc[modified['emp_id'].isin(changed_ids), 'SAL'] += 100
+    data = _encode_upload(modified, os.path.join(tmp, f'upload_{employees}_changed{extension}'))
+    status, seconds = _timed(lambda: _upload(client, app_module.job_queue, data, f'upload{extension}'))
+    report = status['result']['report']
+    results['upload_incremental'] = {'seconds': seconds, 'updated': report['updated'],
+                                     'unchanged': report['unchanged']}
+
+    last_year, last_month = from_period(to_period(*map(int, start.split('-'))) + months - 1)
+    with app.test_request_context():
+        result_cache.invalidate()
+        _, cold = _timed(app_module.get_monthly_summary)
+        _, warm = _timed(app_module.get_monthly_summary)
+        results['monthly_summary'] = {'cold': cold, 'warm': warm}
+
+        (employee_data, _), seconds = _timed(
+            lambda: app_module.get_monthly_detail(last_year, last_month))
+        results['monthly_detail'] = {'employees': len(employee_data), 'seconds': seconds}
+
+    for name, url in [
+        ('employee_comparison', f'/api/employee_comparison/{last_year}/{last_month}'),
+        ('period_comparison', f'/api/period_comparison?current=R3@{last_year}-{last_month:02d}')
+    ]:
+        result_cache.invalidate()
+        response, cold = _timed(lambda: client.get(url))
+        if response.status_code != 200:
+            raise RuntimeError(f'{url} 返回 {response.status_code}')
+        _, warm = _timed(lambda: client.get(url))
+        results[name] = {'bytes': len(response.data), 'cold': cold, 'warm': warm}
+
+    sheet_rows = int((expense['year'] == expense['year'].max()).sum())
+    if sheet_rows <= EXCEL_MAX_ROWS:
+        from salary_merge import merge_workbook
+        workbook = os.path.join(tmp, f'workbook_{employees}.xlsx')
+        write_output(workbook, expense, emp_info, 'workbook')
+        stats, seconds = _timed(lambda: merge_workbook(
+            workbook, output=os.path.join(tmp, f'converted_{employees}.xlsx')))
+        results['convert'] = {'rows': stats['rows'], 'seconds': seconds,
+                              'merge_seconds': stats['seconds']}
+    else:
+        results['convert'] = {'skipped': f'Sheet1 {sheet_rows} 行超过Excel单表上限'}
+
+    def export():
+        response = client.get('/export')
+        return sum(len(chunk) for chunk in response.response)
+    size, seconds = _timed(export)
+    results['export'] = {'rows': rows, 'bytes': size, 'seconds': seconds,
+                         'rows_per_sec': round(rows / seconds, 1)}
+    return results
+
+
+def run(sizes, months=DEFAULT_MONTHS, start=DEFAULT_START, churn=0.02, seed=42):
+    with tempfile.TemporaryDirectory() as tmp:
+        # app.py 导入时按相对路径初始化数据库和上传目录，切到临时目录避免改动仓库中的数据库
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            import app as app_module
+            results = {}
+            for employees in sizes:
+                print(f'规模 {employees} 名员工 × {months} 个月 ...', file=sys.stderr)
+                results[str(employees)] = bench_size(app_module, employees, months, start,
+                                                     churn, seed, tmp)
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+def _timings(results):
+    """把结果展开为 {(规模, 测量项, 指标): 秒数}"""
+    flat = {}
+    for size, items in results.items():
+        for name, values in items.items():
+            for metric in ('seconds', 'cold', 'warm'):
+                if metric in values:
+                    flat[(size, name, metric)] = values[metric]
+    return flat
+
+
+def compare(current, previous):
+    """逐项对比两次结果的耗时，打印比值（>1 表示变慢）"""
+    old = _timings(previous['results'])
+    for key, seconds in _timings(current['results']).items():
+        if key in old and old[key] > 0:
+            ratio = seconds / old[key]
+            flag = ' 变慢' if ratio > 1.2 else (' 变快' if ratio < 0.8 else '')
+            print(f"{key[0]:>7} {key[1]:<20} {key[2]:<7} {old[key]:>9.4f} -> {seconds:>9.4f} "
+                  f"({ratio:.2f}x){flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='热点路径基准测试')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='逗号分隔的员工数')
+    parser.add_argument('--months', type=int, default=DEFAULT_MONTHS)
+    parser.add_argument('--start', default=DEFAULT_START, help='起始月份 YYYY-MM')
+    parser.add_argument('--churn', type=float, default=0.02)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('-o', '--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--compare', help='上次的结果JSON，逐项对比耗时')
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    output = os.path.abspath(args.output)
+    report = {
+        'environment': environment(),
+        'params': {'sizes': sizes, 'months': args.months, 'start': args.start,
+                   'churn': args.churn, 'seed': args.seed},
+        'results': run(sizes, args.months, args.start, args.churn, args.seed)
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps(report['results'], ensure_ascii=False, indent=2))
+    print(f'结果已写入 {output}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
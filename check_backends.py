@@ -0,0 +1,184 @@
+"""查询后端一致性检查
+
+用法: python check_backends.py [--employees 300] [--months 24] [--start 2023-01] [--seed 42]
+      [--db 已有数据库] [--tolerance 1e-6]
+
+在临时目录中（或 --db 指定数据库的副本上）对以下三种配置依次请求每个查询路由：
+- sqlite：直接执行 SQL（关闭内存列式数据）
+- sqlite+columnar：内存列式数据
+- parquet：DuckDB 查询按月分区的 Parquet
+以第一种为基准逐项比较返回结果（浮点按 tolerance 比较，其余必须相等）；
+再做一次增量导入（新员工 + 修改 + 删除一个月份），确认各后端增量刷新后仍然一致。
+查询结果缓存在检查期间关闭，每次请求都实际执行查询。
+"""
+import argparse
+import math
+import os
+import shutil
+import sys
+import tempfile
+import pandas as pd
+from generate_sample_data import generate_expense, write_database
+from ingest import upsert_expense
+from periods import from_period, parse_range
+from summary import refresh_periods
+
+DEFAULT_TOLERANCE = 1e-6
+
+VARIANTS = [
+    ('sqlite', {'STORAGE_BACKEND': 'sqlite', 'COLUMNAR_STORE': False}),
+    ('sqlite+columnar', {'STORAGE_BACKEND': 'sqlite', 'COLUMNAR_STORE': True}),
+    ('parquet', {'STORAGE_BACKEND': 'parquet', 'COLUMNAR_STORE': False})
+]
+
+
+def diff(expected, actual, tolerance, path='$'):
+    """返回第一处不一致的描述，一致时返回 None"""
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        if expected.keys() != actual.keys():
+            return f'{path}: 键不同 {sorted(expected.keys() ^ actual.keys())}'
+        for key in expected:
+            found = diff(expected[key], actual[key], tolerance, f'{path}.{key}')
+            if found:
+                return found
+        return None
+    if isinstance(expected, (list, tuple)) and isinstance(actual, (list, tuple)):
+        if len(expected) != len(actual):
+            return f'{path}: 长度 {len(expected)} != {len(actual)}'
+        for i, (a, b) in enumerate(zip(expected, actual)):
+            found = diff(a, b, tolerance, f'{path}[{i}]')
+            if found:
+                return found
+        return None
+    if isinstance(expected, (int, float)) and isinstance(actual, (int, float)) \
+            and not isinstance(expected, bool) and not isinstance(actual, bool):
+        if math.isclose(expected, actual, rel_tol=tolerance, abs_tol=tolerance):
+            return None
+        return f'{path}: {expected!r} != {actual!r}'
+    return None if expected == actual else f'{path}: {expected!r} != {actual!r}'
+
+
+def route_results(app_module, year, month):
+    """请求每个查询路由（模板页面不在仓库中，首页和月度明细比较其数据函数），返回 {名称: 结果}"""
+    client = app_module.app.test_client()
+    current = f'R3@{year}-{month:02d}'
+    urls = {
+        'employee_comparison': f'/api/employee_comparison/{year}/{month}',
+        'period_comparison': f'/api/period_comparison?current={current}',
+        'period_comparison_year_ago': f'/api/period_comparison?current={current}&compare=year_ago',
+        'period_comparison_base': f'/api/period_comparison?current={year}&base={year - 1}',
+        'trend': f'/api/trend?range=R12@{year}-{month:02d}&window=3'
+    }
+    urls.update({f'employee_comparison_{name}': f'/api/employee_comparison/{year}/{month}/{name}'
+                 for name in app_module.COMPARISON_TYPES})
+    urls.update({f'breakdown_{name}': f'/api/breakdown/{name}?range={current}'
+                 for name in app_module.DIMENSIONS})
+    results = {}
+    for name, url in urls.items():
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f'{url} 返回 {response.status_code}')
+        results[name] = response.get_json()
+    with app_module.app.test_request_context():
+        results['monthly_summary'] = app_module.query_monthly_summary()
+        results['monthly_detail'] = app_module.get_monthly_detail(year, month)
+        prev = from_period(parse_range(f'{year}-{month:02d}').start - 12)
+        results['monthly_detail_year_ago'] = app_module.get_monthly_detail(*prev)
+    return results
+
+
+def check(app_module, year, month, tolerance, label):
+    """三种配置的结果与 sqlite 基准比较，返回不一致项数"""
+    app = app_module.app
+    baseline = None
+    failures = 0
+    for name, config in VARIANTS:
+        app.config.update(config)
+        app_module.columnar_store.configure(enabled=config['COLUMNAR_STORE'])
+        results = route_results(app_module, year, month)
+        if baseline is None:
+            baseline = results
+            continue
+        for route, expected in baseline.items():
+            found = diff(expected, results[route], tolerance)
+            if found:
+                failures += 1
+                print(f'[{label}] {name} {route} 不一致: {found}')
+        print(f'[{label}] {name}: {len(baseline)} 项已比较', file=sys.stderr)
+    return failures
+
+
+def incremental_change(app_module, expense, year, month):
+    """新员工 + 修改工资 + 删除一个较早月份，经由 upsert_expense 写入（触发缓存失效通知）"""
+    latest = expense[(expense['year'] == year) & (expense['month'] == month)].copy()
+    latest.loc[latest.index[:5], 'SAL'] += 123.45
+    new_hire = latest.iloc[[0]].copy()
+    new_hire['emp_id'] = '99999'
+    changed = pd.concat([latest, new_hire], ignore_index=True)
+
+    conn = app_module.get_db_connection()
+    try:
+        upsert_expense(conn, changed)
+        first = expense[['year', 'month']].drop_duplicates().iloc[0]
+        conn.execute("DELETE FROM expense WHERE year = ? AND month = ?",
+                     (int(first['year']), int(first['month'])))
+        refresh_periods(conn, [(int(first['year']), int(first['month']))])
+        conn.commit()
+        app_module.result_cache.invalidate([(int(first['year']), int(first['month']))])
+    finally:
+        conn.close()
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        database = os.path.join(tmp, 'check.db')
+        if args.db:
+            shutil.copyfile(args.db, database)
+            expense = None
+        else:
+            expense, emp_info = generate_expense(args.employees, args.months, args.start, seed=args.seed)
+            write_database(database, expense, emp_info)
+        # app.py 导入时按相对路径初始化数据库和上传目录，切到临时目录避免改动仓库中的数据库
+        os.chdir(tmp)
+        try:
+            import app as app_module
+            app_module.app.config['DATABASE'] = database
+            app_module.init_db()
+            app_module.result_cache.configure(max_entries=0)
+
+            conn = app_module.get_db_connection()
+            try:
+                year, month = conn.execute(
+                    "SELECT year, month FROM expense ORDER BY year DESC, month DESC LIMIT 1").fetchone()
+            finally:
+                conn.close()
+
+            failures = check(app_module, year, month, args.tolerance, '全量')
+            if expense is not None:
+                incremental_change(app_module, expense, year, month)
+                failures += check(app_module, year, month, args.tolerance, '增量')
+        finally:
+            os.chdir(cwd)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='查询后端一致性检查')
+    parser.add_argument('--employees', type=int, default=300)
+    parser.add_argument('--months', type=int, default=24)
+    parser.add_argument('--start', default='2023-01', help='起始月份 YYYY-MM')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', help='检查已有数据库（在副本上进行，不做增量检查）')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    failures = run(args)
+    if failures:
+        print(f'共 {failures} 项不一致')
+        sys.exit(1)
+    print('各后端结果一致')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,434 @@
+"""expense 表的内存列式副本
+
+首页月度汇总、月度明细对比、员工对比和区间对比在内存中用 NumPy 向量化计算，
+不再每次查询 SQLite 并逐行转换为字典：
+- 首次使用时把 expense 整表读入内存：员工ID排序去重后编码为整数，
+  每个月份一个块（员工编码升序的编码数组 + 金额矩阵 + 金额合计）
+- 导入提交后 result_cache.invalidate() 通知涉及的月份，下次查询前只重新读取这些月份
+- 估算内存超过 max_bytes 时不加载（或丢弃已加载的数据），调用方回退到 SQL 查询
+
+计算口径与 queries.py 中的 SQL 一致，合计的浮点求和顺序不同，末位可能有微小差异。
+"""
+import functools
+import os
+import threading
+import time
+from collections import namedtuple
+import numpy as np
+from comparison import employee_status
+from ingest import AMOUNT_FIELDS
+from periods import from_period, to_period
+from queries import COMPARISON_MEASURES, DETAIL_MEASURES, RANGE_MEASURES
+from query_cache import result_cache
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# 每行的内存估算：金额矩阵 + 员工编码
+ROW_BYTES = 8 * len(AMOUNT_FIELDS) + 4
+
+LOAD_SQL = f"SELECT emp_id, year * 12 + month - 1, {', '.join(AMOUNT_FIELDS)} FROM expense"
+LOAD_PERIOD_SQL = (f"SELECT emp_id, year * 12 + month - 1, {', '.join(AMOUNT_FIELDS)} "
+                   f"FROM expense WHERE year = ? AND month = ?")
+
+# 月度汇总的各列: (名称, 金额列)，与 queries.MONTHLY_SUMMARY_SQL 一致
+SUMMARY_MEASURES = [
+    ('total_salary', ['SAL']),
+    ('total_pension', ['PEN']),
+    ('total_medical', ['MED1', 'MED2']),
+    ('total_injury', ['INJ']),
+    ('total_unemployment', ['UEM']),
+    ('total_hf', ['HF']),
+    ('total_union_fee', ['UF']),
+    ('total_insurance', ['HF', 'PEN', 'UEM', 'MED1', 'MED2', 'INJ']),
+    ('grand_total', AMOUNT_FIELDS)
+]
+
+# 一个月份的数据：codes 为升序的员工编码，amounts 每行对应一个员工，totals 为各金额列合计
+PeriodBlock = namedtuple('PeriodBlock', 'codes amounts totals')
+
+
+def measure_matrix(measures):
+    """把 (名称, 'A + B') 形式的指标转换为 金额列 × 指标 的0/1矩阵"""
+    matrix = np.zeros((len(AMOUNT_FIELDS), len(measures)))
+    for j, (_, expr) in enumerate(measures):
+        columns = expr if isinstance(expr, list) else [part.strip() for part in expr.split('+')]
+        for column in columns:
+            matrix[AMOUNT_FIELDS.index(column), j] = 1
+    return matrix
+
+
+_DETAIL = measure_matrix(DETAIL_MEASURES)
+_COMPARISON = measure_matrix(COMPARISON_MEASURES)
+_RANGE = measure_matrix(RANGE_MEASURES)
+_SUMMARY = measure_matrix(SUMMARY_MEASURES)
+
+
+def _change_rates(current, previous, new_rate=0):
+    """与 queries._change_rate_sql 一致：对比值为0时，当前值为正取 new_rate，否则为0"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rates = (current - previous) * 100.0 / previous
+    fallback = np.where(current > 0, float(new_rate), 0.0) if new_rate else 0.0
+    return np.where(previous != 0, rates, fallback)
+
+
+def _rows_to_arrays(rows):
+    emp_ids = np.array([row[0] for row in rows], dtype=object).astype(str)
+    periods = np.fromiter((row[1] for row in rows), dtype=np.int32, count=len(rows))
+    amounts = np.array([row[2:] for row in rows], dtype=np.float64).reshape(
+        len(rows), len(AMOUNT_FIELDS))
+    return emp_ids, periods, np.nan_to_num(amounts)
+
+
+def _locked(method):
+    """查询期间持有锁，避免与增量刷新（重新编码员工）交错"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class ExpenseStore:
+    """一个数据库的 expense 列式副本"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.emp_ids = np.array([], dtype=str)   # 排序去重的员工ID，下标即员工编码
+        self.blocks = {}                         # period -> PeriodBlock
+        self.loaded = False
+        self.fallback = None                     # 不可用时的原因
+        self._stale = True                       # 需要整表重新加载
+        self._dirty = set()                      # 需要重新读取的 period
+        self._lookups = {}                       # 与 emp_ids 对齐的员工属性数组，员工编码变化时清空
+        self._lock = threading.RLock()
+        self.loads = 0
+        self.refreshes = 0
+        self.load_seconds = 0.0
+
+    # ---- 加载与增量刷新 ----
+
+    def mark_dirty(self, periods=None):
+        """数据变更通知：periods 为 (year, month) 列表，None 表示全部"""
+        with self._lock:
+            if periods is None:
+                self._stale = True
+            else:
+                self._dirty.update(to_period(int(y), int(m)) for y, m in periods)
+
+    def ensure(self, conn):
+        """按需加载/刷新，返回是否可以使用内存数据（超出内存上限时为 False）"""
+        with self._lock:
+            if self._stale:
+                self._load(conn)
+            elif self._dirty and self.loaded:
+                self._refresh(conn)
+            elif self._dirty:
+                # 因超出上限未加载，数据变化后重新评估
+                self._load(conn)
+            return self.loaded
+
+    def _over_budget(self, rows):
+        return rows * ROW_BYTES > self.max_bytes
+
+    def _load(self, conn):
+        started = time.perf_counter()
+        self._stale = False
+        self._dirty.clear()
+        rows = conn.execute("SELECT COUNT(*) FROM expense").fetchone()[0]
+        if self._over_budget(rows):
+            self._unload(f'估算内存 {rows * ROW_BYTES} 字节超过上限 {self.max_bytes}')
+            return
+        emp_ids, periods, amounts = _rows_to_arrays(conn.execute(LOAD_SQL).fetchall())
+        self.emp_ids, codes = np.unique(emp_ids, return_inverse=True)
+        self._lookups = {}
+        codes = codes.astype(np.int32)
+        self.blocks = {}
+        order = np.lexsort((codes, periods))
+        codes, periods, amounts = codes[order], periods[order], amounts[order]
+        starts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]]) if len(periods) else []
+        bounds = list(starts) + [len(periods)]
+        for i, start in enumerate(starts):
+            end = bounds[i + 1]
+            block_amounts = amounts[start:end]
+            self.blocks[int(periods[start])] = PeriodBlock(
+                codes[start:end].copy(), block_amounts.copy(), block_amounts.sum(axis=0))
+        self.loaded = True
+        self.fallback = None
+        self.loads += 1
+        self.load_seconds = round(time.perf_counter() - started, 4)
+
+    def _refresh(self, conn):
+        """只重新读取有变化的月份；出现新员工时重新编码（编码保持升序，已有块只需映射）"""
+        dirty, self._dirty = sorted(self._dirty), set()
+        fetched = {}
+        for period in dirty:
+            year, month = from_period(period)
+            fetched[period] = _rows_to_arrays(conn.execute(LOAD_PERIOD_SQL, (year, month)).fetchall())
+
+        new_ids = np.unique(np.concatenate([ids for ids, _, _ in fetched.values()] or [[]]).astype(str))
+        new_ids = np.setdiff1d(new_ids, self.emp_ids)
+        if len(new_ids):
+            merged = np.union1d(self.emp_ids, new_ids)
+            remap = np.searchsorted(merged, self.emp_ids).astype(np.int32)
+            self.blocks = {period: block._replace(codes=remap[block.codes])
+                           for period, block in self.blocks.items()}
+            self.emp_ids = merged
+            self._lookups = {}
+
+        for period, (ids, _, amounts) in fetched.items():
+            if not len(ids):
+                self.blocks.pop(period, None)
+                continue
+            codes = np.searchsorted(self.emp_ids, ids).astype(np.int32)
+            order = np.argsort(codes, kind='stable')
+            self.blocks[period] = PeriodBlock(codes[order], amounts[order], amounts.sum(axis=0))
+        self.refreshes += 1
+
+        rows = sum(len(block.codes) for block in self.blocks.values())
+        if self._over_budget(rows):
+            self._unload(f'估算内存 {rows * ROW_BYTES} 字节超过上限 {self.max_bytes}')
+
+    def _unload(self, reason):
+        self.emp_ids = np.array([], dtype=str)
+        self._lookups = {}
+        self.blocks = {}
+        self.loaded = False
+        self.fallback = reason
+
+    def stats(self):
+        with self._lock:
+            rows = sum(len(block.codes) for block in self.blocks.values())
+            size = self.emp_ids.nbytes + sum(
+                block.codes.nbytes + block.amounts.nbytes + block.totals.nbytes
+                for block in self.blocks.values())
+            return {
+                'loaded': self.loaded,
+                'fallback': self.fallback,
+                'rows': rows,
+                'periods': len(self.blocks),
+                'employees': len(self.emp_ids),
+                'bytes': int(size),
+                'max_bytes': self.max_bytes,
+                'loads': self.loads,
+                'refreshes': self.refreshes,
+                'load_seconds': self.load_seconds
+            }
+
+    # ---- 查询 ----
+
+    def _aggregate(self, periods):
+        """按员工合计多个月份，返回 (升序员工编码, 金额矩阵)"""
+        blocks = [self.blocks[p] for p in periods if p in self.blocks]
+        if not blocks:
+            return np.array([], dtype=np.int32), np.zeros((0, len(AMOUNT_FIELDS)))
+        if len(blocks) == 1:
+            return blocks[0].codes, blocks[0].amounts
+        codes = np.concatenate([block.codes for block in blocks])
+        amounts = np.concatenate([block.amounts for block in blocks])
+        order = np.argsort(codes, kind='stable')
+        codes, amounts = codes[order], amounts[order]
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        return codes[starts], np.add.reduceat(amounts, starts, axis=0)
+
+    def _pair(self, current, previous, matrix):
+        """对齐两个期间：返回 (员工编码, 当前是否有记录, 对比期是否有记录, 当前值, 对比值)"""
+        cur_codes, cur_amounts = current
+        prev_codes, prev_amounts = previous
+        codes = np.union1d(cur_codes, prev_codes)
+        cur = np.zeros((len(codes), matrix.shape[1]))
+        prev = np.zeros((len(codes), matrix.shape[1]))
+        cur_pos = np.searchsorted(codes, cur_codes)
+        prev_pos = np.searchsorted(codes, prev_codes)
+        cur[cur_pos] = cur_amounts @ matrix
+        prev[prev_pos] = prev_amounts @ matrix
+        in_cur = np.zeros(len(codes), dtype=bool)
+        in_prev = np.zeros(len(codes), dtype=bool)
+        in_cur[cur_pos] = True
+        in_prev[prev_pos] = True
+        return codes, in_cur, in_prev, cur, prev
+
+    @_locked
+    def monthly_summary(self):
+        """与 app.query_monthly_summary 相同的结构，按月份倒序"""
+        result = []
+        for period in sorted(self.blocks, reverse=True):
+            year, month = from_period(period)
+            values = self.blocks[period].totals @ _SUMMARY
+            row = {'year': year, 'month': month}
+            for (name, _), value in zip(SUMMARY_MEASURES, values):
+                row[name] = round(float(value), 2)
+            result.append(row)
+        return result
+
+    @_locked
+    def breakdown(self, period_range, key, lookup, classify):
+        """按员工属性分组合计一个期间区间
+
+        lookup(emp_ids) 返回与 emp_ids 对齐的属性数组，按 key 缓存到员工编码变化为止；
+        classify(属性数组, period) 返回当月每行的整数分组键。
+        返回 (升序分组键, 各组员工数, 各组金额矩阵)。
+        """
+        values = self._lookups.get(key)
+        if values is None:
+            if len(self._lookups) >= 8:
+                self._lookups.clear()
+            values = self._lookups[key] = lookup(self.emp_ids.tolist())
+        keys, codes, amounts = [], [], []
+        for period in range(period_range.start, period_range.end + 1):
+            block = self.blocks.get(period)
+            if block is not None:
+                keys.append(classify(values[block.codes], period))
+                codes.append(block.codes)
+                amounts.append(block.amounts)
+        if not keys:
+            return (np.array([], dtype=np.int64), np.array([], dtype=np.int64),
+                    np.zeros((0, len(AMOUNT_FIELDS))))
+        amounts = np.concatenate(amounts)
+        groups, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+        sums = np.column_stack([np.bincount(inverse, weights=amounts[:, j], minlength=len(groups))
+                                for j in range(len(AMOUNT_FIELDS))])
+        # 同一员工在区间内多个月属于同一组时只计一次
+        members = np.unique(inverse.astype(np.int64) * len(self.emp_ids) + np.concatenate(codes))
+        headcount = np.bincount(members // len(self.emp_ids), minlength=len(groups))
+        return groups, headcount, sums
+
+    @_locked
+    def compare_months(self, year, month, prev_year, prev_month):
+        """与 comparison.compare_months 相同的结构"""
+        codes, in_cur, in_prev, cur, prev = self._pair(
+            self._aggregate([to_period(year, month)]),
+            self._aggregate([to_period(prev_year, prev_month)]), _DETAIL)
+        change = cur - prev
+        rates = _change_rates(cur, prev)
+        names = [name for name, _ in DETAIL_MEASURES]
+        emp_ids = self.emp_ids[codes].tolist()
+        columns = [(cur[:, j].tolist(), prev[:, j].tolist(), change[:, j].tolist(),
+                    rates[:, j].tolist()) for j in range(len(names))]
+        in_cur, in_prev = in_cur.tolist(), in_prev.tolist()
+
+        employee_data = []
+        for i, emp_id in enumerate(emp_ids):
+            emp_data = {'emp_id': emp_id, 'status': employee_status(in_cur[i], in_prev[i])}
+            for name, (c, p, ch, r) in zip(names, columns):
+                emp_data[name] = {'current': c[i], 'previous': p[i], 'change': ch[i],
+                                  'change_rate': r[i]}
+            employee_data.append(emp_data)
+
+        cur_sum, prev_sum = cur.sum(axis=0), prev.sum(axis=0)
+        totals = {'current': {}, 'previous': {}, 'change': {}, 'change_rate': {}}
+        for j, name in enumerate(names):
+            c, p = float(cur_sum[j]), float(prev_sum[j])
+            totals['current'][name] = c
+            totals['previous'][name] = p
+            totals['change'][name] = c - p
+            totals['change_rate'][name] = (c - p) / p * 100 if p != 0 else 0
+        return employee_data, totals
+
+    @_locked
+    def compare_expense_types(self, year, month, prev_year, prev_month):
+        """与 comparison.compare_expense_types 相同的列式结构"""
+        codes, _, _, cur, prev = self._pair(
+            self._aggregate([to_period(year, month)]),
+            self._aggregate([to_period(prev_year, prev_month)]), _COMPARISON)
+        change = cur - prev
+        rates = _change_rates(cur, prev, new_rate=100)
+        return {
+            'emp_id': self.emp_ids[codes].tolist(),
+            'types': {
+                name: {
+                    'current': cur[:, j].tolist(),
+                    'previous': prev[:, j].tolist(),
+                    'change': change[:, j].tolist(),
+                    'change_rate': rates[:, j].tolist()
+                }
+                for j, (name, _) in enumerate(COMPARISON_MEASURES)
+            }
+        }
+
+    @_locked
+    def compare_ranges(self, current, base):
+        """与 periods.compare_ranges 相同的列式结构"""
+        codes, in_cur, in_prev, cur, prev = self._pair(
+            self._aggregate(range(current.start, current.end + 1)),
+            self._aggregate(range(base.start, base.end + 1)), _RANGE)
+        change = cur - prev
+        rates = _change_rates(cur, prev)
+        cur_sum, prev_sum = cur.sum(axis=0), prev.sum(axis=0)
+        totals = {}
+        for j, (code, _) in enumerate(RANGE_MEASURES):
+            c, p = float(cur_sum[j]), float(prev_sum[j])
+            totals[code] = {'current': c, 'previous': p, 'change': c - p,
+                            'change_rate': (c - p) / p * 100 if p != 0 else 0}
+        return {
+            'current': current.label,
+            'base': base.label,
+            'emp_id': self.emp_ids[codes].tolist(),
+            'status': [employee_status(c, p) for c, p in zip(in_cur.tolist(), in_prev.tolist())],
+            'codes': {
+                code: {
+                    'current': cur[:, j].tolist(),
+                    'previous': prev[:, j].tolist(),
+                    'change': change[:, j].tolist(),
+                    'change_rate': rates[:, j].tolist()
+                }
+                for j, (code, _) in enumerate(RANGE_MEASURES)
+            },
+            'totals': totals
+        }
+
+
+_settings = {'enabled': True, 'max_bytes': DEFAULT_MAX_BYTES}
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def configure(enabled=None, max_bytes=None):
+    if enabled is not None:
+        _settings['enabled'] = enabled
+    if max_bytes is not None:
+        _settings['max_bytes'] = max_bytes
+        with _stores_lock:
+            for store in _stores.values():
+                store.max_bytes = max_bytes
+                store.mark_dirty()
+
+
+def _database_path(conn):
+    return os.path.abspath(conn.execute("PRAGMA database_list").fetchone()[2])
+
+
+def get_expense_store(conn):
+    """返回可用的内存列式数据；未启用或超出内存上限时返回 None，调用方回退到 SQL"""
+    if not _settings['enabled']:
+        return None
+    path = _database_path(conn)
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = ExpenseStore(_settings['max_bytes'])
+    return store if store.ensure(conn) else None
+
+
+def mark_database_dirty(path, periods=None):
+    """数据库被其他进程写入时调用，periods 含义与 ExpenseStore.mark_dirty 相同"""
+    with _stores_lock:
+        store = _stores.get(os.path.abspath(path))
+    if store is not None:
+        store.mark_dirty(periods)
+
+
+def store_stats():
+    with _stores_lock:
+        stores = dict(_stores)
+    return {'enabled': _settings['enabled'],
+            'stores': {path: store.stats() for path, store in stores.items()}}
+
+
+def _on_invalidate(periods):
+    with _stores_lock:
+        stores = list(_stores.values())
+    for store in stores:
+        store.mark_dirty(periods)
+
+
+# 导入提交后 result_cache.invalidate() 通知有变化的月份
+result_cache.add_listener(_on_invalidate)
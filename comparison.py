@@ -0,0 +1,90 @@
+"""月度对比计算
+
+一次分组查询得到两个月份每个员工各项指标的当前值、对比值、变化额与变化率，
+合计由同一查询的窗口函数给出，无需在Python中逐项循环求和。
+"""
+from queries import (COMPARISON_MEASURES, DETAIL_MEASURES, EMPLOYEE_COMPARISON_SQL,
+                     MONTHLY_COMPARISON_SQL)
+
+COMPARISON_TYPES = [name for name, _ in COMPARISON_MEASURES]
+
+
+def _change_rate(current, previous):
+    return (current - previous) / previous * 100 if previous != 0 else 0
+
+
+def employee_status(in_current, in_previous):
+    """员工在两个月份中的状态：在职/新增/离职"""
+    if in_current and in_previous:
+        return 'active'
+    return 'new' if in_current else 'departed'
+
+
+def _fetch_rows(conn, sql, year, month, prev_year, prev_month):
+    cursor = conn.execute(sql, {
+        'cy': year, 'cm': month, 'py': prev_year, 'pm': prev_month
+    })
+    columns = [desc[0] for desc in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def compare_months(conn, year, month, prev_year, prev_month):
+    """对比两个月份的员工费用明细
+
+    返回 (employee_data, totals)：
+    - employee_data: 每个员工一项，包含 emp_id、status 以及各指标的
+      current/previous/change/change_rate；只在对比月份出现的离职员工也会返回
+    - totals: {'current'|'previous'|'change'|'change_rate': {指标: 值}}
+    """
+    rows = _fetch_rows(conn, MONTHLY_COMPARISON_SQL, year, month, prev_year, prev_month)
+
+    employee_data = []
+    for row in rows:
+        emp_data = {
+            'emp_id': row['emp_id'],
+            'status': employee_status(row['in_current'], row['in_previous'])
+        }
+        for name, _ in DETAIL_MEASURES:
+            emp_data[name] = {
+                'current': row[f'{name}_current'],
+                'previous': row[f'{name}_previous'],
+                'change': row[f'{name}_change'],
+                'change_rate': row[f'{name}_change_rate']
+            }
+        employee_data.append(emp_data)
+
+    totals = {
+        'current': {},
+        'previous': {},
+        'change': {},
+        'change_rate': {}
+    }
+    for name, _ in DETAIL_MEASURES:
+        curr_sum = rows[0][f'{name}_current_sum'] if rows else 0.0
+        prev_sum = rows[0][f'{name}_previous_sum'] if rows else 0.0
+        totals['current'][name] = curr_sum
+        totals['previous'][name] = prev_sum
+        totals['change'][name] = curr_sum - prev_sum
+        totals['change_rate'][name] = _change_rate(curr_sum, prev_sum)
+
+    return employee_data, totals
+
+
+def compare_expense_types(conn, year, month, prev_year, prev_month):
+    """一次查询得到全部费用类型的员工对比数据（列式结构）
+
+    返回 {'emp_id': [...], 'types': {类型: {'current': [...], 'previous': [...],
+    'change': [...], 'change_rate': [...]}}}，各数组与 emp_id 按位置对应，
+    员工按 emp_id 排序，包含任一月份有记录的员工。
+    """
+    rows = _fetch_rows(conn, EMPLOYEE_COMPARISON_SQL, year, month, prev_year, prev_month)
+    return {
+        'emp_id': [row['emp_id'] for row in rows],
+        'types': {
+            name: {
+                field: [row[f'{name}_{field}'] for row in rows]
+                for field in ('current', 'previous', 'change', 'change_rate')
+            }
+            for name in COMPARISON_TYPES
+        }
+    }
@@ -0,0 +1,84 @@
+"""社保公积金缴费计算
+
+把 SOCIAL_INSURANCE_CONFIG 编译为按险种排列的 NumPy 数组（费率、基数上下限），
+员工 × 险种的缴费基数和金额由一次 np.clip 与乘法得到：
+    base   = clip(工资, min_base, max_base)
+    amount = round_half_up(base * rate, AMOUNT_DECIMALS)
+
+舍入规则显式固定为四舍五入到分（不使用 Python/NumPy 默认的银行家舍入），
+与工资表中的金额口径一致，便于对账。
+"""
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from config import SOCIAL_INSURANCE_CONFIG
+
+BASE_DECIMALS = 2
+AMOUNT_DECIMALS = 2
+
+# 抵消 0.125 * 100 之类在二进制下略小于 .5 的误差
+_ROUNDING_EPSILON = 1e-9
+
+
+def round_half_up(values, decimals=AMOUNT_DECIMALS):
+    """按绝对值四舍五入到指定小数位（-1.005 -> -1.01）"""
+    values = np.asarray(values, dtype=np.float64)
+    scale = 10.0 ** decimals
+    return np.sign(values) * np.floor(np.abs(values) * scale + 0.5 + _ROUNDING_EPSILON) / scale
+
+
+class RateTable(namedtuple('RateTable', ['codes', 'names', 'rates', 'min_base', 'max_base'])):
+    """按险种排列的费率表，各字段为等长的 NumPy 数组"""
+    __slots__ = ()
+
+    @classmethod
+    def from_items(cls, items):
+        """items: (code, name, rate, min_base, max_base) 序列"""
+        items = list(items)
+        return cls(
+            codes=np.array([item[0] for item in items], dtype=object),
+            names=np.array([item[1] for item in items], dtype=object),
+            rates=np.array([item[2] for item in items], dtype=np.float64),
+            min_base=np.array([item[3] for item in items], dtype=np.float64),
+            max_base=np.array([item[4] for item in items], dtype=np.float64)
+        )
+
+    def index_of(self, code):
+        return list(self.codes).index(code)
+
+
+def compile_rates(config=SOCIAL_INSURANCE_CONFIG):
+    """把配置字典编译为 RateTable，跳过没有费率的项（如工资）"""
+    return RateTable.from_items(
+        (item['code'], item['name'], item['rate'], item['min_base'], item['max_base'])
+        for item in config.values() if 'rate' in item
+    )
+
+
+DEFAULT_RATES = compile_rates()
+
+
+def compute_contributions(salaries, table=DEFAULT_RATES):
+    """计算员工 × 险种的缴费基数和金额
+
+    返回 (base, amount) 两个形状为 (员工数, 险种数) 的矩阵，列顺序与 table.codes 一致。
+    """
+    salaries = round_half_up(salaries, BASE_DECIMALS)
+    base = np.clip(salaries[:, None], table.min_base, table.max_base)
+    amount = round_half_up(base * table.rates, AMOUNT_DECIMALS)
+    return base, amount
+
+
+def contribution_records(employee_ids, salaries, table=DEFAULT_RATES):
+    """把缴费矩阵展开为长表（每员工每险种一行），供批量写入 insurance_records
+
+    行顺序为按险种分组、组内按员工原顺序。
+    """
+    base, amount = compute_contributions(salaries, table)
+    employee_ids = np.asarray(employee_ids)
+    return pd.DataFrame({
+        'employee_id': np.tile(employee_ids, len(table.codes)),
+        'insurance_type': np.repeat(table.codes, len(employee_ids)),
+        'base_amount': base.T.ravel(),
+        'amount': amount.T.ravel()
+    })
@@ -0,0 +1,141 @@
+"""SQLite连接池
+
+Flask应用与ExcelHandler共用，按数据库路径各自维护一个连接池：
+- 连接创建时统一设置 WAL、synchronous=NORMAL、cache_size、mmap_size，
+  WAL模式下导入写入期间读请求不会被阻塞
+- 取出连接时做健康检查，失效的连接自动重建
+- 归还连接时回滚未提交的事务
+- 开启埋点时连接为 profiling.ProfiledConnection，每次执行记录耗时和行数
+取得的 PooledConnection 用法与 sqlite3.Connection 相同，close() 即归还到池中。
+"""
+import queue
+import sqlite3
+import threading
+import profiling
+
+DEFAULT_POOL_SIZE = 8
+DEFAULT_TIMEOUT = 30.0
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,          # 负数单位为KB，约16MB页缓存
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 30000,         # 写锁等待毫秒数
+    'temp_store': 'MEMORY'
+}
+
+
+class PooledConnection:
+    """连接池中的连接，close() 时归还而不是真正关闭"""
+
+    def __init__(self, pool, conn, release_on_close=True):
+        self._pool = pool
+        self._conn = conn
+        self._release_on_close = release_on_close
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError('连接已归还到连接池')
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._conn.__exit__(exc_type, exc, tb)
+
+    def borrow(self):
+        """返回共享同一连接的句柄，其 close() 不归还连接（用于请求内复用）"""
+        return PooledConnection(self._pool, self._conn, release_on_close=False)
+
+    def close(self):
+        if self._conn is None:
+            return
+        if self._release_on_close:
+            self._pool.release(self._conn)
+        self._conn = None
+
+
+class ConnectionPool:
+    def __init__(self, path, max_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT, pragmas=None):
+        self.path = path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False,
+                               factory=profiling.connection_factory())
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    @staticmethod
+    def _healthy(conn):
+        try:
+            # 绕过埋点，健康检查不计入请求的查询统计
+            sqlite3.Connection.execute(conn, "SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self):
+        """取出一个可用连接，连接池耗尽时最多等待timeout秒"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f'数据库连接池已耗尽: {self.path}')
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            else:
+                if not self._healthy(conn):
+                    conn.close()
+                    conn = self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+        return PooledConnection(self, conn)
+
+    def release(self, conn):
+        """归还连接，未提交的事务会被回滚"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = sqlite3.Row
+            self._idle.put(conn)
+        except sqlite3.Error:
+            conn.close()
+        finally:
+            self._slots.release()
+
+    def close_all(self):
+        """关闭所有空闲连接"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path, **options):
+    """返回指定数据库的连接池，首次调用时按options创建"""
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None:
+            pool = _pools[path] = ConnectionPool(path, **options)
+        return pool
+
+
+def connect(path, **options):
+    """从连接池取出一个连接，用完调用 close() 归还"""
+    return get_pool(path, **options).acquire()
@@ -0,0 +1,333 @@
+"""员工维度 emp_info 与按员工属性的费用分组
+
+emp_info 每个员工一行（emp_id 主键）：入职日期统一为 YYYY-MM-DD，另存入职月序号
+join_period（periods.to_period）并建索引，分组时无需解析日期；身份证号、电话保持文本。
+表上的触发器在每次增删改后递增 table_versions 中的版本号。
+
+EmployeeDimension 把整张表读入内存 {emp_id: 属性}，使用前对比一次版本号，
+表有变化（本进程或 copy_emp_info.py 等其他进程写入）时重新读取。
+
+breakdown() 按职级 / 工龄段 / 入职年份对一个期间区间的费用分组合计：
+内存列式数据可用时按员工编码查属性数组后一次 bincount 汇总；
+否则执行一条 expense LEFT JOIN emp_info 的分组查询。
+
+用法: python employees.py [--db Cluster_Expense.db] [--range 2024-06] [--by level|tenure|cohort]
+"""
+import argparse
+import json
+import threading
+from datetime import date, datetime, timedelta
+import numpy as np
+import pandas as pd
+import columnar_store
+from ingest import AMOUNT_FIELDS, normalize_emp_id
+from periods import from_period, parse_range, to_period
+from queries import BREAKDOWN_SQL, DETAIL_MEASURES
+
+EMP_INFO_FIELDS = ['emp_id', 'name', 'level', 'id_no', 'contact_no', 'join_date']
+LEVELS = ['Blue', 'S', 'AM', 'M', 'Red']
+DIMENSIONS = list(BREAKDOWN_SQL)
+UNKNOWN = '未知'
+UNKNOWN_KEY = -1
+# 工龄段：入职至当月的月数 [0, 12)、[12, 36)、[36, 60)、[60, 120)、120以上，与 queries.BREAKDOWN_KEYS 一致
+TENURE_BOUNDS = [12, 36, 60, 120]
+TENURE_LABELS = ['1年以内', '1-3年', '3-5年', '5-10年', '10年以上']
+EXCEL_EPOCH = date(1899, 12, 30)
+
+CREATE_EMP_INFO_SQL = '''
+    CREATE TABLE {table} (
+        emp_id TEXT PRIMARY KEY,           -- 员工ID（5位字符）
+        name TEXT,                         -- 姓名
+        level TEXT,                        -- 职级
+        id_no TEXT,                        -- 身份证号（文本，保留末位X）
+        contact_no TEXT,                   -- 联系电话
+        join_date TEXT,                    -- 入职日期 YYYY-MM-DD
+        join_period INTEGER                -- 入职月序号 year * 12 + month - 1
+    ) WITHOUT ROWID
+'''
+
+CREATE_EMP_INFO_INDEXES_SQL = [
+    "CREATE INDEX IF NOT EXISTS idx_emp_info_level ON emp_info (level)",
+    "CREATE INDEX IF NOT EXISTS idx_emp_info_join ON emp_info (join_period)"
+]
+
+CREATE_VERSIONS_SQL = '''
+    CREATE TABLE IF NOT EXISTS table_versions (
+        name TEXT PRIMARY KEY,             -- 表名
+        version INTEGER NOT NULL DEFAULT 0 -- 每次增删改递增
+    )
+'''
+
+_VERSION_TRIGGER_SQL = '''
+    CREATE TRIGGER IF NOT EXISTS emp_info_version_{event} AFTER {event} ON emp_info
+    BEGIN
+        UPDATE table_versions SET version = version + 1 WHERE name = 'emp_info';
+    END
+'''
+
+VERSION_SQL = "SELECT version FROM table_versions WHERE name = 'emp_info'"
+
+UPSERT_EMP_INFO_SQL = f'''
+    INSERT INTO emp_info ({', '.join(EMP_INFO_FIELDS)}, join_period)
+    VALUES ({', '.join('?' for _ in EMP_INFO_FIELDS)}, ?)
+    ON CONFLICT (emp_id) DO UPDATE SET
+        {', '.join(f'{field} = excluded.{field}' for field in EMP_INFO_FIELDS[1:])},
+        join_period = excluded.join_period
+'''
+
+_SELECT_EMP_INFO_SQL = "SELECT emp_id, name, level, join_date, join_period FROM emp_info"
+
+
+def parse_join_date(value):
+    """入职日期 -> date：支持日期/时间戳、'YYYY-MM-DD'、'YYYY/MM/DD'、'YYYYMMDD'及Excel序列号，无法识别时为None"""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+    if not text or text.lower() in ('nan', 'nat', 'none'):
+        return None
+    try:
+        serial = float(text)
+    except ValueError:
+        serial = None
+    if serial is not None and 1 <= serial < 100000 and len(text.split('.')[0]) <= 5:
+        return EXCEL_EPOCH + timedelta(days=int(serial))
+    for fmt in ('%Y-%m-%d', '%Y/%m/%d', '%Y%m%d', '%Y-%m-%d %H:%M:%S', '%Y/%m/%d %H:%M:%S'):
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _text(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    text = str(value).strip()
+    return text[:-2] if text.endswith('.0') and text[:-2].isdigit() else (text or None)
+
+
+def emp_info_rows(df):
+    """emp_info 数据 -> 写入行（EMP_INFO_FIELDS + join_period），同一员工保留最后一行"""
+    df = df.reindex(columns=EMP_INFO_FIELDS)
+    df = df[df['emp_id'].notna()].copy()
+    df['emp_id'] = normalize_emp_id(df['emp_id'])
+    df = df.drop_duplicates('emp_id', keep='last')
+    rows = []
+    for emp_id, name, level, id_no, contact_no, join in df.itertuples(index=False, name=None):
+        joined = parse_join_date(join)
+        rows.append((emp_id, _text(name), _text(level), _text(id_no), _text(contact_no),
+                     joined.isoformat() if joined else None,
+                     to_period(joined.year, joined.month) if joined else None))
+    return rows
+
+
+def create_emp_info(cursor):
+    """建立带类型的 emp_info 表、索引和版本触发器；已有的全文本旧表按 emp_info_rows 规范后迁入"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'emp_info'")
+    old_rows = None
+    if cursor.fetchone() is not None:
+        cursor.execute("PRAGMA table_info(emp_info)")
+        columns = [row[1] for row in cursor.fetchall()]
+        present = [field for field in EMP_INFO_FIELDS if field in columns]
+        cursor.execute(f"SELECT {', '.join(present)} FROM emp_info ORDER BY rowid")
+        old_rows = pd.DataFrame(cursor.fetchall(), columns=present)
+        cursor.execute("DROP TABLE emp_info")
+    cursor.execute(CREATE_EMP_INFO_SQL.format(table='emp_info'))
+    for sql in CREATE_EMP_INFO_INDEXES_SQL:
+        cursor.execute(sql)
+    cursor.execute(CREATE_VERSIONS_SQL)
+    cursor.execute("INSERT OR IGNORE INTO table_versions (name, version) VALUES ('emp_info', 0)")
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(_VERSION_TRIGGER_SQL.format(event=event))
+    if old_rows is not None and len(old_rows):
+        cursor.executemany(UPSERT_EMP_INFO_SQL, emp_info_rows(old_rows))
+
+
+def write_emp_info(conn, df, replace_all=False):
+    """写入员工信息（按 emp_id 覆盖），replace_all 时先清空；提交事务，返回写入行数
+
+    表结构需已迁移（migrations.migrate）。内存中的 EmployeeDimension 按版本号自动刷新。
+    """
+    rows = emp_info_rows(df)
+    try:
+        if replace_all:
+            conn.execute("DELETE FROM emp_info")
+        conn.executemany(UPSERT_EMP_INFO_SQL, rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(rows)
+
+
+def _level_order(levels):
+    known = [level for level in LEVELS if level in levels]
+    return known + sorted(levels - set(known))
+
+
+class EmployeeDimension:
+    """emp_info 的内存副本：{emp_id: {'name', 'level', 'join_date', 'join_period'}}"""
+
+    def __init__(self):
+        self.version = None
+        self.attributes = {}
+        self.levels = []            # 出现过的职级，LEVELS 中的按其顺序，其余按名称
+        self.loads = 0
+        self._lock = threading.Lock()
+
+    def ensure(self, conn):
+        """表版本变化时重新读取，返回自身"""
+        row = conn.execute(VERSION_SQL).fetchone()
+        version = row[0] if row else None
+        with self._lock:
+            if version != self.version or self.loads == 0:
+                self._load(conn, version)
+        return self
+
+    def _load(self, conn, version):
+        attributes = {}
+        for emp_id, name, level, join_date, join_period in conn.execute(_SELECT_EMP_INFO_SQL).fetchall():
+            attributes[emp_id] = {'name': name, 'level': level, 'join_date': join_date,
+                                  'join_period': join_period}
+        self.attributes = attributes
+        self.levels = _level_order({a['level'] for a in attributes.values() if a['level'] is not None})
+        self.version = version
+        self.loads += 1
+
+    def get(self, emp_id):
+        return self.attributes.get(emp_id)
+
+    def level_key(self, level):
+        return self.levels.index(level) if level in self.levels else UNKNOWN_KEY
+
+    def lookup(self, emp_ids, attribute):
+        """按 emp_ids 顺序返回属性的整数数组：level 为职级序号，join_period 为入职月序号，缺失为 -1"""
+        attributes = self.attributes
+        if attribute == 'level':
+            keys = {level: index for index, level in enumerate(self.levels)}
+            values = (keys.get((attributes.get(emp_id) or {}).get('level'), UNKNOWN_KEY)
+                      for emp_id in emp_ids)
+        else:
+            values = ((attributes.get(emp_id) or {}).get(attribute) for emp_id in emp_ids)
+            values = (UNKNOWN_KEY if value is None else value for value in values)
+        return np.fromiter(values, dtype=np.int64, count=len(emp_ids))
+
+    def label(self, dimension, key):
+        if key == UNKNOWN_KEY:
+            return UNKNOWN
+        if dimension == 'level':
+            return self.levels[key]
+        if dimension == 'tenure':
+            return TENURE_LABELS[key]
+        return f'{key}年入职'
+
+    def stats(self):
+        return {'employees': len(self.attributes), 'levels': self.levels,
+                'version': self.version, 'loads': self.loads}
+
+
+_dimensions = {}
+_dimensions_lock = threading.Lock()
+
+
+def _database_path(conn):
+    return conn.execute("PRAGMA database_list").fetchone()[2]
+
+
+def get_dimension(conn):
+    """返回连接所属数据库的员工维度（按数据库文件缓存，版本变化时刷新）"""
+    path = _database_path(conn)
+    with _dimensions_lock:
+        dimension = _dimensions.get(path)
+        if dimension is None:
+            dimension = _dimensions[path] = EmployeeDimension()
+    return dimension.ensure(conn)
+
+
+# ---- 分组合计 ----
+
+_MEASURES = columnar_store.measure_matrix(DETAIL_MEASURES)
+
+
+def group_keys(dimension_name, values, period):
+    """按员工属性数组计算当月的分组键（与 queries.BREAKDOWN_KEYS 一致）"""
+    if dimension_name == 'level':
+        return values
+    joined = values != UNKNOWN_KEY
+    if dimension_name == 'tenure':
+        bands = np.searchsorted(TENURE_BOUNDS, period - values, side='right')
+        return np.where(joined, bands, UNKNOWN_KEY)
+    return np.where(joined, values // 12, UNKNOWN_KEY)
+
+
+def _sql_groups(conn, dimension, dimension_name, period_range):
+    cursor = conn.execute(BREAKDOWN_SQL[dimension_name], {
+        'start': period_range.start, 'end': period_range.end,
+        'year_min': from_period(period_range.start)[0], 'year_max': from_period(period_range.end)[0]
+    })
+    rows = cursor.fetchall()
+    keys = [dimension.level_key(row[0]) if dimension_name == 'level'
+            else int(row[0]) for row in rows]
+    headcount = np.array([row[1] for row in rows], dtype=np.int64)
+    sums = np.array([row[2:] for row in rows], dtype=np.float64).reshape(len(rows), len(AMOUNT_FIELDS))
+    return np.array(keys, dtype=np.int64), headcount, sums
+
+
+def breakdown(conn, dimension_name, period_range):
+    """按职级(level)、工龄段(tenure)或入职年份(cohort)分组合计一个期间区间的费用
+
+    返回列式结构：
+    {'range': 标签, 'dimension': 维度, 'groups': [组名], 'headcount': [人数],
+     'measures': {指标: [金额]}, 'totals': {指标: 合计}}
+    组按职级顺序 / 工龄由短到长 / 入职年份排列，无员工信息的归入“未知”排在最后；
+    人数为区间内在该组有费用记录的员工数。
+    """
+    if dimension_name not in BREAKDOWN_SQL:
+        raise ValueError(f'无效的分组维度: {dimension_name}（可选 {", ".join(DIMENSIONS)}）')
+    dimension = get_dimension(conn)
+    store = columnar_store.get_expense_store(conn)
+    if store is not None:
+        attribute = 'level' if dimension_name == 'level' else 'join_period'
+        keys, headcount, sums = store.breakdown(
+            period_range, (attribute, id(dimension), dimension.version),
+            lambda emp_ids: dimension.lookup(emp_ids, attribute),
+            lambda values, period: group_keys(dimension_name, values, period))
+    else:
+        keys, headcount, sums = _sql_groups(conn, dimension, dimension_name, period_range)
+
+    # 未知排在最后
+    order = np.lexsort((keys, keys == UNKNOWN_KEY))
+    keys, headcount, values = keys[order], headcount[order], (sums @ _MEASURES)[order]
+    return {
+        'range': period_range.label,
+        'dimension': dimension_name,
+        'groups': [dimension.label(dimension_name, int(key)) for key in keys],
+        'headcount': headcount.tolist(),
+        'measures': {name: values[:, j].tolist() for j, (name, _) in enumerate(DETAIL_MEASURES)},
+        'totals': {name: float(values[:, j].sum()) for j, (name, _) in enumerate(DETAIL_MEASURES)}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='按员工属性分组的费用合计')
+    parser.add_argument('--db', default='Cluster_Expense.db')
+    parser.add_argument('--range', required=True, help='期间区间，如 2024-06、2024Q1、R12@2024-12')
+    parser.add_argument('--by', default='level', choices=DIMENSIONS)
+    args = parser.parse_args()
+
+    from db import connect
+    from migrations import migrate
+    conn = connect(args.db)
+    try:
+        migrate(conn)
+        print(json.dumps(breakdown(conn, args.by, parse_range(args.range)), ensure_ascii=False, indent=2))
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
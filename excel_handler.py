@@ -1,78 +1,114 @@
 import pandas as pd
 import sqlite3
 from datetime import datetime
-from config import SOCIAL_INSURANCE_CONFIG
+from contributions import contribution_records
+from ingest import (EXPENSE_FIELDS, IngestPipeline, invalidate_expense_cache,
+                    normalize_emp_id, normalize_expense_frame,
+                    refresh_expense_summary, require_columns, table_writer)
+from migrations import migrate
+from rates import DEFAULT_REGION, ensure_table, parse_month, resolve_rates
+from db import connect
+from readers import read_table
+from salary_merge import read_merged_sheet
 import logging
+import profiling
+
+# employee_expenses 长表中的费用类型
+EXPENSE_TYPES = ['HF', 'PEN', 'UEM', 'MED1', 'MED2', 'INJ', 'UF']
 
 class ExcelHandler:
     def __init__(self, db_path='employee.db'):
         self.db_path = db_path
-        # 设置日志记录
+        # 设置日志记录（DEBUG 级别仅在开启调试输出时启用）
         logging.basicConfig(
             filename='excel_handler.log',
-            level=logging.DEBUG,
+            level=logging.DEBUG if profiling.debug_enabled() else logging.INFO,
             format='%(asctime)s - %(levelname)s - %(message)s'
         )
         self.logger = logging.getLogger(__name__)
 
     def get_db_connection(self):
-        """创建数据库连接"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        """从连接池获取数据库连接（close() 即归还）"""
+        return connect(self.db_path)
 
-    def process_excel(self, file_path, month):
-        """处理Excel文件并导入数据库"""
-        try:
-            # 读取Excel文件
-            df = pd.read_excel(file_path)
-            print("Excel open suceassed")
-            # 验证必需的列是否存在
-            required_columns = ['姓名', '工资']
-            if not all(col in df.columns for col in required_columns):
-                raise ValueError("Excel文件必须包含 '姓名' 和 '工资' 列")
+    def process_excel(self, file_path, month, region=DEFAULT_REGION):
+        """处理Excel文件并导入数据库
 
+        month 为 'YYYY-MM'，按地区和月份从费率表取适用的费率和基数。
+        """
+        try:
             conn = self.get_db_connection()
-            cursor = conn.cursor()
+            # employee.db 只需要费率表，不执行 expense 的迁移
+            ensure_table(conn)
+            rates = resolve_rates(conn, parse_month(month), region)
 
-            # 处理每一行数据
-            for _, row in df.iterrows():
-                # 1. 插入或更新员工信息
-                cursor.execute('''
-                    INSERT OR REPLACE INTO employees (name, salary, department)
-                    VALUES (?, ?, ?)
-                ''', (row['姓名'], row['工资'], row.get('部门', None)))
-                
-                employee_id = cursor.lastrowid
-
-                # 2. 计算并插入各项保险记录
-                for insurance_type, config in SOCIAL_INSURANCE_CONFIG.items():
-                    if insurance_type == 'SALARY':  # 跳过工资配置项
-                        continue
-                        
-                    # 计算缴费基数和金额
-                    base_amount = min(max(row['工资'], config['min_base']), config['max_base'])
-                    amount = base_amount * config['rate']
-
-                    # 插入保险记录
-                    cursor.execute('''
-                        INSERT INTO insurance_records 
-                        (employee_id, month, insurance_type, base_amount, amount)
-                        VALUES (?, ?, ?, ?, ?)
-                    ''', (employee_id, month, config['code'], base_amount, amount))
-
-            conn.commit()
+            pipeline = IngestPipeline(
+                'process_excel',
+                read=read_table,
+                validate=self._validate_salary_frame,
+                write=lambda pipeline, cursor, df: self._write_employee_insurance(
+                    pipeline, cursor, df, month, rates),
+                logger=self.logger
+            )
+            pipeline.run(conn, file_path)
             return True, "数据导入成功"
 
         except Exception as e:
-            if 'conn' in locals():
-                conn.rollback()
             return False, f"导入失败: {str(e)}"
             
         finally:
             if 'conn' in locals():
                 conn.close()
 
+    def _validate_salary_frame(self, df):
+        """验证必需的列是否存在并规范工资列"""
+        required_columns = ['姓名', '工资']
+        if not all(col in df.columns for col in required_columns):
+            raise ValueError("Excel文件必须包含 '姓名' 和 '工资' 列")
+
+        df = df.copy()
+        df['工资'] = pd.to_numeric(df['工资'], errors='coerce')
+        if df['工资'].isna().any():
+            raise ValueError("工资列存在空值或非数字")
+        if '部门' not in df.columns:
+            df['部门'] = None
+        # 部门为空时写入NULL
+        df['部门'] = df['部门'].astype(object).where(df['部门'].notna(), None)
+        return df
+
+    def _write_employee_insurance(self, pipeline, cursor, df, month, rates):
+        """批量写入员工信息及各项保险记录"""
+        # 1. 插入或更新员工信息
+        written = pipeline.write_batches(cursor, '''
+            INSERT OR REPLACE INTO employees (name, salary, department)
+            VALUES (?, ?, ?)
+        ''', df, ['姓名', '工资', '部门'])
+
+        # executemany 无法逐行拿到 lastrowid，按姓名回查本次写入的员工ID
+        names = df['姓名'].drop_duplicates().tolist()
+        employee_ids = {}
+        for start in range(0, len(names), 500):
+            batch = names[start:start + 500]
+            placeholders = ','.join('?' for _ in batch)
+            cursor.execute(f'''
+                SELECT name, MAX(id) FROM employees
+                WHERE name IN ({placeholders})
+                GROUP BY name
+            ''', batch)
+            employee_ids.update({row[0]: row[1] for row in cursor.fetchall()})
+        ids = df['姓名'].map(employee_ids)
+
+        # 2. 一次矩阵运算得到员工 × 险种的缴费基数和金额
+        records = contribution_records(ids.to_numpy(), df['工资'].to_numpy(dtype=float), rates)
+        records['month'] = month
+
+        written += pipeline.write_batches(cursor, '''
+            INSERT INTO insurance_records 
+            (employee_id, month, insurance_type, base_amount, amount)
+            VALUES (?, ?, ?, ?, ?)
+        ''', records, ['employee_id', 'month', 'insurance_type', 'base_amount', 'amount'])
+        return written
+
     def get_monthly_summary(self, month):
         """获取指定月份的汇总数据"""
         conn = self.get_db_connection()
@@ -120,63 +156,30 @@ class ExcelHandler:
         """导入社保公积金费用Excel文件到employee_expenses表"""
         self.logger.info(f"开始导入文件: {file_path}")
         try:
-            # 读取Excel文件
-            df = pd.read_excel(file_path)
-            self.logger.debug(f"读取到的Excel数据: {df.head()}")
-
-            # 验证必需的列是否存在
-            required_columns = ['emp_id', 'year', 'month']
-            expense_columns = ['HF', 'PEN', 'UEM', 'MED1', 'MED2', 'INJ', 'UF']
-            
-            # 验证所有必需列
-            missing_columns = [col for col in required_columns + expense_columns if col not in df.columns]
-            if missing_columns:
-                raise ValueError(f"Excel文件缺少以下列: {', '.join(missing_columns)}")
-
-            conn = self.get_db_connection()
-            cursor = conn.cursor()
-
             # 获取当前时间和文件名
             current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             file_name = file_path.split('/')[-1]
 
-            # 处理每一行数据
-            for _, row in df.iterrows():
-                # 验证必需字段的值
-                if pd.isna(row['emp_id']) or pd.isna(row['year']) or pd.isna(row['month']):
-                    self.logger.warning(f"跳过无效行: {row}")
-                    continue  # 跳过无效行
-
-                # 确保 emp_id 为5位字符
-                emp_id = str(row['emp_id']).zfill(5)
-
-                # 对每个费用类型创建记录
-                for expense_type in expense_columns:
-                    amount = row[expense_type]
-                    if pd.notna(amount):  # 只插入非空值
-                        cursor.execute('''
-                            INSERT INTO employee_expenses 
-                            (emp_id, year, month, trans_type, amount, create_time, remarks)
-                            VALUES (?, ?, ?, ?, ?, ?, ?)
-                        ''', (
-                            emp_id,               # 保留为5位字符
-                            int(row['year']),     # 确保year为整数
-                            int(row['month']),    # 确保month为整数
-                            expense_type,
-                            float(amount),        # 确保amount为浮点数
-                            current_time,
-                            file_name
-                        ))
-                        self.logger.debug(f"插入记录: emp_id={emp_id}, year={row['year']}, month={row['month']}, type={expense_type}, amount={amount}")
-
-            conn.commit()
+            pipeline = IngestPipeline(
+                'import_expenses',
+                read=lambda path: read_table(
+                    path, usecols=['emp_id', 'year', 'month'] + EXPENSE_TYPES),
+                normalize=lambda df: self._melt_expenses(df, current_time, file_name),
+                write=table_writer('''
+                    INSERT INTO employee_expenses 
+                    (emp_id, year, month, trans_type, amount, create_time, remarks)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', ['emp_id', 'year', 'month', 'trans_type', 'amount',
+                      'create_time', 'remarks']),
+                logger=self.logger
+            )
+            conn = self.get_db_connection()
+            pipeline.run(conn, file_path)
             self.logger.info("费用数据导入成功")
             return True, "费用数据导入成功"
 
         except Exception as e:
             self.logger.error(f"导入失败: {str(e)}", exc_info=True)
-            if 'conn' in locals():
-                conn.rollback()
             return False, f"费用导入失败: {str(e)}"
             
         finally:
@@ -184,6 +187,36 @@ class ExcelHandler:
                 conn.close()
                 self.logger.info("数据库连接已关闭")
 
+    def _melt_expenses(self, df, current_time, file_name):
+        """把宽表（每种费用一列）转换为employee_expenses的长表"""
+        # 验证必需的列是否存在
+        required_columns = ['emp_id', 'year', 'month']
+        require_columns(df, required_columns + EXPENSE_TYPES)
+
+        # 跳过必需字段为空的行
+        invalid = df[required_columns].isna().any(axis=1)
+        if invalid.any():
+            self.logger.warning(f"跳过无效行 {int(invalid.sum())} 行")
+            df = df[~invalid]
+
+        long_df = df.melt(
+            id_vars=required_columns,
+            value_vars=EXPENSE_TYPES,
+            var_name='trans_type',
+            value_name='amount'
+        )
+        # 只插入非空值
+        long_df = long_df[long_df['amount'].notna()].reset_index(drop=True)
+
+        # 确保 emp_id 为5位字符，year/month为整数，amount为浮点数
+        long_df['emp_id'] = normalize_emp_id(long_df['emp_id'])
+        long_df['year'] = long_df['year'].astype('int64')
+        long_df['month'] = long_df['month'].astype('int64')
+        long_df['amount'] = long_df['amount'].astype('float64')
+        long_df['create_time'] = current_time
+        long_df['remarks'] = file_name
+        return long_df
+
     def import_cluster_expense(self, file_path, db_path='Cluster_Expense.db'):
         """导入Excel数据到Cluster_Expense.db的expense表
         
@@ -199,72 +232,38 @@ class ExcelHandler:
         """
         self.logger.info(f"开始导入文件到Cluster_Expense: {file_path}")
         try:
-            # 读取Excel文件的Sheet1
-            df = pd.read_excel(file_path, sheet_name='Sheet1')
-            self.logger.debug(f"读取到的Excel数据: {df.head()}")
-
-            # 确保emp_id为5位字符
-            df['emp_id'] = df['emp_id'].astype(str).str.zfill(5)
-
             # 连接到Cluster_Expense数据库
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
+            conn = connect(db_path)
 
-            # 创建expense表（如果不存在）
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS expense (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    emp_id TEXT NOT NULL,           -- 员工ID（5位字符）
-                    year INTEGER NOT NULL,          -- 年份
-                    month INTEGER NOT NULL,         -- 月份
-                    SAL REAL NOT NULL,             -- 工资
-                    HF REAL NOT NULL,              -- Housing Fund（住房公积金）
-                    PEN REAL NOT NULL,             -- Pension（养老保险）
-                    UEM REAL NOT NULL,             -- Unemployment（失业保险）
-                    MED1 REAL NOT NULL,            -- Medical Insurance 1（医疗保险1）
-                    MED2 REAL NOT NULL,            -- Medical Insurance 2（医疗保险2）
-                    INJ REAL NOT NULL,             -- Injury Insurance（工伤保险）
-                    UF REAL NOT NULL,              -- Unit Fund（工会费）
-                    create_time TEXT NOT NULL,      -- 记录创建时间
-                    UNIQUE(emp_id, year, month)     -- 确保同一员工同一月份不会重复记录
-                )
-            ''')
+            # 创建或升级expense表（唯一键 emp_id + year + month）
+            migrate(conn)
 
             # 获取当前时间
             current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-            # 将DataFrame数据插入到expense表
-            for _, row in df.iterrows():
-                cursor.execute('''
+            # 读取Excel文件的Sheet1（有Sal工作表时先合并工资），整列规范emp_id/年月/金额后批量写入
+            pipeline = IngestPipeline(
+                'import_cluster_expense',
+                read=read_merged_sheet,
+                normalize=lambda df: normalize_expense_frame(df).assign(
+                    create_time=current_time),
+                write=table_writer('''
                     INSERT OR REPLACE INTO expense 
                     (emp_id, year, month, SAL, HF, PEN, UEM, MED1, MED2, INJ, UF, create_time)
                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    row['emp_id'],
-                    int(row['year']),
-                    int(row['month']),
-                    float(row['SAL']),
-                    float(row['HF']),
-                    float(row['PEN']),
-                    float(row['UEM']),
-                    float(row['MED1']),
-                    float(row['MED2']),
-                    float(row['INJ']),
-                    float(row['UF']),
-                    current_time
-                ))
-
-            conn.commit()
+                ''', EXPENSE_FIELDS + ['create_time'], after_write=refresh_expense_summary),
+                on_commit=invalidate_expense_cache,
+                logger=self.logger
+            )
+            pipeline.run(conn, file_path)
             self.logger.info("数据导入Cluster_Expense.db成功")
             return True, "数据导入成功"
 
         except Exception as e:
             self.logger.error(f"导入失败: {str(e)}", exc_info=True)
-            if 'conn' in locals():
-                conn.rollback()
             return False, f"导入失败: {str(e)}"
             
         finally:
             if 'conn' in locals():
                 conn.close()
-                self.logger.info("数据库连接已关闭")
\ No newline at end of file
+                self.logger.info("数据库连接已关闭")
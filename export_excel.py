@@ -1,21 +1,205 @@
-import sqlite3
-import pandas as pd
-
-# 连接到 SQLite 数据库
-db_path = "cluster_expense.db"  # 请替换为实际的数据库路径
-conn = sqlite3.connect(db_path)
-
-# 从数据库中读取 expense 表
-query = "SELECT * FROM expense"
-df = pd.read_sql_query(query, conn)
-
-# 关闭数据库连接
-conn.close()
-
-# 指定目标 Excel 文件路径
-target_file = r"D:\OneDrive - Marriott International\Attachments\20241121\Cluster_Expense\Export20241207.xlsx"
-
-# 将数据写入 Excel 文件
-df.to_excel(target_file, sheet_name='expense', index=False)
-
-print("数据已成功从 SQLite 导出到 Export20241207.xlsx")
\ No newline at end of file
+"""从 SQLite 分块流式导出 expense 表为 xlsx
+
+按 fetchmany 分块读取，边生成工作表XML边写入zip流：
+内存占用与导出行数无关，Web端在整个工作簿生成完之前即可收到首个字节。
+
+用法: python export_excel.py [-o 输出文件] [--db 数据库] [--range 2024Q1] [--emp 00017,00560]
+"""
+import argparse
+import sqlite3
+import time
+import zipfile
+from datetime import datetime
+from xml.sax.saxutils import escape
+import profiling
+from periods import from_period, parse_range
+
+EXPORT_COLUMNS = ['emp_id', 'year', 'month', 'SAL', 'HF', 'PEN', 'UEM',
+                  'MED1', 'MED2', 'INJ', 'UF', 'create_time']
+
+DEFAULT_CHUNK_SIZE = 5000
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{sheet_name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+_SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+
+_SHEET_TAIL = '</sheetData></worksheet>'
+
+
+class _ChunkBuffer:
+    """只追加的输出缓冲，供 zipfile 以不可seek的流方式写入"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _column_letter(index):
+    letters = ''
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def _row_xml(row_number, values, letters):
+    cells = []
+    for letter, value in zip(letters, values):
+        ref = f'{letter}{row_number}'
+        if value is None:
+            continue
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(f'<c r="{ref}"><v>{value!r}</v></c>')
+        else:
+            cells.append(f'<c r="{ref}" t="inlineStr"><is><t>{escape(str(value))}</t></is></c>')
+    return f'<row r="{row_number}">{"".join(cells)}</row>'
+
+
+def stream_xlsx(columns, row_chunks, sheet_name='expense'):
+    """把表头和分块行数据编码为xlsx字节流（生成器）
+
+    row_chunks 为行元组列表的可迭代对象，每处理完一块就产出已压缩的字节。
+    """
+    letters = [_column_letter(i) for i in range(len(columns))]
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        zf.writestr('_rels/.rels', _ROOT_RELS)
+        zf.writestr('xl/workbook.xml', _WORKBOOK.format(sheet_name=escape(sheet_name)))
+        zf.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        yield buffer.drain()
+
+        with zf.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(_SHEET_HEAD.encode('utf-8'))
+            sheet.write(_row_xml(1, columns, letters).encode('utf-8'))
+            row_number = 1
+            encode_seconds = 0.0   # 只计编码压缩耗时，不含读取数据和等待发送
+            for rows in row_chunks:
+                started = time.perf_counter()
+                parts = []
+                for values in rows:
+                    row_number += 1
+                    parts.append(_row_xml(row_number, values, letters))
+                sheet.write(''.join(parts).encode('utf-8'))
+                data = buffer.drain()
+                encode_seconds += time.perf_counter() - started
+                if data:
+                    yield data
+            sheet.write(_SHEET_TAIL.encode('utf-8'))
+    profiling.record('excel', 'write:xlsx_stream', encode_seconds, row_number - 1)
+    yield buffer.drain()
+
+
+def build_export_query(period_range=None, emp_ids=None):
+    """按期间区间和员工ID过滤的导出查询，返回 (sql, params)"""
+    conditions = []
+    params = []
+    if period_range is not None:
+        conditions.append('year BETWEEN ? AND ? AND year * 12 + month - 1 BETWEEN ? AND ?')
+        params += [from_period(period_range.start)[0], from_period(period_range.end)[0],
+                   period_range.start, period_range.end]
+    if emp_ids:
+        conditions.append(f"emp_id IN ({','.join('?' for _ in emp_ids)})")
+        params += list(emp_ids)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    sql = f"SELECT {', '.join(EXPORT_COLUMNS)} FROM expense {where} ORDER BY year, month, emp_id"
+    return sql, params
+
+
+def iter_expense_chunks(conn, period_range=None, emp_ids=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """按块读取expense表，每次产出最多chunk_size行"""
+    sql, params = build_export_query(period_range, emp_ids)
+    cursor = conn.execute(sql, params)
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield [tuple(row) for row in rows]
+
+
+def export_expense(conn, target, period_range=None, emp_ids=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """把expense表导出到xlsx文件，返回写入的字节数"""
+    size = 0
+    with open(target, 'wb') as f:
+        for data in stream_xlsx(EXPORT_COLUMNS,
+                                iter_expense_chunks(conn, period_range, emp_ids, chunk_size)):
+            f.write(data)
+            size += len(data)
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='流式导出expense表为xlsx')
+    parser.add_argument('-o', '--output', default=f"Export{datetime.now():%Y%m%d}.xlsx")
+    parser.add_argument('--db', default='Cluster_Expense.db')
+    parser.add_argument('--range', help='期间区间，如 2024、2024Q1、2024-01:2024-06、R12@2024-06')
+    parser.add_argument('--emp', help='员工ID，多个用逗号分隔')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    period_range = parse_range(args.range) if args.range else None
+    emp_ids = [e.strip().zfill(5) for e in args.emp.split(',') if e.strip()] if args.emp else None
+
+    conn = sqlite3.connect(args.db)
+    try:
+        size = export_expense(conn, args.output, period_range, emp_ids, args.chunk_size)
+    finally:
+        conn.close()
+    print(f"数据已成功从 SQLite 导出到 {args.output}（{size} 字节）")
+
+
+if __name__ == '__main__':
+    main()
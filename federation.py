@@ -0,0 +1,346 @@
+"""多集群汇总
+
+每个酒店集群一个数据库。注册后并行在各集群上执行月度汇总和对比查询，
+再合并各集群的部分聚合，得到整体视图；总耗时约等于最慢的单个集群。
+
+- 查询经由各数据库的查询后端（backends.py）执行，线程池并行
+  （SQLite、NumPy、DuckDB 执行查询时都会释放 GIL）
+- 各集群的结果分别缓存在 result_cache 中；其他进程写入的集群按数据库文件
+  （含 -wal）的修改时间和大小识别，版本变化后缓存自然失效，内存列式数据/Parquet 分区随之刷新
+- 单个集群出错不影响其他集群，错误信息随结果返回
+- 查询不写入集群数据库：表结构版本（PRAGMA user_version）低于当前版本的集群
+  作为错误返回，需先用 --migrate 或 migrations.py 显式迁移；连接也不修改其日志模式
+
+集群列表为 JSON 文件 {集群名: 数据库路径}。
+用法: python federation.py --clusters clusters.json [--range R3@2024-12] [--workers 8] [--migrate]
+"""
+import argparse
+import json
+import os
+import pathlib
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import backends
+from db import DEFAULT_PRAGMAS, connect
+from migrations import LATEST_VERSION, get_schema_version, migrate
+from periods import base_range, parse_range
+from query_cache import result_cache
+
+DEFAULT_WORKERS = 8
+SUMMARY_FIELDS = backends.SUMMARY_COLUMNS
+STATUSES = ['active', 'new', 'departed']
+# 外部集群的连接不设置 journal_mode（会持久修改数据库文件），其余与应用连接相同
+CLUSTER_PRAGMAS = {name: value for name, value in DEFAULT_PRAGMAS.items() if name != 'journal_mode'}
+
+
+def database_version(path):
+    """数据库文件（含WAL）的修改时间和大小，其他进程提交写入后随之变化"""
+    version = []
+    for name in (path, path + '-wal'):
+        try:
+            stat = os.stat(name)
+            version += [stat.st_mtime_ns, stat.st_size]
+        except FileNotFoundError:
+            version += [None, None]
+    return tuple(version)
+
+
+def read_schema_version(path):
+    """以只读方式读取数据库的表结构版本"""
+    conn = sqlite3.connect(pathlib.Path(path).absolute().as_uri() + '?mode=ro', uri=True)
+    try:
+        return get_schema_version(conn)
+    finally:
+        conn.close()
+
+
+def load_clusters(path):
+    """读取集群列表 JSON：{集群名: 数据库路径}，相对路径相对于该文件所在目录"""
+    with open(path, encoding='utf-8') as f:
+        clusters = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    return {name: os.path.join(base, database) for name, database in clusters.items()}
+
+
+def merge_summaries(summaries):
+    """合并各集群的月度汇总（按月份相加），按月份倒序"""
+    merged = {}
+    for rows in summaries:
+        for row in rows:
+            key = (row['year'], row['month'])
+            total = merged.setdefault(key, dict.fromkeys(SUMMARY_FIELDS, 0.0))
+            for field in SUMMARY_FIELDS:
+                total[field] += row[field]
+    return [dict({'year': year, 'month': month},
+                 **{field: round(values[field], 2) for field in SUMMARY_FIELDS})
+            for (year, month), values in sorted(merged.items(), reverse=True)]
+
+
+def merge_range_totals(results):
+    """合并各集群区间对比的合计，并统计各状态的人数"""
+    totals = {}
+    headcount = dict.fromkeys(STATUSES, 0)
+    for result in results:
+        for code, values in result['totals'].items():
+            total = totals.setdefault(code, {'current': 0.0, 'previous': 0.0})
+            total['current'] += values['current']
+            total['previous'] += values['previous']
+        for status in result['status']:
+            headcount[status] += 1
+    for total in totals.values():
+        total['change'] = total['current'] - total['previous']
+        total['change_rate'] = ((total['current'] - total['previous']) / total['previous'] * 100
+                                if total['previous'] != 0 else 0)
+    return totals, headcount
+
+
+def concat_columns(results, names):
+    """拼接各集群的列式员工数据，增加 cluster 列（员工ID只在集群内唯一）"""
+    merged = {'cluster': [], 'emp_id': []}
+    for name, result in zip(names, results):
+        merged['cluster'] += [name] * len(result['emp_id'])
+        merged['emp_id'] += result['emp_id']
+    return merged
+
+
+class Federation:
+    """已注册集群的并行查询与结果合并"""
+
+    def __init__(self, max_workers=DEFAULT_WORKERS, backend=backends.DEFAULT_BACKEND):
+        self.max_workers = max_workers
+        self.backend = backend
+        self.clusters = {}      # 集群名 -> 数据库路径（按注册顺序）
+        self._external = {}     # 集群名 -> 是否可能被其他进程写入
+        self._versions = {}     # 集群名 -> 上次查询时的数据库版本
+        self._checked = set()   # 表结构版本已确认为最新的数据库
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def configure(self, max_workers=None, backend=None):
+        with self._lock:
+            if max_workers is not None and max_workers != self.max_workers:
+                self.max_workers = max_workers
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                    self._executor = None
+            if backend is not None:
+                self.backend = backend
+
+    def register(self, name, path, external=True):
+        """注册集群；external=False 表示只由本进程写入（导入时已通知 result_cache），不检查文件版本"""
+        with self._lock:
+            self.clusters[name] = path
+            self._external[name] = external
+            self._versions.pop(name, None)
+
+    def unregister(self, name):
+        with self._lock:
+            self.clusters.pop(name, None)
+            self._external.pop(name, None)
+            self._versions.pop(name, None)
+
+    def select(self, names=None):
+        """按名称选出集群（None 为全部），返回 {集群名: 路径}"""
+        with self._lock:
+            clusters = dict(self.clusters)
+        if not names:
+            return clusters
+        unknown = [name for name in names if name not in clusters]
+        if unknown:
+            raise ValueError(f"未注册的集群: {', '.join(unknown)}")
+        return {name: clusters[name] for name in names}
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='federation')
+            return self._executor
+
+    def _check_schema(self, path):
+        """确认集群数据库已迁移到当前表结构；只读检查，版本过低时抛出 RuntimeError"""
+        with self._lock:
+            if path in self._checked:
+                return
+        version = read_schema_version(path)
+        if version < LATEST_VERSION:
+            raise RuntimeError(f'表结构版本 {version} 低于当前版本 {LATEST_VERSION}，'
+                               f'请先执行 python migrations.py {path}')
+        with self._lock:
+            self._checked.add(path)
+
+    def _get_backend(self, name, path):
+        """集群数据库的查询后端；查询前只检查表结构版本，不迁移"""
+        if not os.path.exists(path):
+            raise FileNotFoundError(f'数据库不存在: {path}')
+        self._check_schema(path)
+        with self._lock:
+            external = self._external.get(name, True)
+        if external:
+            return backends.get_backend(self.backend, path,
+                                        lambda: connect(path, pragmas=CLUSTER_PRAGMAS))
+        return backends.get_backend(self.backend, path, lambda: connect(path))
+
+    def migrate(self, names=None):
+        """显式把选中的集群数据库迁移到当前表结构，返回 {集群名: 执行的迁移版本列表}"""
+        applied = {}
+        for name, path in self.select(names).items():
+            if not os.path.exists(path):
+                raise FileNotFoundError(f'数据库不存在: {path}')
+            conn = sqlite3.connect(path)
+            try:
+                applied[name] = migrate(conn)
+            finally:
+                conn.close()
+        return applied
+
+    def _version(self, name, path, backend):
+        """外部集群的数据库版本；与上次不同时刷新该集群的内存数据（缓存键随版本变化）"""
+        with self._lock:
+            external = self._external.get(name, True)
+        if not external:
+            return None
+        version = database_version(path)
+        with self._lock:
+            previous = self._versions.get(name)
+            self._versions[name] = version
+        if previous is not None and previous != version:
+            backend.mark_dirty()
+        return version
+
+    def _run_one(self, name, path, key, query, periods):
+        started = time.perf_counter()
+        backend = self._get_backend(name, path)
+        version = self._version(name, path, backend)
+        value = result_cache.get_or_compute(('cluster', name, path, version) + key,
+                                            lambda: query(backend), periods)
+        return value, time.perf_counter() - started
+
+    def run(self, key, query, periods=None, names=None):
+        """在选中的集群上并行执行 query(backend)，返回 (结果, 耗时, 错误)，均为 {集群名: ...}
+
+        key 为查询的缓存键（不含集群），periods 为结果依赖的月份。
+        """
+        clusters = self.select(names)
+        pool = self._pool()
+        futures = {name: pool.submit(self._run_one, name, path, key, query, periods)
+                   for name, path in clusters.items()}
+        results, timings, errors = {}, {}, {}
+        for name, future in futures.items():
+            try:
+                results[name], seconds = future.result()
+                timings[name] = round(seconds, 4)
+            except Exception as e:
+                errors[name] = str(e)
+        return results, timings, errors
+
+    # ---- 整体视图 ----
+
+    def monthly_summary(self, names=None):
+        started = time.perf_counter()
+        results, timings, errors = self.run(('monthly_summary',), lambda b: b.monthly_summary(),
+                                            names=names)
+        return {
+            'clusters': results,
+            'total': merge_summaries(results.values()),
+            'timings': timings,
+            'seconds': round(time.perf_counter() - started, 4),
+            'errors': errors
+        }
+
+    def compare_ranges(self, current, base, names=None, detail=False):
+        """各集群区间对比的合计与整体合计；detail 时附带按集群拼接的员工明细"""
+        started = time.perf_counter()
+        results, timings, errors = self.run(
+            ('period_comparison', current, base), lambda b: b.compare_ranges(current, base),
+            periods=current.year_months() + base.year_months(), names=names)
+        totals, headcount = merge_range_totals(results.values())
+        data = {
+            'current': current.label,
+            'base': base.label,
+            'clusters': {name: {'totals': result['totals'],
+                                'headcount': merge_range_totals([result])[1]}
+                         for name, result in results.items()},
+            'totals': totals,
+            'headcount': headcount,
+            'timings': timings,
+            'seconds': round(time.perf_counter() - started, 4),
+            'errors': errors
+        }
+        if detail:
+            names = list(results)
+            data.update(concat_columns([results[n] for n in names], names))
+            data['status'] = [s for n in names for s in results[n]['status']]
+            data['codes'] = {
+                code: {field: [v for n in names for v in results[n]['codes'][code][field]]
+                       for field in ('current', 'previous', 'change', 'change_rate')}
+                for code in totals
+            }
+        return data
+
+    def compare_expense_types(self, year, month, prev_year, prev_month, names=None):
+        """各集群员工对比数据按集群拼接（列式结构，增加 cluster 列）"""
+        started = time.perf_counter()
+        results, timings, errors = self.run(
+            ('employee_comparison', year, month),
+            lambda b: b.compare_expense_types(year, month, prev_year, prev_month),
+            periods=[(year, month), (prev_year, prev_month)], names=names)
+        names = list(results)
+        data = concat_columns([results[n] for n in names], names)
+        types = next(iter(results.values()))['types'] if results else {}
+        data['types'] = {
+            expense_type: {field: [v for n in names for v in results[n]['types'][expense_type][field]]
+                           for field in ('current', 'previous', 'change', 'change_rate')}
+            for expense_type in types
+        }
+        data.update(timings=timings, seconds=round(time.perf_counter() - started, 4), errors=errors)
+        return data
+
+    def stats(self):
+        with self._lock:
+            clusters = dict(self.clusters)
+            external = dict(self._external)
+        return {
+            'backend': self.backend,
+            'max_workers': self.max_workers,
+            'clusters': {name: {'database': path, 'exists': os.path.exists(path),
+                                'external': external[name]}
+                         for name, path in clusters.items()}
+        }
+
+
+# 进程内共享的实例，app.py 注册本应用的数据库和配置中的集群
+federation = Federation()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='多集群月度汇总与区间对比')
+    parser.add_argument('--clusters', required=True, help='集群列表JSON {集群名: 数据库路径}')
+    parser.add_argument('--range', help='区间对比的当前区间，如 R3@2024-12；不传只输出月度汇总')
+    parser.add_argument('--compare', default='previous', choices=['previous', 'year_ago'])
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--backend', default=backends.DEFAULT_BACKEND, choices=backends.BACKENDS)
+    parser.add_argument('--migrate', action='store_true',
+                        help='查询前先把各集群数据库迁移到当前表结构（会写入集群数据库）')
+    args = parser.parse_args()
+
+    federation.configure(max_workers=args.workers, backend=args.backend)
+    for name, path in load_clusters(args.clusters).items():
+        federation.register(name, path)
+    if args.migrate:
+        for name, applied in federation.migrate().items():
+            print(f"{name}: 执行迁移 {applied or '无'}", file=sys.stderr)
+    if args.range:
+        current = parse_range(args.range)
+        result = federation.compare_ranges(current, base_range(current, args.compare))
+    else:
+        result = federation.monthly_summary()
+        result.pop('clusters')
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
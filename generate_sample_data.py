@@ -1,47 +1,197 @@
-import pandas as pd
-import numpy as np
+"""生成可复现的合成费用数据
+
+用法: python generate_sample_data.py [--employees 50] [--months 24] [--start 2023-01]
+      [--churn 0.02] [--salary-median 11500] [--salary-sigma 0.35] [--seed 42]
+      [-o uploads/sample_expense_data.xlsx] [--format expense|upload|workbook] [--db 路径]
+
+数据与真实结构一致：
+- emp_id 为5位数字字符（超过99999名员工时位数随之增加）
+- 每月按 churn 比例有员工离职，由新员工（新ID）补足，在职人数保持不变
+- 工资按对数正态分布（中位数 salary_median、离散度 salary_sigma），每年调薪3%，
+  各月在 ±5% 内浮动；各项缴费按 config 中的费率和基数上下限计算，医疗保险2为固定金额
+- emp_info 与 20241125.xlsx 的 emp_info 工作表列一致
+
+输出格式（-o，按扩展名写 xlsx 或 csv）：
+- expense：expense 表字段为表头（/preview_excel、/import_selected 使用）
+- upload：中文表头（/upload 使用）
+- workbook：与 20241125.xlsx 相同的 Sheet1 + Sal + emp_info（Convert.py、import_data.py 使用），
+  只包含最后一年的数据
+--db 时另外写入 SQLite 数据库（expense + 月度汇总 + emp_info）。
+"""
+import argparse
 import os
+import sqlite3
+import numpy as np
+import pandas as pd
+from contributions import BASE_DECIMALS, compile_rates, compute_contributions, round_half_up
+from employees import LEVELS, write_emp_info
+from ingest import UPLOAD_COLUMN_MAP, bulk_import_expense
+from migrations import migrate
+from periods import from_period, parse_range
+
+DEFAULT_EMPLOYEES = 50
+DEFAULT_MONTHS = 24
+DEFAULT_START = '2023-01'
+DEFAULT_CHURN = 0.02
+DEFAULT_SALARY_MEDIAN = 11500
+DEFAULT_SALARY_SIGMA = 0.35
+DEFAULT_SEED = 42
+DEFAULT_OUTPUT = 'uploads/sample_expense_data.xlsx'
+OUTPUT_FORMATS = ['expense', 'upload', 'workbook']
+
+ANNUAL_RAISE = 0.03
+MONTHLY_VARIATION = 0.05
+MED2_AMOUNT = 6.4
+LEVEL_WEIGHTS = [0.2, 0.5, 0.15, 0.1, 0.05]
+SURNAMES = list('王李张刘陈杨黄赵吴周徐孙马朱胡郭何林罗高')
+GIVEN_NAMES = list('伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华')
+
+# 费率代码 -> expense 表金额列
+AMOUNT_COLUMNS = {'PEN': 'PEN', 'MED': 'MED1', 'UEM': 'UEM', 'INJ': 'INJ', 'HF': 'HF', 'UF': 'UF'}
+
+
+def format_emp_id(numbers):
+    return pd.Series(numbers).astype(str).str.zfill(5).to_numpy()
+
+
+def generate_roster(employees, months, churn, rng):
+    """每月在职员工编号：返回 (emp_numbers, month_index, hire_month)
+
+    emp_numbers/month_index 为逐行（员工×月）数组；hire_month[i] 为编号 i+1 的员工
+    入职的月份序号（期初在职员工为负数，表示更早入职）。
+    """
+    active = np.arange(1, employees + 1)
+    hire_month = list(-rng.integers(1, 120, employees))
+    emp_numbers, month_index = [], []
+    next_number = employees + 1
+    for month in range(months):
+        emp_numbers.append(active)
+        month_index.append(np.full(len(active), month))
+        leaving = rng.random(len(active)) < churn
+        hires = int(leaving.sum())
+        active = np.concatenate([active[~leaving], np.arange(next_number, next_number + hires)])
+        hire_month.extend([month + 1] * hires)
+        next_number += hires
+    return np.concatenate(emp_numbers), np.concatenate(month_index), np.array(hire_month)
+
+
+def generate_expense(employees=DEFAULT_EMPLOYEES, months=DEFAULT_MONTHS, start=DEFAULT_START,
+                     churn=DEFAULT_CHURN, salary_median=DEFAULT_SALARY_MEDIAN,
+                     salary_sigma=DEFAULT_SALARY_SIGMA, seed=DEFAULT_SEED, rates=None):
+    """生成 expense 表结构的费用明细，返回 (expense_df, emp_info_df)"""
+    rng = np.random.default_rng(seed)
+    start_period = parse_range(start).start
+    emp_numbers, month_index, hire_month = generate_roster(employees, months, churn, rng)
+
+    base_salary = np.exp(rng.normal(np.log(salary_median), salary_sigma, len(hire_month)))
+    periods = start_period + month_index
+    years, month_numbers = periods // 12, periods % 12 + 1
+    salary = (base_salary[emp_numbers - 1]
+              * (1 + ANNUAL_RAISE) ** (years - years.min())
+              * rng.uniform(1 - MONTHLY_VARIATION, 1 + MONTHLY_VARIATION, len(periods)))
+
+    table = rates or compile_rates()
+    _, amount = compute_contributions(salary, table)
+    expense = pd.DataFrame({
+        'emp_id': format_emp_id(emp_numbers),
+        'year': years,
+        'month': month_numbers,
+        'SAL': round_half_up(salary, BASE_DECIMALS),
+    })
+    for code, column in AMOUNT_COLUMNS.items():
+        expense[column] = amount[:, table.index_of(code)] if code in table.codes else 0.0
+    expense['MED2'] = MED2_AMOUNT
+    expense = expense[['emp_id', 'year', 'month', 'SAL', 'HF', 'PEN', 'UEM',
+                       'MED1', 'MED2', 'INJ', 'UF']]
+    return expense, generate_emp_info(hire_month, start_period, rng)
+
+
+def generate_emp_info(hire_month, start_period, rng):
+    """员工信息（与 20241125.xlsx 的 emp_info 工作表列一致）"""
+    count = len(hire_month)
+    join = pd.to_datetime([f'{y}-{m:02d}-01' for y, m in
+                           (from_period(start_period + int(h)) for h in hire_month)])
+    join = join + pd.to_timedelta(rng.integers(0, 28, count), unit='D')
+    birth_days = rng.integers(0, 365 * 30, count)
+    birth = (pd.Timestamp('1965-01-01') + pd.to_timedelta(birth_days, unit='D')).strftime('%Y%m%d')
+    return pd.DataFrame({
+        'emp_id': format_emp_id(np.arange(1, count + 1)),
+        'name': (pd.Series(rng.choice(SURNAMES, count))
+                 + pd.Series(rng.choice(GIVEN_NAMES, count))
+                 + pd.Series(np.where(rng.random(count) < 0.6, rng.choice(GIVEN_NAMES, count), ''))),
+        'level': rng.choice(LEVELS, count, p=LEVEL_WEIGHTS),
+        'id_no': ('6101' + pd.Series(rng.integers(10, 99, count)).astype(str) + pd.Series(birth)
+                  + pd.Series(rng.integers(1000, 9999, count)).astype(str)),
+        'contact_no': '1' + pd.Series(rng.integers(3_000_000_000, 9_999_999_999, count)).astype(str),
+        'join_date': join.strftime('%Y-%m-%d')
+    })
+
+
+def workbook_sheets(expense, emp_info):
+    """20241125.xlsx 版式：最后一年的 Sheet1 明细、Sal 月工资宽表、emp_info"""
+    sheet1 = expense[expense['year'] == expense['year'].max()].reset_index(drop=True)
+    sal = sheet1.pivot(index='emp_id', columns='month', values='SAL').reset_index()
+    sal.columns.name = None
+    used = emp_info['emp_id'].isin(sheet1['emp_id'])
+    return {'Sheet1': sheet1, 'Sal': sal, 'emp_info': emp_info[used].reset_index(drop=True)}
+
+
+def write_output(path, expense, emp_info, output_format='expense'):
+    """按格式写出 xlsx（或单表格式的 csv）"""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    if output_format == 'workbook':
+        with pd.ExcelWriter(path) as writer:
+            for name, df in workbook_sheets(expense, emp_info).items():
+                df.to_excel(writer, sheet_name=name, index=False)
+        return
+    df = expense
+    if output_format == 'upload':
+        df = expense.rename(columns={v: k for k, v in UPLOAD_COLUMN_MAP.items()})
+    if path.lower().endswith('.csv'):
+        df.to_csv(path, index=False)
+    else:
+        df.to_excel(path, index=False)
+
+
+def write_database(path, expense, emp_info):
+    """写入 SQLite 数据库：迁移到当前结构后批量导入 expense（同时维护月度汇总），再写 emp_info 维度表"""
+    conn = sqlite3.connect(path)
+    try:
+        migrate(conn)
+        report = bulk_import_expense(conn, expense, replace_all=True)
+        write_emp_info(conn, emp_info, replace_all=True)
+        return report
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成合成费用数据')
+    parser.add_argument('--employees', type=int, default=DEFAULT_EMPLOYEES, help='每月在职人数')
+    parser.add_argument('--months', type=int, default=DEFAULT_MONTHS)
+    parser.add_argument('--start', default=DEFAULT_START, help='起始月份 YYYY-MM')
+    parser.add_argument('--churn', type=float, default=DEFAULT_CHURN, help='每月离职比例')
+    parser.add_argument('--salary-median', type=float, default=DEFAULT_SALARY_MEDIAN)
+    parser.add_argument('--salary-sigma', type=float, default=DEFAULT_SALARY_SIGMA)
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('-o', '--output', default=DEFAULT_OUTPUT, help='输出文件（.xlsx/.csv），为空则不写')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='expense')
+    parser.add_argument('--db', help='另外写入的SQLite数据库路径')
+    args = parser.parse_args()
+
+    expense, emp_info = generate_expense(args.employees, args.months, args.start, args.churn,
+                                         args.salary_median, args.salary_sigma, args.seed)
+    if args.output:
+        write_output(args.output, expense, emp_info, args.format)
+        print(f"示例数据已生成并保存到: {args.output}（{args.format}）")
+    if args.db:
+        write_database(args.db, expense, emp_info)
+        print(f"已写入数据库: {args.db}")
+    print(f"总共生成了 {len(expense)} 条记录, {len(emp_info)} 名员工")
+    print("\n数据预览:")
+    print(expense.head())
+
 
-# 生成示例数据
-np.random.seed(42)  # 设置随机种子以确保可重复性
-
-# 生成50个员工ID
-emp_ids = [f'EMP{str(i).zfill(3)}' for i in range(1, 51)]
-
-# 创建数据列表
-data = []
-for year in [2023, 2024]:
-    for month in range(1, 13):
-        for emp_id in emp_ids:
-            # 基本工资在8000-15000之间
-            base_salary = np.random.uniform(8000, 15000)
-            
-            # 各项保险基于工资的百分比
-            row = {
-                'emp_id': emp_id,
-                'year': year,
-                'month': month,
-                'SAL': round(base_salary, 2),
-                'HF': round(base_salary * 0.12, 2),  # 住房公积金
-                'PEN': round(base_salary * 0.08, 2),  # 养老保险
-                'UEM': round(base_salary * 0.02, 2),  # 失业保险
-                'MED1': round(base_salary * 0.02, 2),  # 医疗保险1
-                'MED2': round(base_salary * 0.01, 2),  # 医疗保险2
-                'INJ': round(base_salary * 0.005, 2)  # 工伤保险
-            }
-            data.append(row)
-
-# 创建DataFrame
-df = pd.DataFrame(data)
-
-# 确保uploads文件夹存在
-if not os.path.exists('uploads'):
-    os.makedirs('uploads')
-
-# 保存为Excel文件
-output_file = 'uploads/sample_expense_data.xlsx'
-df.to_excel(output_file, index=False)
-print(f"示例数据已生成并保存到: {output_file}")
-print(f"总共生成了 {len(data)} 条记录")
-print("\n数据预览:")
-print(df.head())
+if __name__ == '__main__':
+    main()
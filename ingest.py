@@ -0,0 +1,379 @@
+"""Excel批量导入引擎
+
+按列一次性完成类型转换与校验，再通过executemany分块写入数据库，
+替代逐行iterrows() + 单条INSERT的导入方式。
+/upload 与 ExcelHandler 的各个导入方法共用 IngestPipeline：
+read → normalize → validate → batch-write。
+upsert_expense 为增量导入：按 (emp_id, year, month) 比对行哈希，只写入有变化的行。
+"""
+import logging
+import time
+import numpy as np
+import pandas as pd
+from query_cache import result_cache
+from summary import frame_periods, rebuild_summary, refresh_periods
+
+# expense表的写入字段（顺序与INSERT语句一致）
+KEY_FIELDS = ['emp_id', 'year', 'month']
+AMOUNT_FIELDS = ['SAL', 'HF', 'PEN', 'UEM', 'MED1', 'MED2', 'INJ', 'UF']
+EXPENSE_FIELDS = KEY_FIELDS + AMOUNT_FIELDS
+
+# /upload 上传文件的中文表头到数据库字段的映射
+UPLOAD_COLUMN_MAP = {
+    '员工ID': 'emp_id',
+    '年份': 'year',
+    '月份': 'month',
+    '工资总额': 'SAL',
+    '住房公积金': 'HF',
+    '养老保险': 'PEN',
+    '失业保险': 'UEM',
+    '医疗保险1': 'MED1',
+    '医疗保险2': 'MED2',
+    '工伤保险': 'INJ',
+    '工会经费': 'UF'
+}
+
+DEFAULT_CHUNK_SIZE = 5000
+
+INSERT_EXPENSE_SQL = '''
+    INSERT INTO expense (
+        emp_id, year, month,
+        SAL, HF, PEN, UEM,
+        MED1, MED2, INJ, UF
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# 依赖 migrations 建立的唯一键 ux_expense_emp_period (emp_id, year, month)
+UPSERT_EXPENSE_SQL = INSERT_EXPENSE_SQL + f'''
+    ON CONFLICT (emp_id, year, month) DO UPDATE SET
+        {', '.join(f'{col} = excluded.{col}' for col in AMOUNT_FIELDS)}
+'''
+
+DELETE_EXPENSE_SQL = "DELETE FROM expense WHERE emp_id = ? AND year = ? AND month = ?"
+
+
+def _bad_rows(mask, limit=10):
+    """把校验失败的行号格式化为Excel行号（含表头，从第2行开始）"""
+    rows = (np.flatnonzero(mask.to_numpy()) + 2).tolist()
+    text = ', '.join(str(r) for r in rows[:limit])
+    if len(rows) > limit:
+        text += f' 等共{len(rows)}行'
+    return text
+
+
+def normalize_emp_id(series):
+    """将员工ID统一为5位字符（数值型ID补零，避免出现'17.0'）"""
+    if pd.api.types.is_numeric_dtype(series):
+        series = series.astype(np.int64)
+    return series.astype(str).str.strip().str.zfill(5)
+
+
+def require_columns(df, columns):
+    """检查必需列是否存在"""
+    missing_columns = [col for col in columns if col not in df.columns]
+    if missing_columns:
+        raise ValueError(f"Excel文件缺少以下列: {', '.join(missing_columns)}")
+
+
+def normalize_expense_frame(df, column_map=None):
+    """按列转换并校验费用数据
+
+    返回只包含EXPENSE_FIELDS且类型已确定的DataFrame：
+    emp_id为5位字符，year/month为int64，金额列为float64。
+    缺列、关键字段为空或金额无法转换时抛出ValueError。
+    """
+    if column_map:
+        df = df.rename(columns=column_map)
+
+    require_columns(df, EXPENSE_FIELDS)
+    df = df[EXPENSE_FIELDS].copy()
+
+    # 关键字段空值检查（整列向量化判断）
+    key_nan = df[KEY_FIELDS].isna().any(axis=1)
+    if key_nan.any():
+        raise ValueError(f"员工ID/年份/月份为空: 第{_bad_rows(key_nan)}行")
+
+    # 金额列转为float64，无法解析的值会变成NaN后统一报错
+    amounts = df[AMOUNT_FIELDS].apply(pd.to_numeric, errors='coerce').astype(np.float64)
+    amount_nan = amounts.isna().any(axis=1)
+    if amount_nan.any():
+        raise ValueError(f"金额为空或不是数字: 第{_bad_rows(amount_nan)}行")
+
+    periods = df[['year', 'month']].apply(pd.to_numeric, errors='coerce')
+    if periods.isna().any(axis=1).any():
+        raise ValueError(f"年份/月份不是数字: 第{_bad_rows(periods.isna().any(axis=1))}行")
+    periods = periods.astype(np.int64)
+    bad_month = ~periods['month'].between(1, 12)
+    if bad_month.any():
+        raise ValueError(f"月份超出1-12范围: 第{_bad_rows(bad_month)}行")
+
+    result = pd.DataFrame({'emp_id': normalize_emp_id(df['emp_id'])}, index=df.index)
+    result['year'] = periods['year']
+    result['month'] = periods['month']
+    result[AMOUNT_FIELDS] = amounts
+    return result.reset_index(drop=True)
+
+
+def iter_row_chunks(df, columns, chunk_size=DEFAULT_CHUNK_SIZE):
+    """按块生成可直接传给executemany的元组列表
+
+    使用Series.tolist()转换，得到的是Python原生int/float/str，
+    sqlite3无法直接绑定numpy标量。
+    """
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start:start + chunk_size]
+        yield list(zip(*(chunk[col].tolist() for col in columns)))
+
+
+def build_report(rows_read, rows_written, chunks, seconds):
+    """生成导入统计信息"""
+    return {
+        'rows_read': rows_read,
+        'rows_written': rows_written,
+        'chunks': chunks,
+        'seconds': round(seconds, 4),
+        'rows_per_sec': round(rows_written / seconds, 1) if seconds > 0 else 0.0
+    }
+
+
+def format_report(report):
+    """把导入统计信息格式化为一行文本（增量导入时附带变更统计）"""
+    text = (f"读取 {report['rows_read']} 行, 写入 {report['rows_written']} 行, "
+            f"{report['chunks']} 块, 耗时 {report['seconds']:.3f}s, "
+            f"{report['rows_per_sec']:.0f} 行/秒")
+    if 'inserted' in report:
+        text += (f"; 新增 {report['inserted']} 行, 更新 {report['updated']} 行, "
+                 f"删除 {report['deleted']} 行, 未变化 {report['unchanged']} 行")
+    return text
+
+
+class IngestPipeline:
+    """通用导入流程：read → normalize → validate → batch-write
+
+    各阶段均为可替换的函数：
+    - read(source) -> DataFrame
+    - normalize(df) -> DataFrame
+    - validate(df) -> DataFrame（校验失败抛出ValueError，可过滤掉无效行）
+    - write(pipeline, cursor, df) -> 写入行数，内部通过 write_batches 分块写入
+    - on_commit(df): 可选，事务提交成功后执行（例如使查询缓存失效）
+    - progress(pipeline): 可选，读取完成、每批写入后及提交后调用，
+      可读取 pipeline.stage / rows_read / rows_written / batches 报告进度
+    写入阶段在一个事务内完成，失败整体回滚。
+    日志按批次记录计数，不再逐行输出。
+    """
+
+    def __init__(self, name, read, write, normalize=None, validate=None,
+                 on_commit=None, chunk_size=DEFAULT_CHUNK_SIZE, logger=None, progress=None):
+        self.name = name
+        self.read = read
+        self.normalize = normalize
+        self.validate = validate
+        self.write = write
+        self.on_commit = on_commit
+        self.chunk_size = chunk_size
+        self.logger = logger or logging.getLogger(__name__)
+        self.progress = progress
+        self.stage = None
+        self.rows_read = 0
+        self.rows_written = 0
+        self.batches = 0
+
+    def _report_progress(self, stage):
+        self.stage = stage
+        if self.progress is not None:
+            self.progress(self)
+
+    def write_batches(self, cursor, sql, df, columns):
+        """将DataFrame按chunk_size分块executemany写入，返回写入行数"""
+        written = 0
+        for rows in iter_row_chunks(df, columns, self.chunk_size):
+            cursor.executemany(sql, rows)
+            written += len(rows)
+            self.rows_written += len(rows)
+            self.batches += 1
+            self.logger.debug("%s: 第%d批写入%d行, 累计%d行", self.name, self.batches, len(rows), written)
+            self._report_progress('writing')
+        return written
+
+    def run(self, conn, source):
+        """执行完整导入流程并返回统计信息"""
+        started = time.perf_counter()
+        self.rows_written = 0
+        self.batches = 0
+
+        df = self.read(source)
+        rows_read = self.rows_read = len(df)
+        self._report_progress('read')
+        if self.normalize is not None:
+            df = self.normalize(df)
+        if self.validate is not None:
+            df = self.validate(df)
+
+        cursor = conn.cursor()
+        try:
+            rows_written = self.write(self, cursor, df)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if self.on_commit is not None:
+            self.on_commit(df)
+        self._report_progress('committed')
+
+        report = build_report(rows_read, rows_written, self.batches,
+                              time.perf_counter() - started)
+        self.logger.info(f"{self.name}: {format_report(report)}")
+        return report
+
+
+def table_writer(sql, columns, before_write=None, after_write=None):
+    """生成按列顺序分块写入单个表的write阶段函数
+
+    before_write(cursor): 可选回调，在同一事务中、写入前执行（例如清空旧数据）。
+    after_write(cursor, df): 可选回调，在同一事务中、写入后执行（例如刷新汇总表）。
+    """
+    def write(pipeline, cursor, df):
+        if before_write is not None:
+            before_write(cursor)
+        written = pipeline.write_batches(cursor, sql, df, columns)
+        if after_write is not None:
+            after_write(cursor, df)
+        return written
+    return write
+
+
+def refresh_expense_summary(cursor, df):
+    """写入expense后刷新本次涉及月份的月度汇总"""
+    refresh_periods(cursor, frame_periods(df))
+
+
+def invalidate_expense_cache(df):
+    """提交后使本次涉及月份的查询缓存失效"""
+    result_cache.invalidate(frame_periods(df))
+
+
+def bulk_import_expense(conn, df, column_map=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                        replace_all=False, logger=None, progress=None):
+    """校验并批量导入费用数据到expense表
+
+    replace_all为True时在同一事务内先清空expense表，
+    导入失败会整体回滚，不会留下空表。
+    月度汇总表在同一事务内随之更新，提交后使相关查询缓存失效。
+    """
+    before_write = None
+    after_write = refresh_expense_summary
+    on_commit = invalidate_expense_cache
+    if replace_all:
+        def before_write(cursor):
+            cursor.execute("DELETE FROM expense")
+
+        def after_write(cursor, frame):
+            rebuild_summary(cursor)
+
+        def on_commit(frame):
+            result_cache.invalidate()
+
+    pipeline = IngestPipeline(
+        'expense',
+        read=lambda frame: frame,
+        normalize=lambda frame: normalize_expense_frame(frame, column_map),
+        write=table_writer(INSERT_EXPENSE_SQL, EXPENSE_FIELDS, before_write, after_write),
+        on_commit=on_commit,
+        chunk_size=chunk_size,
+        logger=logger,
+        progress=progress
+    )
+    return pipeline.run(conn, df)
+
+
+def row_hashes(df):
+    """按金额列（保留两位小数）计算每行的哈希，用于判断行是否有变化"""
+    # + 0.0 把 -0.0 统一为 0.0，两者的字节表示不同
+    return pd.util.hash_pandas_object(df[AMOUNT_FIELDS].round(2) + 0.0, index=False).to_numpy()
+
+
+def load_stored_expense(cursor, periods):
+    """读取指定月份中已有的 expense 行（按月走覆盖索引）"""
+    rows = []
+    for year, month in sorted(periods):
+        cursor.execute(f"""
+            SELECT {', '.join(EXPENSE_FIELDS)} FROM expense WHERE year = ? AND month = ?
+        """, (int(year), int(month)))
+        rows.extend(cursor.fetchall())
+    stored = pd.DataFrame.from_records([tuple(row) for row in rows], columns=EXPENSE_FIELDS)
+    return stored.astype({'emp_id': str, 'year': np.int64, 'month': np.int64,
+                          **{col: np.float64 for col in AMOUNT_FIELDS}})
+
+
+def diff_expense(incoming, stored, delete_missing=True):
+    """按 (emp_id, year, month) 比对导入数据与已有数据
+
+    返回 (inserts, updates, deletes, unchanged)：inserts/updates 为需要写入的导入行，
+    deletes 为已有数据中存在、导入数据中没有的键（delete_missing 为 False 时为空），
+    unchanged 为金额完全相同、无需写入的行数。
+    """
+    merged = incoming.assign(_hash=row_hashes(incoming)).merge(
+        stored[KEY_FIELDS].assign(_stored_hash=row_hashes(stored)),
+        on=KEY_FIELDS, how='outer', indicator=True
+    )
+    both = merged['_merge'] == 'both'
+    changed = both & (merged['_hash'] != merged['_stored_hash'])
+    inserts = merged.loc[merged['_merge'] == 'left_only', EXPENSE_FIELDS]
+    updates = merged.loc[changed, EXPENSE_FIELDS]
+    deletes = merged.loc[merged['_merge'] == 'right_only', KEY_FIELDS]
+    if not delete_missing:
+        deletes = deletes.iloc[0:0]
+    return inserts, updates, deletes, int((both & ~changed).sum())
+
+
+def upsert_expense(conn, df, column_map=None, delete_missing=True,
+                   chunk_size=DEFAULT_CHUNK_SIZE, logger=None, progress=None):
+    """增量导入费用数据：只写入有变化的行
+
+    只比对导入数据覆盖的 (year, month)：新键插入、金额变化的行通过
+    INSERT ... ON CONFLICT DO UPDATE 更新、金额相同的行跳过；
+    delete_missing 为 True 时删除这些月份中导入数据里没有的行。
+    其他月份的历史数据不读取也不改写，只刷新有变化月份的汇总并使其缓存失效。
+
+    返回导入统计信息，另含 inserted/updated/deleted/unchanged
+    以及有变化的月份 periods（'YYYY-MM'）。
+    """
+    changes = {}
+
+    def write(pipeline, cursor, frame):
+        duplicated = frame.duplicated(KEY_FIELDS, keep=False)
+        if duplicated.any():
+            raise ValueError(f"员工ID+年份+月份重复: 第{_bad_rows(duplicated)}行")
+
+        stored = load_stored_expense(cursor, frame_periods(frame))
+        inserts, updates, deletes, unchanged = diff_expense(frame, stored, delete_missing)
+        written = pipeline.write_batches(cursor, UPSERT_EXPENSE_SQL,
+                                         pd.concat([inserts, updates]), EXPENSE_FIELDS)
+        written += pipeline.write_batches(cursor, DELETE_EXPENSE_SQL, deletes, KEY_FIELDS)
+
+        touched = sorted(set(frame_periods(inserts)) | set(frame_periods(updates))
+                         | set(frame_periods(deletes)))
+        refresh_periods(cursor, touched)
+        changes.update(inserted=len(inserts), updated=len(updates), deleted=len(deletes),
+                       unchanged=unchanged, touched=touched)
+        return written
+
+    def on_commit(frame):
+        if changes['touched']:
+            result_cache.invalidate(changes['touched'])
+
+    pipeline = IngestPipeline(
+        'expense_upsert',
+        read=lambda frame: frame,
+        normalize=lambda frame: normalize_expense_frame(frame, column_map),
+        write=write,
+        on_commit=on_commit,
+        chunk_size=chunk_size,
+        logger=logger,
+        progress=progress
+    )
+    report = pipeline.run(conn, df)
+    touched = changes.pop('touched')
+    report.update(changes)
+    report['periods'] = [f'{year}-{month:02d}' for year, month in touched]
+    return report
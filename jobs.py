@@ -0,0 +1,137 @@
+"""后台导入任务
+
+/upload 保存文件后提交任务并立即返回任务ID，由后台工作线程执行解析和写入，
+/jobs/<id> 查询进度（已解析行数、已写入行数、吞吐量、错误信息）。
+
+所有任务由同一个工作线程按提交顺序依次执行，SQLite 同一时刻只有一个写入者，
+并发上传只会排队，不会争抢写锁。
+"""
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+DEFAULT_MAX_HISTORY = 100
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """一个后台任务及其进度"""
+
+    def __init__(self, name, func):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.func = func
+        self.state = 'queued'       # queued / running / succeeded / failed
+        self.stage = None
+        self.rows_read = 0
+        self.rows_written = 0
+        self.batches = 0
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def update(self, **fields):
+        with self._lock:
+            for name, value in fields.items():
+                setattr(self, name, value)
+
+    def track(self, pipeline):
+        """作为 IngestPipeline 的 progress 回调，同步读取/写入进度"""
+        self.update(stage=pipeline.stage, rows_read=pipeline.rows_read,
+                    rows_written=pipeline.rows_written, batches=pipeline.batches)
+
+    def to_dict(self):
+        with self._lock:
+            end = self.finished or time.time()
+            elapsed = end - self.started if self.started else 0.0
+            return {
+                'id': self.id,
+                'name': self.name,
+                'state': self.state,
+                'stage': self.stage,
+                'rows_read': self.rows_read,
+                'rows_written': self.rows_written,
+                'batches': self.batches,
+                'seconds': round(elapsed, 3),
+                'rows_per_sec': round(self.rows_written / elapsed, 1) if elapsed > 0 else 0.0,
+                'queued_seconds': round((self.started or end) - self.created, 3),
+                'result': self.result,
+                'error': self.error
+            }
+
+
+class JobQueue:
+    """单工作线程的任务队列，保留最近 max_history 个任务的状态"""
+
+    def __init__(self, max_history=DEFAULT_MAX_HISTORY):
+        self.max_history = max_history
+        self._queue = queue.Queue()
+        self._jobs = OrderedDict()
+        self._pending = []
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def submit(self, name, func):
+        """提交任务，func(job) 的返回值作为任务结果；返回 Job"""
+        job = Job(name, func)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._pending.append(job.id)
+            self._trim()
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='import-worker',
+                                                daemon=True)
+                self._worker.start()
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self, job_id):
+        """任务状态字典，排队中的任务附带 queue_position（1 为下一个执行）"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            position = self._pending.index(job_id) + 1 if job_id in self._pending else 0
+        if job is None:
+            return None
+        data = job.to_dict()
+        data['queue_position'] = position
+        return data
+
+    def _trim(self):
+        finished = [job_id for job_id, job in self._jobs.items()
+                    if job.state in ('succeeded', 'failed')]
+        while len(self._jobs) > self.max_history and finished:
+            del self._jobs[finished.pop(0)]
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                self._pending.remove(job.id)
+            job.update(state='running', started=time.time())
+            try:
+                result = job.func(job)
+                job.update(state='succeeded', result=result, finished=time.time())
+            except Exception as e:
+                logger.error(f"任务 {job.name} ({job.id}) 失败: {e}", exc_info=True)
+                job.update(state='failed', error=str(e), finished=time.time())
+            finally:
+                self._queue.task_done()
+
+    def join(self):
+        """等待已提交的任务全部完成"""
+        self._queue.join()
+
+
+# 进程内共享的导入任务队列
+job_queue = JobQueue()
@@ -0,0 +1,198 @@
+"""数据库结构版本迁移
+
+使用 PRAGMA user_version 记录当前结构版本，按顺序执行未完成的迁移，
+把历史上不同版本的 expense 表（app.py 初始化的、ExcelHandler 创建的、
+手工追加 Sal 列的）统一为同一套结构并建立索引。
+
+用法: python migrations.py [数据库路径] [--check-plans]
+"""
+import argparse
+import sqlite3
+from employees import create_emp_info
+from queries import HOT_QUERIES
+from rates import CREATE_RATES_SQL, seed_rates
+from summary import CREATE_SUMMARY_SQL, rebuild_summary
+
+AMOUNT_COLUMNS = ['SAL', 'HF', 'PEN', 'UEM', 'MED1', 'MED2', 'INJ', 'UF']
+
+CREATE_EXPENSE_SQL = '''
+    CREATE TABLE {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        emp_id TEXT NOT NULL,              -- 员工ID（5位字符）
+        year INTEGER NOT NULL,             -- 年份
+        month INTEGER NOT NULL,            -- 月份
+        SAL REAL NOT NULL DEFAULT 0,       -- 工资
+        HF REAL NOT NULL DEFAULT 0,        -- Housing Fund（住房公积金）
+        PEN REAL NOT NULL DEFAULT 0,       -- Pension（养老保险）
+        UEM REAL NOT NULL DEFAULT 0,       -- Unemployment（失业保险）
+        MED1 REAL NOT NULL DEFAULT 0,      -- Medical Insurance 1（医疗保险1）
+        MED2 REAL NOT NULL DEFAULT 0,      -- Medical Insurance 2（医疗保险2）
+        INJ REAL NOT NULL DEFAULT 0,       -- Injury Insurance（工伤保险）
+        UF REAL NOT NULL DEFAULT 0,        -- Union Fee（工会经费）
+        create_time TEXT                   -- 记录创建时间
+    )
+'''
+
+
+def _table_columns(cursor, table):
+    """返回表的列名（统一大写，SQLite列名不区分大小写）"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    return {row[1].upper() for row in cursor.fetchall()}
+
+
+def _table_exists(cursor, table):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    return cursor.fetchone() is not None
+
+
+def _migrate_canonical_expense(cursor):
+    """统一expense表结构
+
+    旧表按现有列拷贝到新表，缺失的金额列补0；
+    同一员工同一月份有多条记录时保留最后写入的一条。
+    """
+    if not _table_exists(cursor, 'expense'):
+        cursor.execute(CREATE_EXPENSE_SQL.format(table='expense'))
+        return
+
+    columns = _table_columns(cursor, 'expense')
+    select_amounts = ', '.join(
+        f"COALESCE({col}, 0)" if col in columns else '0' for col in AMOUNT_COLUMNS
+    )
+    select_time = 'create_time' if 'CREATE_TIME' in columns else 'NULL'
+
+    cursor.execute("DROP TABLE IF EXISTS expense_new")
+    cursor.execute(CREATE_EXPENSE_SQL.format(table='expense_new'))
+    cursor.execute(f'''
+        INSERT INTO expense_new (emp_id, year, month, {', '.join(AMOUNT_COLUMNS)}, create_time)
+        SELECT emp_id, year, month, {select_amounts}, {select_time}
+        FROM expense
+        WHERE emp_id IS NOT NULL AND year IS NOT NULL AND month IS NOT NULL
+          AND rowid IN (SELECT MAX(rowid) FROM expense GROUP BY emp_id, year, month)
+        ORDER BY year, month, emp_id
+    ''')
+    cursor.execute("DROP TABLE expense")
+    cursor.execute("ALTER TABLE expense_new RENAME TO expense")
+
+
+def _migrate_expense_indexes(cursor):
+    """建立expense表的唯一键与覆盖索引
+
+    - ux_expense_emp_period (emp_id, year, month): 唯一键，按员工查询及冲突更新
+    - idx_expense_period (year, month, emp_id, 金额列): 覆盖索引，
+      月度汇总与按月明细只读索引即可完成，无需回表
+    """
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_expense_emp_period
+        ON expense (emp_id, year, month)
+    ''')
+    cursor.execute(f'''
+        CREATE INDEX IF NOT EXISTS idx_expense_period
+        ON expense (year, month, emp_id, {', '.join(AMOUNT_COLUMNS)})
+    ''')
+    cursor.execute("ANALYZE expense")
+
+
+def _migrate_monthly_summary(cursor):
+    """建立月度汇总表并按现有expense数据回填"""
+    cursor.execute(CREATE_SUMMARY_SQL)
+    rebuild_summary(cursor)
+
+
+def _migrate_insurance_rates(cursor):
+    """建立版本化费率表，并把 config.py 的费率登记为初始版本"""
+    cursor.execute(CREATE_RATES_SQL)
+    seed_rates(cursor)
+
+
+def _migrate_emp_info(cursor):
+    """员工维度：emp_info 改为 emp_id 主键、入职日期统一格式并增加入职月序号，建索引和版本触发器"""
+    create_emp_info(cursor)
+
+
+# (版本号, 说明, 迁移函数)，只能在末尾追加
+MIGRATIONS = [
+    (1, '统一expense表结构', _migrate_canonical_expense),
+    (2, 'expense唯一键与覆盖索引', _migrate_expense_indexes),
+    (3, '月度汇总表monthly_summary', _migrate_monthly_summary),
+    (4, '版本化缴费费率表insurance_rates', _migrate_insurance_rates),
+    (5, '员工维度表emp_info', _migrate_emp_info),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, target=LATEST_VERSION):
+    """执行所有未完成的迁移，返回已执行的版本号列表
+
+    每个迁移在独立事务中执行，失败时回滚且不更新版本号。
+    """
+    applied = []
+    current = get_schema_version(conn)
+    for version, description, func in MIGRATIONS:
+        if version <= current or version > target:
+            continue
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN")
+            func(cursor)
+            cursor.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+
+def explain_query(conn, sql, params=()):
+    """返回查询的 EXPLAIN QUERY PLAN 明细"""
+    cursor = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+    return [row[3] for row in cursor.fetchall()]
+
+
+def check_query_plans(conn, queries=None):
+    """检查高频查询是否都走索引
+
+    返回 {查询名: 执行计划} 中对expense做了全表扫描的部分，全部走索引时返回空字典。
+    只有覆盖索引的全量扫描（如全量重算汇总）视为走索引；
+    扫描普通索引仍要逐行回表，与全表扫描无异。
+    """
+    failures = {}
+    for name, (sql, params) in (queries or HOT_QUERIES).items():
+        plan = explain_query(conn, sql, params)
+        if any(step.startswith('SCAN expense') and 'COVERING INDEX' not in step for step in plan):
+            failures[name] = plan
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='expense表结构迁移')
+    parser.add_argument('database', nargs='?', default='Cluster_Expense.db')
+    parser.add_argument('--check-plans', action='store_true', help='检查高频查询的执行计划')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.database)
+    try:
+        before = get_schema_version(conn)
+        applied = migrate(conn)
+        print(f"结构版本: {before} -> {get_schema_version(conn)}, 执行迁移: {applied or '无'}")
+        if args.check_plans:
+            for name, (sql, params) in HOT_QUERIES.items():
+                print(f"[{name}]")
+                for step in explain_query(conn, sql, params):
+                    print(f"    {step}")
+            failures = check_query_plans(conn)
+            if failures:
+                raise SystemExit(f"以下查询未使用索引: {', '.join(failures)}")
+            print("所有高频查询均使用索引")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
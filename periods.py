@@ -0,0 +1,203 @@
+"""期间运算
+
+把 (year, month) 换算为连续的月序号 period = year * 12 + month - 1，
+任意期间区间都表示为闭区间 PeriodRange(start, end)，
+据此支持环比、同比、季度对比和滚动N个月等任意两个区间的对比。
+
+区间写法（parse_range）:
+- 2024-03           单月
+- 2024Q2            季度
+- 2024              全年
+- 2024-01:2024-06   起止月份（起止也可以写季度或年份）
+- R12@2024-06       截至2024-06的滚动12个月
+"""
+import re
+from collections import namedtuple
+from comparison import employee_status
+from queries import RANGE_COMPARISON_SQL, RANGE_MEASURES, ROLLING_TREND_SQL
+
+RANGE_CODES = [name for name, _ in RANGE_MEASURES]
+
+_MONTH_RE = re.compile(r'^(\d{4})-(\d{1,2})$')
+_QUARTER_RE = re.compile(r'^(\d{4})[Qq]([1-4])$')
+_YEAR_RE = re.compile(r'^(\d{4})$')
+_ROLLING_RE = re.compile(r'^[Rr](\d+)@(.+)$')
+
+
+def to_period(year, month):
+    """(year, month) -> 月序号"""
+    if not 1 <= month <= 12:
+        raise ValueError(f'月份超出1-12范围: {month}')
+    return year * 12 + month - 1
+
+
+def from_period(period):
+    """月序号 -> (year, month)"""
+    return period // 12, period % 12 + 1
+
+
+def format_period(period):
+    year, month = from_period(period)
+    return f'{year}-{month:02d}'
+
+
+class PeriodRange(namedtuple('PeriodRange', ['start', 'end'])):
+    """闭区间 [start, end] 内的连续月份"""
+    __slots__ = ()
+
+    @property
+    def months(self):
+        return self.end - self.start + 1
+
+    @property
+    def label(self):
+        if self.start == self.end:
+            return format_period(self.start)
+        return f'{format_period(self.start)}:{format_period(self.end)}'
+
+    def shift(self, months):
+        """整体平移若干个月"""
+        return PeriodRange(self.start + months, self.end + months)
+
+    def previous(self):
+        """紧邻的前一个等长区间（环比）"""
+        return self.shift(-self.months)
+
+    def year_ago(self):
+        """去年同期（同比）"""
+        return self.shift(-12)
+
+    def year_months(self):
+        """区间内全部 (year, month)"""
+        return [from_period(p) for p in range(self.start, self.end + 1)]
+
+
+def month_range(year, month):
+    period = to_period(year, month)
+    return PeriodRange(period, period)
+
+
+def quarter_range(year, quarter):
+    if not 1 <= quarter <= 4:
+        raise ValueError(f'季度超出1-4范围: {quarter}')
+    start = to_period(year, quarter * 3 - 2)
+    return PeriodRange(start, start + 2)
+
+
+def year_range(year):
+    return PeriodRange(to_period(year, 1), to_period(year, 12))
+
+
+def rolling_range(year, month, months):
+    """截至 (year, month) 的滚动 months 个月"""
+    if months < 1:
+        raise ValueError(f'滚动月数必须大于0: {months}')
+    end = to_period(year, month)
+    return PeriodRange(end - months + 1, end)
+
+
+def _parse_single(spec):
+    match = _MONTH_RE.match(spec)
+    if match:
+        return month_range(int(match.group(1)), int(match.group(2)))
+    match = _QUARTER_RE.match(spec)
+    if match:
+        return quarter_range(int(match.group(1)), int(match.group(2)))
+    match = _YEAR_RE.match(spec)
+    if match:
+        return year_range(int(match.group(1)))
+    raise ValueError(f'无法识别的期间: {spec}')
+
+
+def parse_range(spec):
+    """按模块说明中的写法解析期间区间，无法识别时抛出ValueError"""
+    spec = (spec or '').strip()
+    match = _ROLLING_RE.match(spec)
+    if match:
+        end = _parse_single(match.group(2)).end
+        year, month = from_period(end)
+        return rolling_range(year, month, int(match.group(1)))
+    if ':' in spec:
+        first, last = spec.split(':', 1)
+        result = PeriodRange(_parse_single(first.strip()).start, _parse_single(last.strip()).end)
+    else:
+        result = _parse_single(spec)
+    if result.start > result.end:
+        raise ValueError(f'期间起点晚于终点: {spec}')
+    return result
+
+
+def base_range(current, compare):
+    """根据对比方式得到基期区间：previous（环比）或 year_ago（同比）"""
+    if compare == 'previous':
+        return current.previous()
+    if compare == 'year_ago':
+        return current.year_ago()
+    raise ValueError(f'无效的对比方式: {compare}')
+
+
+def compare_ranges(conn, current, base):
+    """按员工和费用代码对比两个期间区间的累计金额（一次分组查询）
+
+    返回列式结构：
+    {'current': 标签, 'base': 标签, 'emp_id': [...], 'status': [...],
+     'codes': {代码: {'current'|'previous'|'change'|'change_rate': [...]}},
+     'totals': {代码: {'current', 'previous', 'change', 'change_rate'}}}
+    """
+    cursor = conn.execute(RANGE_COMPARISON_SQL, {
+        'c_start': current.start, 'c_end': current.end,
+        'p_start': base.start, 'p_end': base.end,
+        'year_min': from_period(min(current.start, base.start))[0],
+        'year_max': from_period(max(current.end, base.end))[0]
+    })
+    columns = [desc[0] for desc in cursor.description]
+    rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    totals = {}
+    for code in RANGE_CODES:
+        curr_sum = rows[0][f'{code}_current_sum'] if rows else 0.0
+        prev_sum = rows[0][f'{code}_previous_sum'] if rows else 0.0
+        totals[code] = {
+            'current': curr_sum,
+            'previous': prev_sum,
+            'change': curr_sum - prev_sum,
+            'change_rate': (curr_sum - prev_sum) / prev_sum * 100 if prev_sum != 0 else 0
+        }
+
+    return {
+        'current': current.label,
+        'base': base.label,
+        'emp_id': [row['emp_id'] for row in rows],
+        'status': [employee_status(row['in_current'], row['in_previous']) for row in rows],
+        'codes': {
+            code: {
+                field: [row[f'{code}_{field}'] for row in rows]
+                for field in ('current', 'previous', 'change', 'change_rate')
+            }
+            for code in RANGE_CODES
+        },
+        'totals': totals
+    }
+
+
+def rolling_trend(conn, period_range, window):
+    """读取月度汇总表，返回区间内每月金额及截至当月的滚动 window 个月合计
+
+    返回列式结构 {'labels': [...], 'total_salary': [...], 'rolling_total_salary': [...], ...}
+    """
+    if window < 1:
+        raise ValueError(f'滚动月数必须大于0: {window}')
+    cursor = conn.execute(ROLLING_TREND_SQL, {
+        'start': period_range.start,
+        'end': period_range.end,
+        'window_offset': window - 1,
+        'year_min': from_period(period_range.start - window + 1)[0],
+        'year_max': from_period(period_range.end)[0]
+    })
+    columns = [desc[0] for desc in cursor.description]
+    rows = cursor.fetchall()
+    result = {'labels': [f'{row[0]}-{row[1]:02d}' for row in rows], 'window': window}
+    for index, column in enumerate(columns):
+        if column not in ('year', 'month', 'period'):
+            result[column] = [row[index] for row in rows]
+    return result
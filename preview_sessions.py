@@ -0,0 +1,176 @@
+"""服务端预览会话
+
+/preview_excel 解析后的数据保留在服务端，按会话ID分页、排序、按列过滤返回，
+页面只渲染当前页；导入时用行号区间或过滤条件选择行，
+由服务端直接写入保存的数据，不再把全部选中记录以JSON回传。
+
+过滤条件写法（多个条件同时满足）：
+    month>=3   emp_id=00017   SAL<5000   emp_id!=00017   emp_id~001（包含）
+"""
+import re
+import threading
+import time
+import uuid
+import numpy as np
+import pandas as pd
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+DEFAULT_MAX_SESSIONS = 16
+DEFAULT_TTL = 3600
+
+# 行号列，对应解析后数据的原始顺序（从0开始）
+ROW_ID = 'row_id'
+
+_FILTER_RE = re.compile(r'^\s*(\w+)\s*(>=|<=|!=|=|>|<|~)\s*(.*?)\s*$')
+
+
+def parse_filter(spec):
+    """'month>=3' -> ('month', '>=', '3')，无法识别时抛出ValueError"""
+    match = _FILTER_RE.match(spec or '')
+    if not match:
+        raise ValueError(f'无法识别的过滤条件: {spec}')
+    return match.groups()
+
+
+def _filter_mask(df, spec):
+    column, op, value = parse_filter(spec)
+    if column not in df.columns:
+        raise ValueError(f'过滤条件中的列不存在: {column}')
+    series = df[column]
+    if op == '~':
+        return series.astype(str).str.contains(value, regex=False).to_numpy()
+    if pd.api.types.is_numeric_dtype(series):
+        try:
+            value = float(value)
+        except ValueError:
+            raise ValueError(f'{column} 为数值列，无法与 {value!r} 比较')
+    else:
+        series = series.astype(str)
+    return {
+        '=': series == value,
+        '!=': series != value,
+        '>': series > value,
+        '>=': series >= value,
+        '<': series < value,
+        '<=': series <= value
+    }[op].to_numpy()
+
+
+class PreviewSession:
+    """一个预览会话：解析后的数据及最近一次排序/过滤的结果"""
+
+    def __init__(self, df, filename=None, digest=None):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.digest = digest
+        self.df = df.reset_index(drop=True)
+        self.df.insert(0, ROW_ID, np.arange(len(self.df)))
+        self.created = self.last_access = time.time()
+        self._view_key = None
+        self._view = None
+        self._lock = threading.Lock()
+
+    @property
+    def columns(self):
+        return self.df.columns.tolist()
+
+    def select(self, filters=()):
+        """满足全部过滤条件的行（保持原始顺序）"""
+        mask = np.ones(len(self.df), dtype=bool)
+        for spec in filters:
+            mask &= _filter_mask(self.df, spec)
+        return self.df[mask]
+
+    def select_ranges(self, ranges):
+        """按行号闭区间 [[start, end], ...] 选择行"""
+        row_ids = self.df[ROW_ID].to_numpy()
+        mask = np.zeros(len(self.df), dtype=bool)
+        for start, end in ranges:
+            start, end = int(start), int(end)
+            if start > end:
+                raise ValueError(f'行号区间起点大于终点: {start}-{end}')
+            mask |= (row_ids >= start) & (row_ids <= end)
+        return self.df[mask]
+
+    def _view_positions(self, sort, descending, filters):
+        key = (sort, descending, tuple(filters))
+        with self._lock:
+            if key == self._view_key:
+                return self._view
+        view = self.select(filters)
+        if sort:
+            if sort not in self.df.columns:
+                raise ValueError(f'排序列不存在: {sort}')
+            view = view.sort_values(sort, ascending=not descending, kind='stable')
+        positions = view.index.to_numpy()
+        with self._lock:
+            self._view_key, self._view = key, positions
+        return positions
+
+    def page(self, page=1, size=DEFAULT_PAGE_SIZE, sort=None, descending=False, filters=()):
+        """返回一页数据：{'session_id', 'total', 'page', 'pages', 'size', 'columns', 'rows'}
+
+        同一排序/过滤条件连续翻页时复用上次的排序结果。
+        """
+        self.last_access = time.time()
+        size = max(1, min(int(size), MAX_PAGE_SIZE))
+        positions = self._view_positions(sort, descending, list(filters))
+        total = len(positions)
+        pages = max(1, -(-total // size))
+        page = max(1, min(int(page), pages))
+        rows = self.df.iloc[positions[(page - 1) * size:page * size]]
+        return {
+            'session_id': self.id,
+            'total': total,
+            'page': page,
+            'pages': pages,
+            'size': size,
+            'columns': self.columns,
+            'rows': rows.astype(object).where(rows.notna(), None).to_dict('records')
+        }
+
+    def frame(self, rows):
+        """去掉行号列，得到可直接导入的数据"""
+        return rows.drop(columns=[ROW_ID])
+
+
+class PreviewStore:
+    """预览会话容器：超过TTL未访问的会话过期，数量超出上限时淘汰最久未访问的"""
+
+    def __init__(self, max_sessions=DEFAULT_MAX_SESSIONS, ttl=DEFAULT_TTL):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def create(self, df, filename=None, digest=None):
+        session = PreviewSession(df, filename, digest)
+        with self._lock:
+            self._expire()
+            self._sessions[session.id] = session
+            while len(self._sessions) > self.max_sessions:
+                oldest = min(self._sessions.values(), key=lambda s: s.last_access)
+                del self._sessions[oldest.id]
+        return session
+
+    def get(self, session_id):
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(session_id)
+        if session is not None:
+            session.last_access = time.time()
+        return session
+
+    def discard(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _expire(self):
+        deadline = time.time() - self.ttl
+        for session_id in [sid for sid, s in self._sessions.items() if s.last_access < deadline]:
+            del self._sessions[session_id]
+
+
+# 进程内共享的预览会话
+preview_store = PreviewStore()
@@ -0,0 +1,323 @@
+"""请求级性能埋点
+
+- 每次 SQLite 执行（连接池的连接使用 ProfiledConnection）和每次 Excel 读写记录为一个 span：
+  类别、名称、耗时、行数；请求处理期间的 span 归属当前请求（线程内），
+  请求结束时汇总为 Server-Timing 响应头
+- 各路由、各查询的耗时直方图与行数计数以 Prometheus 文本格式输出（/metrics）
+- 超过阈值的查询记入慢查询日志（SQL 与参数）
+- debug() 输出受开关控制，关闭时只做一次布尔判断，不格式化参数
+
+查询按 SQL 指纹归类：合并空白、把 IN (?, ?, ...) 之类的占位符列表折叠为 ?...，截断为 120 字符。
+"""
+import logging
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# 秒；与 Prometheus 客户端默认分桶相同
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_SLOW_QUERY_SECONDS = 0.5
+FINGERPRINT_LENGTH = 120
+METRIC_PREFIX = 'cluster_expense'
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger('cluster_expense.slow_query')
+debug_logger = logging.getLogger('cluster_expense.debug')
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_PLACEHOLDER_LIST_RE = re.compile(r'\?(\s*,\s*\?)+')
+
+
+def fingerprint(sql):
+    """SQL 指纹，作为查询指标的标签"""
+    sql = _PLACEHOLDER_LIST_RE.sub('?...', _WHITESPACE_RE.sub(' ', sql).strip())
+    return sql[:FINGERPRINT_LENGTH]
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in labels)
+
+
+class Metrics:
+    """进程内指标：直方图与计数器，按 (指标名, 标签) 分组"""
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, labels, value, help_text=''):
+        with self._lock:
+            key = (name, tuple(labels))
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+                self._help.setdefault(name, help_text)
+            histogram.observe(value)
+
+    def inc(self, name, labels, value=1, help_text=''):
+        with self._lock:
+            key = (name, tuple(labels))
+            self._counters[key] = self._counters.get(key, 0) + value
+            self._help.setdefault(name, help_text)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def render(self):
+        """Prometheus 文本格式（0.0.4）"""
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self._histograms}):
+                full = f'{METRIC_PREFIX}_{name}'
+                lines.append(f'# HELP {full} {self._help.get(name, "")}')
+                lines.append(f'# TYPE {full} histogram')
+                for (metric, labels), histogram in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        bucket_labels = _format_labels(labels + (('le', bound),))
+                        lines.append(f'{full}_bucket{{{bucket_labels}}} {cumulative}')
+                    bucket_labels = _format_labels(labels + (('le', '+Inf'),))
+                    lines.append(f'{full}_bucket{{{bucket_labels}}} {histogram.count}')
+                    lines.append(f'{full}_sum{{{_format_labels(labels)}}} {histogram.sum:.6f}')
+                    lines.append(f'{full}_count{{{_format_labels(labels)}}} {histogram.count}')
+            for name in sorted({name for name, _ in self._counters}):
+                full = f'{METRIC_PREFIX}_{name}'
+                lines.append(f'# HELP {full} {self._help.get(name, "")}')
+                lines.append(f'# TYPE {full} counter')
+                for (metric, labels), value in sorted(self._counters.items()):
+                    if metric == name:
+                        lines.append(f'{full}{{{_format_labels(labels)}}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+_settings = {
+    'enabled': True,
+    'debug': False,
+    'slow_query_seconds': DEFAULT_SLOW_QUERY_SECONDS
+}
+_local = threading.local()
+
+
+def configure(enabled=None, debug=None, slow_query_seconds=None, slow_query_log=None):
+    """enabled: 是否记录 span 和指标；debug: 是否输出 debug()；
+    slow_query_seconds: 慢查询阈值；slow_query_log: 慢查询日志文件
+    """
+    for name, value in (('enabled', enabled), ('debug', debug),
+                        ('slow_query_seconds', slow_query_seconds)):
+        if value is not None:
+            _settings[name] = value
+    if debug is not None:
+        debug_logger.setLevel(logging.DEBUG if debug else logging.INFO)
+        if debug and not debug_logger.handlers:
+            debug_logger.addHandler(logging.StreamHandler())
+    if slow_query_log is not None and not slow_query_logger.handlers:
+        handler = logging.FileHandler(slow_query_log, encoding='utf-8', delay=True)
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+        slow_query_logger.addHandler(handler)
+
+
+def enabled():
+    return _settings['enabled']
+
+
+def debug_enabled():
+    return _settings['debug']
+
+
+def debug(message, *args):
+    """调试输出，关闭时不格式化参数"""
+    if _settings['debug']:
+        debug_logger.debug(message, *args)
+
+
+# ---- 请求 ----
+
+def start_request():
+    _local.spans = []
+    _local.started = time.perf_counter()
+
+
+def current_spans():
+    return getattr(_local, 'spans', None)
+
+
+def finish_request(route, method, status):
+    """结束当前请求：记录路由耗时，返回 (总耗时, spans)"""
+    spans = getattr(_local, 'spans', None)
+    started = getattr(_local, 'started', None)
+    _local.spans = _local.started = None
+    if started is None:
+        return 0.0, []
+    seconds = time.perf_counter() - started
+    if _settings['enabled']:
+        labels = (('route', route), ('method', method), ('status', status))
+        metrics.observe('request_seconds', labels, seconds, '请求处理耗时（秒）')
+    return seconds, spans or []
+
+
+def server_timing(seconds, spans):
+    """Server-Timing 响应头：各类别 span 的次数与累计耗时"""
+    totals = {}
+    for span in spans:
+        count, total, rows = totals.get(span['kind'], (0, 0.0, 0))
+        totals[span['kind']] = (count + 1, total + span['seconds'], rows + span['rows'])
+    parts = [f'{kind};desc="{count} ops, {rows} rows";dur={total * 1000:.2f}'
+             for kind, (count, total, rows) in sorted(totals.items())]
+    parts.append(f'total;dur={seconds * 1000:.2f}')
+    return ', '.join(parts)
+
+
+# ---- span ----
+
+def record(kind, name, seconds, rows=0, detail=None):
+    """记录一个已完成的 span：指标 + 当前请求"""
+    if not _settings['enabled']:
+        return
+    labels = (('name', name),)
+    metrics.observe(f'{kind}_seconds', labels, seconds, f'{kind} 操作耗时（秒）')
+    metrics.inc(f'{kind}_rows_total', labels, rows, f'{kind} 操作涉及的行数')
+    spans = getattr(_local, 'spans', None)
+    if spans is not None:
+        spans.append({'kind': kind, 'name': name, 'seconds': seconds, 'rows': rows})
+    if _settings['debug']:
+        debug_logger.debug('%s %s: %.2fms, %d行 %s', kind, name, seconds * 1000, rows, detail or '')
+
+
+@contextmanager
+def span(kind, name):
+    """计时上下文，调用方可设置 span['rows']"""
+    if not _settings['enabled']:
+        yield {}
+        return
+    info = {'rows': 0}
+    started = time.perf_counter()
+    try:
+        yield info
+    finally:
+        record(kind, name, time.perf_counter() - started, info['rows'])
+
+
+# ---- SQLite ----
+
+def _describe_params(params, many):
+    if many:
+        return f'<{len(params)} 组参数>' if hasattr(params, '__len__') else '<批量参数>'
+    text = repr(tuple(params) if isinstance(params, (list, tuple)) else params)
+    return text if len(text) <= 500 else text[:500] + '...'
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """记录每次执行及随后读取结果的耗时和行数
+
+    一次查询的 span 在下一次执行、close() 或游标被回收时结束；
+    逐行迭代游标读取的行不计入行数（只计 fetch* 返回的行）。
+    """
+    _pending = None
+
+    def _finish(self):
+        pending, self._pending = self._pending, None
+        if pending is None:
+            return
+        sql, params, many, seconds, rows = pending
+        if rows < 0:
+            rows = 0
+        record('query', fingerprint(sql), seconds, rows)
+        if seconds >= _settings['slow_query_seconds']:
+            metrics.inc('slow_queries_total', (('name', fingerprint(sql)),), 1, '慢查询次数')
+            slow_query_logger.warning('慢查询 %.1fms, %d行: %s 参数: %s', seconds * 1000, rows,
+                                      _WHITESPACE_RE.sub(' ', sql).strip(),
+                                      _describe_params(params, many))
+
+    def _run(self, method, sql, params, many):
+        self._finish()
+        started = time.perf_counter()
+        try:
+            return method(self, sql, params)
+        finally:
+            seconds = time.perf_counter() - started
+            # 写语句以影响行数计，查询在 fetch 时累加
+            rows = self.rowcount if self.description is None else 0
+            self._pending = [sql, params, many, seconds, rows]
+
+    def execute(self, sql, params=()):
+        return self._run(sqlite3.Cursor.execute, sql, params, False)
+
+    def executemany(self, sql, params):
+        return self._run(sqlite3.Cursor.executemany, sql, params, True)
+
+    def _fetched(self, method, *args):
+        started = time.perf_counter()
+        result = method(self, *args)
+        pending = self._pending
+        if pending is not None:
+            pending[3] += time.perf_counter() - started
+            pending[4] += len(result) if isinstance(result, list) else int(result is not None)
+        return result
+
+    def fetchone(self):
+        return self._fetched(sqlite3.Cursor.fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetched(sqlite3.Cursor.fetchmany, size if size is not None else self.arraysize)
+
+    def fetchall(self):
+        return self._fetched(sqlite3.Cursor.fetchall)
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """cursor()/execute()/executemany() 都使用 ProfiledCursor"""
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, params):
+        return self.cursor().executemany(sql, params)
+
+
+def connection_factory():
+    """sqlite3.connect 的 factory 参数：关闭埋点时使用原生连接，没有额外开销"""
+    return ProfiledConnection if _settings['enabled'] else sqlite3.Connection
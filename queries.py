@@ -0,0 +1,250 @@
+"""expense表上的高频查询
+
+app.py 的路由与 migrations.check_query_plans 共用这些SQL，
+保证执行计划检查的正是线上实际执行的语句。
+"""
+
+# 按月汇总的聚合（不排序），DuckDB 后端以此定义 monthly_summary 视图
+MONTHLY_SUMMARY_SELECT = """
+SELECT
+    year,
+    month,
+    ROUND(SUM(SAL), 2) as total_salary,
+    ROUND(SUM(PEN), 2) as total_pension,
+    ROUND(SUM(MED1 + MED2), 2) as total_medical,
+    ROUND(SUM(INJ), 2) as total_injury,
+    ROUND(SUM(UEM), 2) as total_unemployment,
+    ROUND(SUM(HF), 2) as total_hf,
+    ROUND(SUM(UF), 2) as total_union_fee,
+    ROUND(SUM(HF + PEN + UEM + MED1 + MED2 + INJ), 2) as total_insurance,
+    ROUND(SUM(SAL + HF + PEN + UEM + MED1 + MED2 + INJ + UF), 2) as grand_total
+FROM expense
+GROUP BY year, month
+"""
+
+MONTHLY_SUMMARY_SQL = MONTHLY_SUMMARY_SELECT + "ORDER BY year DESC, month DESC;\n"
+
+# 首页读取的月度汇总（由 summary.py 在导入时增量维护）
+MONTHLY_SUMMARY_ROLLUP_SQL = """
+SELECT
+    year,
+    month,
+    total_salary,
+    total_pension,
+    total_medical,
+    total_injury,
+    total_unemployment,
+    total_hf,
+    total_union_fee,
+    total_insurance,
+    grand_total
+FROM monthly_summary
+ORDER BY year DESC, month DESC;
+"""
+
+# 月度明细对比的指标: (名称, 计算表达式)
+DETAIL_MEASURES = [
+    ('salary', 'SAL'),
+    ('pension', 'PEN'),
+    ('medical', 'MED1 + MED2'),
+    ('injury', 'INJ'),
+    ('unemployment', 'UEM'),
+    ('housing_fund', 'HF'),
+    ('union_fee', 'UF'),
+    ('total', 'SAL + PEN + MED1 + MED2 + INJ + UEM + HF + UF')
+]
+
+
+# 员工对比接口的费用类型: (名称, 计算表达式)，total 不含工会经费
+COMPARISON_MEASURES = [
+    ('salary', 'SAL'),
+    ('housing_fund', 'HF'),
+    ('pension', 'PEN'),
+    ('unemployment', 'UEM'),
+    ('medical', 'MED1 + MED2'),
+    ('injury', 'INJ'),
+    ('total', 'SAL + HF + PEN + UEM + MED1 + MED2 + INJ')
+]
+
+
+def _change_rate_sql(name, new_rate):
+    """变化率表达式（百分比），对比值为0时取new_rate或0"""
+    new_case = f"WHEN {name}_current > 0 THEN {new_rate} " if new_rate else ""
+    return (f"CASE WHEN {name}_previous != 0 "
+            f"THEN ({name}_current - {name}_previous) * 100.0 / {name}_previous "
+            f"{new_case}ELSE 0 END")
+
+
+# 单月对比的条件：当月(:cy, :cm)与对比月(:py, :pm)
+_MONTH_CURRENT = 'year = :cy AND month = :cm'
+_MONTH_PREVIOUS = 'year = :py AND month = :pm'
+
+# 区间对比的条件：period = year * 12 + month - 1，区间两端均包含；
+# 先用 year 范围走索引，再按 period 精确过滤
+_RANGE_CURRENT = 'year * 12 + month - 1 BETWEEN :c_start AND :c_end'
+_RANGE_PREVIOUS = 'year * 12 + month - 1 BETWEEN :p_start AND :p_end'
+_RANGE_WHERE = (f'year BETWEEN :year_min AND :year_max '
+                f'AND (({_RANGE_CURRENT}) OR ({_RANGE_PREVIOUS}))')
+
+
+def _build_period_comparison_sql(measures, new_rate=0, current=_MONTH_CURRENT,
+                                 previous=_MONTH_PREVIOUS, where=None,
+                                 total='TOTAL({})', group_key='+emp_id'):
+    """生成两个期间对比的单次扫描查询
+
+    内层按员工分组，用条件聚合同时得到当前期间(current)与对比期间(previous)的值，
+    任一期间有记录的员工都会返回（包括已离职、新入职的员工）；
+    外层计算变化额、变化率，并用窗口函数在同一次查询中给出合计。
+    new_rate: 对比值为0而当前值为正时的变化率（员工对比接口沿用100）。
+    where: 扫描条件，默认为两个期间条件的OR。
+    GROUP BY +emp_id 阻止优化器为了分组顺序去全量扫描 (emp_id, year, month) 索引，
+    保证按期间走覆盖索引查找。
+    total/group_key: 无记录时取0的求和与分组键的写法，其他数据库方言（DuckDB）替换。
+    """
+    inner = ',\n        '.join(
+        f"{total.format(f'CASE WHEN {current} THEN {expr} END')} AS {name}_current,\n"
+        f"        {total.format(f'CASE WHEN {previous} THEN {expr} END')} AS {name}_previous"
+        for name, expr in measures
+    )
+    outer = ',\n    '.join(
+        f"{name}_current,\n"
+        f"    {name}_previous,\n"
+        f"    {name}_current - {name}_previous AS {name}_change,\n"
+        f"    {_change_rate_sql(name, new_rate)} AS {name}_change_rate,\n"
+        f"    SUM({name}_current) OVER () AS {name}_current_sum,\n"
+        f"    SUM({name}_previous) OVER () AS {name}_previous_sum"
+        for name, _ in measures
+    )
+    return f"""
+WITH paired AS (
+    SELECT
+        emp_id,
+        MAX({current}) AS in_current,
+        MAX({previous}) AS in_previous,
+        {inner}
+    FROM expense
+    WHERE {where or f'({current}) OR ({previous})'}
+    GROUP BY {group_key}
+)
+SELECT
+    emp_id,
+    in_current,
+    in_previous,
+    {outer}
+FROM paired
+ORDER BY emp_id
+"""
+
+
+MONTHLY_COMPARISON_SQL = _build_period_comparison_sql(DETAIL_MEASURES)
+
+EMPLOYEE_COMPARISON_SQL = _build_period_comparison_sql(COMPARISON_MEASURES, new_rate=100)
+
+# 任意两个期间区间按费用代码对比（periods.compare_ranges 使用）
+RANGE_MEASURES = [
+    ('SAL', 'SAL'),
+    ('HF', 'HF'),
+    ('PEN', 'PEN'),
+    ('UEM', 'UEM'),
+    ('MED1', 'MED1'),
+    ('MED2', 'MED2'),
+    ('INJ', 'INJ'),
+    ('UF', 'UF'),
+    ('total', 'SAL + HF + PEN + UEM + MED1 + MED2 + INJ + UF')
+]
+
+RANGE_COMPARISON_SQL = _build_period_comparison_sql(
+    RANGE_MEASURES, current=_RANGE_CURRENT, previous=_RANGE_PREVIOUS, where=_RANGE_WHERE)
+
+# 按月汇总的滚动趋势：period 为月序号 year * 12 + month - 1，
+# RANGE 窗口按月序号取前 :window_offset 个月，中间缺失的月份不会被错算进窗口；
+# 内层多取窗口长度的历史月份，保证区间起点的滚动值完整
+ROLLING_TREND_SQL = """
+SELECT *
+FROM (
+    SELECT
+        year,
+        month,
+        year * 12 + month - 1 AS period,
+        total_salary,
+        total_insurance,
+        total_union_fee,
+        grand_total,
+        SUM(total_salary) OVER w AS rolling_total_salary,
+        SUM(total_insurance) OVER w AS rolling_total_insurance,
+        SUM(total_union_fee) OVER w AS rolling_total_union_fee,
+        SUM(grand_total) OVER w AS rolling_grand_total,
+        COUNT(*) OVER w AS rolling_months
+    FROM monthly_summary
+    WHERE year BETWEEN :year_min AND :year_max
+      AND year * 12 + month - 1 BETWEEN :start - :window_offset AND :end
+    WINDOW w AS (ORDER BY year * 12 + month - 1
+                 RANGE BETWEEN :window_offset PRECEDING AND CURRENT ROW)
+)
+WHERE period >= :start
+ORDER BY period
+"""
+
+# 按员工属性分组合计（employees.breakdown 的 SQL 路径）：expense 与 emp_info 主键连接，
+# 分组键为整数：职级由调用方映射为序号，工龄段 0..4，入职年份；无员工信息的为 -1
+_BREAKDOWN_PERIOD = 'expense.year * 12 + expense.month - 1'
+BREAKDOWN_KEYS = {
+    'level': 'emp_info.level',
+    'tenure': (f"CASE WHEN emp_info.join_period IS NULL THEN -1 "
+               f"WHEN {_BREAKDOWN_PERIOD} - emp_info.join_period < 12 THEN 0 "
+               f"WHEN {_BREAKDOWN_PERIOD} - emp_info.join_period < 36 THEN 1 "
+               f"WHEN {_BREAKDOWN_PERIOD} - emp_info.join_period < 60 THEN 2 "
+               f"WHEN {_BREAKDOWN_PERIOD} - emp_info.join_period < 120 THEN 3 ELSE 4 END"),
+    'cohort': 'COALESCE(emp_info.join_period / 12, -1)'
+}
+
+
+def _build_breakdown_sql(key):
+    return f"""
+SELECT
+    {key} AS group_key,
+    COUNT(DISTINCT expense.emp_id) AS headcount,
+    TOTAL(expense.SAL), TOTAL(expense.HF), TOTAL(expense.PEN), TOTAL(expense.UEM),
+    TOTAL(expense.MED1), TOTAL(expense.MED2), TOTAL(expense.INJ), TOTAL(expense.UF)
+FROM expense
+LEFT JOIN emp_info ON emp_info.emp_id = expense.emp_id
+WHERE expense.year BETWEEN :year_min AND :year_max
+  AND {_BREAKDOWN_PERIOD} BETWEEN :start AND :end
+GROUP BY group_key
+"""
+
+
+BREAKDOWN_SQL = {name: _build_breakdown_sql(key) for name, key in BREAKDOWN_KEYS.items()}
+
+# DuckDB 方言的同一组查询（backends.ParquetBackend 使用，按 SQLite 语句查找）：
+# DuckDB 没有 TOTAL()，分组键不需要 + 前缀；命名参数在执行时由 :name 改写为 $name
+_DUCKDB_TOTAL = 'COALESCE(SUM({}), 0.0)'
+DUCKDB_QUERIES = {
+    MONTHLY_SUMMARY_ROLLUP_SQL: MONTHLY_SUMMARY_ROLLUP_SQL,
+    MONTHLY_COMPARISON_SQL: _build_period_comparison_sql(
+        DETAIL_MEASURES, total=_DUCKDB_TOTAL, group_key='emp_id'),
+    EMPLOYEE_COMPARISON_SQL: _build_period_comparison_sql(
+        COMPARISON_MEASURES, new_rate=100, total=_DUCKDB_TOTAL, group_key='emp_id'),
+    RANGE_COMPARISON_SQL: _build_period_comparison_sql(
+        RANGE_MEASURES, current=_RANGE_CURRENT, previous=_RANGE_PREVIOUS, where=_RANGE_WHERE,
+        total=_DUCKDB_TOTAL, group_key='emp_id'),
+    ROLLING_TREND_SQL: ROLLING_TREND_SQL
+}
+
+# 执行计划检查使用的查询及示例参数
+HOT_QUERIES = {
+    'monthly_summary': (MONTHLY_SUMMARY_ROLLUP_SQL, ()),
+    'monthly_summary_recompute': (MONTHLY_SUMMARY_SQL, ()),
+    'monthly_detail': (MONTHLY_COMPARISON_SQL, {'cy': 2024, 'cm': 2, 'py': 2024, 'pm': 1}),
+    'employee_comparison': (EMPLOYEE_COMPARISON_SQL, {'cy': 2024, 'cm': 2, 'py': 2024, 'pm': 1}),
+    'range_comparison': (RANGE_COMPARISON_SQL, {
+        'c_start': 24291, 'c_end': 24293, 'p_start': 24279, 'p_end': 24281,
+        'year_min': 2023, 'year_max': 2024
+    }),
+    'breakdown_tenure': (BREAKDOWN_SQL['tenure'], {
+        'start': 24288, 'end': 24299, 'year_min': 2024, 'year_max': 2024
+    }),
+    'rolling_trend': (ROLLING_TREND_SQL, {
+        'start': 24276, 'end': 24299, 'window_offset': 11, 'year_min': 2022, 'year_max': 2024
+    })
+}
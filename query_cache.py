@@ -0,0 +1,128 @@
+"""查询结果缓存
+
+首页、月度明细和员工对比接口的数据只在导入时变化，
+按 (路由, 参数) 缓存计算结果，导入写入后按涉及的月份精确失效。
+
+- LRU淘汰，同时限制条目数和内存占用（按pickle后的字节数估算）
+- 每个条目可标记依赖的 (year, month)；未标记的条目依赖全部数据
+- 每次失效递增 data_version，并统计命中/未命中/淘汰次数
+- 其他按月份维护的内存数据可用 add_listener 订阅失效通知
+"""
+import pickle
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+class QueryCache:
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, size, periods)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.data_version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """订阅失效通知：callback(periods)，periods 含义与 invalidate 相同"""
+        self._listeners.append(callback)
+
+    def configure(self, max_entries=None, max_bytes=None):
+        """调整容量上限，超出部分立即淘汰"""
+        with self._lock:
+            if max_entries is not None:
+                self.max_entries = max_entries
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            self._evict()
+
+    def get_or_compute(self, key, compute, periods=None):
+        """命中时返回缓存结果，否则调用compute()计算并缓存
+
+        periods: 结果依赖的 (year, month) 集合，None 表示依赖全部数据。
+        compute() 抛出的异常不会被缓存。返回值由所有调用方共享，不应修改。
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+            version = self.data_version
+
+        value = compute()
+        self._put(key, value, periods, version)
+        return value
+
+    def _put(self, key, value, periods, version):
+        try:
+            size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            return
+        with self._lock:
+            # 计算期间发生了导入，结果可能已过期，不写入缓存
+            if version != self.data_version or size > self.max_bytes:
+                return
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            frozen = None if periods is None else frozenset(
+                (int(year), int(month)) for year, month in periods)
+            self._entries[key] = (value, size, frozen)
+            self._bytes += size
+            self._evict()
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries
+                                 or self._bytes > self.max_bytes):
+            _, (_, size, _) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+
+    def invalidate(self, periods=None):
+        """数据变更后调用，递增data_version并删除受影响的条目
+
+        periods为None时清空全部缓存；否则只删除依赖这些月份的条目
+        以及未标记月份（依赖全部数据）的条目。
+        """
+        with self._lock:
+            self.data_version += 1
+            self.invalidations += 1
+            if periods is None:
+                self._entries.clear()
+                self._bytes = 0
+            else:
+                periods = {(int(year), int(month)) for year, month in periods}
+                for key in [key for key, (_, _, deps) in self._entries.items()
+                            if deps is None or deps & periods]:
+                    self._bytes -= self._entries.pop(key)[1]
+        # 在锁外通知，回调中可以再读取缓存
+        for callback in self._listeners:
+            callback(periods)
+
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'data_version': self.data_version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+
+# 进程内共享的缓存实例，app.py 读取、导入路径负责失效
+result_cache = QueryCache()
@@ -0,0 +1,235 @@
+"""按地区、生效区间版本化的缴费费率
+
+insurance_rates 表每行是一个地区一个险种在 [start_period, end_period] 内的费率和基数上下限
+（月序号见 periods.to_period，end_period 为 NULL 表示至今有效）。
+每年7月调整基数时新增一个版本，上一版本自动截止到前一个月。
+
+RateStore 把一个地区的所有行按生效边界切成互不重叠的区间段，每段编译为一个
+contributions.RateTable：
+- resolve(period) 二分查找所在区间段，结果按 (地区, 月序号) 缓存
+- segment_index(periods) 对整列月序号一次 searchsorted，批量重算时按区间段分组计算
+
+用法: python rates.py [数据库路径] [--region 西安] [--month 2024-07]
+      python rates.py [数据库路径] --add-from-config 2025-07   把 config.py 当前值登记为新版本
+"""
+import argparse
+import bisect
+import sqlite3
+import threading
+import numpy as np
+from config import SOCIAL_INSURANCE_CONFIG
+from contributions import RateTable
+from periods import format_period, parse_range
+
+DEFAULT_REGION = '西安'
+
+CREATE_RATES_SQL = '''
+    CREATE TABLE IF NOT EXISTS insurance_rates (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        region TEXT NOT NULL,                 -- 地区
+        code TEXT NOT NULL,                   -- 险种代码（PEN/MED/UEM/INJ/HF/UF）
+        name TEXT NOT NULL,
+        rate REAL NOT NULL,
+        min_base REAL NOT NULL,
+        max_base REAL NOT NULL,
+        start_period INTEGER NOT NULL,        -- 生效起始月序号（含）
+        end_period INTEGER,                   -- 截止月序号（含），NULL表示至今有效
+        UNIQUE (region, code, start_period)
+    )
+'''
+
+_SELECT_RATES_SQL = '''
+    SELECT id, code, name, rate, min_base, max_base, start_period, end_period
+    FROM insurance_rates
+    WHERE region = ?
+    ORDER BY id
+'''
+
+
+def config_items(config=SOCIAL_INSURANCE_CONFIG):
+    """配置字典 -> (code, name, rate, min_base, max_base) 列表，跳过没有费率的项"""
+    return [(item['code'], item['name'], item['rate'], item['min_base'], item['max_base'])
+            for item in config.values() if 'rate' in item]
+
+
+def add_rate_version(cursor, start_period, items, region=DEFAULT_REGION):
+    """登记从 start_period 起生效的新费率版本
+
+    同一险种仍然有效的旧版本截止到 start_period - 1；
+    已有版本的起始月不早于 start_period 时抛出ValueError（不允许插入到历史中间）。
+    调用方负责提交事务，提交后调用 invalidate_rates()。
+    """
+    items = list(items)
+    for code, name, rate, min_base, max_base in items:
+        cursor.execute('''
+            SELECT MAX(start_period) FROM insurance_rates WHERE region = ? AND code = ?
+        ''', (region, code))
+        latest = cursor.fetchone()[0]
+        if latest is not None and latest >= start_period:
+            raise ValueError(f'{region} {code} 已有 {format_period(latest)} 起生效的版本')
+        cursor.execute('''
+            UPDATE insurance_rates SET end_period = ?
+            WHERE region = ? AND code = ? AND (end_period IS NULL OR end_period >= ?)
+        ''', (start_period - 1, region, code, start_period))
+    cursor.executemany('''
+        INSERT INTO insurance_rates
+        (region, code, name, rate, min_base, max_base, start_period, end_period)
+        VALUES (?, ?, ?, ?, ?, ?, ?, NULL)
+    ''', [(region, *item, start_period) for item in items])
+
+
+def seed_rates(cursor, config=SOCIAL_INSURANCE_CONFIG, region=DEFAULT_REGION):
+    """费率表为空时按 config.py 登记一个覆盖全部历史的版本"""
+    cursor.execute("SELECT COUNT(*) FROM insurance_rates")
+    if cursor.fetchone()[0] == 0:
+        add_rate_version(cursor, 0, config_items(config), region)
+
+
+def ensure_table(conn):
+    """只建立并初始化 insurance_rates 表，用于只需要读取费率、不承载 expense 表结构的数据库（如 employee.db）"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN")
+        cursor.execute(CREATE_RATES_SQL)
+        seed_rates(cursor)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+class RateStore:
+    """一个数据库的费率区间索引"""
+
+    def __init__(self):
+        self._segments = {}   # region -> (边界月序号列表, 每段的RateTable或None)
+        self._memo = {}       # (region, period) -> RateTable
+        self._lock = threading.Lock()
+
+    def _load_region(self, conn, region):
+        rows = conn.execute(_SELECT_RATES_SQL, (region,)).fetchall()
+        order = {}
+        for row in rows:
+            order.setdefault(row[1], len(order))
+        boundaries = sorted({row[6] for row in rows}
+                            | {row[7] + 1 for row in rows if row[7] is not None})
+        tables = []
+        for boundary in boundaries:
+            active = sorted((row for row in rows
+                             if row[6] <= boundary and (row[7] is None or row[7] >= boundary)),
+                            key=lambda row: order[row[1]])
+            tables.append(RateTable.from_items(row[1:6] for row in active) if active else None)
+        return boundaries, tables
+
+    def segments(self, conn, region=DEFAULT_REGION):
+        """返回 (边界列表, RateTable列表)，第i段覆盖 [边界i, 边界i+1)"""
+        with self._lock:
+            if region not in self._segments:
+                self._segments[region] = self._load_region(conn, region)
+            return self._segments[region]
+
+    def resolve(self, conn, period, region=DEFAULT_REGION):
+        """返回 period 适用的 RateTable，没有生效费率时抛出ValueError"""
+        key = (region, period)
+        table = self._memo.get(key)
+        if table is not None:
+            return table
+        boundaries, tables = self.segments(conn, region)
+        index = bisect.bisect_right(boundaries, period) - 1
+        if index < 0 or tables[index] is None:
+            raise ValueError(f'未找到 {region} {format_period(period)} 适用的缴费费率')
+        with self._lock:
+            self._memo[key] = tables[index]
+        return tables[index]
+
+    def segment_index(self, conn, periods, region=DEFAULT_REGION):
+        """整列月序号 -> 区间段下标（无生效费率的为 -1），与 segments() 的顺序对应"""
+        boundaries, tables = self.segments(conn, region)
+        index = np.searchsorted(np.asarray(boundaries), np.asarray(periods), side='right') - 1
+        missing = np.array([table is None for table in tables] + [True])
+        index[missing[index]] = -1
+        return index
+
+    def clear(self):
+        with self._lock:
+            self._segments.clear()
+            self._memo.clear()
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def _database_path(conn):
+    return conn.execute("PRAGMA database_list").fetchone()[2]
+
+
+def get_rate_store(conn):
+    """返回连接所属数据库的 RateStore（按数据库文件缓存）"""
+    path = _database_path(conn)
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = RateStore()
+        return store
+
+
+def invalidate_rates(conn=None):
+    """费率表变更后清空缓存的区间索引；不传连接时清空全部数据库的缓存"""
+    with _stores_lock:
+        stores = list(_stores.values()) if conn is None else [_stores.get(_database_path(conn))]
+    for store in stores:
+        if store is not None:
+            store.clear()
+
+
+def resolve_rates(conn, period, region=DEFAULT_REGION):
+    """返回 period 适用的 RateTable"""
+    return get_rate_store(conn).resolve(conn, period, region)
+
+
+def parse_month(spec):
+    """'2024-07' -> 月序号；只接受单个月份"""
+    period_range = parse_range(str(spec))
+    if period_range.months != 1:
+        raise ValueError(f'需要单个月份: {spec}')
+    return period_range.start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='缴费费率版本查看与登记')
+    parser.add_argument('db', nargs='?', default='Cluster_Expense.db')
+    parser.add_argument('--region', default=DEFAULT_REGION)
+    parser.add_argument('--month', help='显示该月份适用的费率，如 2024-07')
+    parser.add_argument('--add-from-config', metavar='MONTH',
+                        help='把 config.py 当前值登记为从该月份起生效的新版本')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        ensure_table(conn)
+        if args.add_from_config:
+            add_rate_version(conn.cursor(), parse_month(args.add_from_config),
+                             config_items(), args.region)
+            conn.commit()
+            print(f"已登记 {args.region} {args.add_from_config} 起生效的费率")
+
+        if args.month:
+            table = resolve_rates(conn, parse_month(args.month), args.region)
+            print(f"{args.region} {args.month} 适用费率:")
+            for i, code in enumerate(table.codes):
+                print(f"  {code:>4} {table.names[i]}: 费率 {table.rates[i]}, "
+                      f"基数 {table.min_base[i]:g} - {table.max_base[i]:g}")
+        else:
+            boundaries, tables = get_rate_store(conn).segments(conn, args.region)
+            for i, (start, table) in enumerate(zip(boundaries, tables)):
+                end = format_period(boundaries[i + 1] - 1) if i + 1 < len(boundaries) else '至今'
+                codes = ', '.join(table.codes) if table is not None else '无'
+                begin = format_period(start) if start > 0 else '最早'
+                print(f"{begin} ~ {end}: {codes}")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
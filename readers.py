@@ -0,0 +1,273 @@
+"""表格文件读取
+
+所有导入路径（/upload、/preview_excel、ExcelHandler、Convert.py）统一经这里读取：
+- Excel 按可用性选择最快的引擎：装有 python-calamine 时用 calamine，
+  否则直接用 openpyxl 只读模式逐行取值（openpyxl-ro），跳过 pandas 的逐单元格转换
+- 只解析需要的工作表和列（usecols）
+- 员工ID列按字符串读取，'00017' 这类补零ID不会被转成数字
+- CSV 与 Parquet 与 Excel 同等支持，按扩展名或文件头识别格式
+
+用法: python readers.py [文件] [--sheet Sheet1] [--engine openpyxl-ro]  查看可用引擎和读取结果
+"""
+import argparse
+import importlib.util
+import io
+import os
+import time
+import numpy as np
+import pandas as pd
+import profiling
+
+# 按速度从快到慢；openpyxl 为 pandas 默认的 openpyxl 读取方式
+EXCEL_ENGINES = ['calamine', 'openpyxl-ro', 'openpyxl']
+_ENGINE_MODULES = {
+    'calamine': 'python_calamine',
+    'openpyxl-ro': 'openpyxl',
+    'openpyxl': 'openpyxl'
+}
+
+FORMAT_EXTENSIONS = {
+    'excel': ('.xlsx', '.xlsm'),
+    'csv': ('.csv',),
+    'parquet': ('.parquet', '.pq')
+}
+UPLOAD_EXTENSIONS = tuple(ext for exts in FORMAT_EXTENSIONS.values() for ext in exts)
+
+# 按字符串读取的员工ID列
+ID_COLUMNS = ('emp_id', '员工ID')
+
+
+def _has_module(name):
+    return importlib.util.find_spec(name) is not None
+
+
+def available_engines():
+    """当前环境可用的 Excel 引擎（按速度排序）"""
+    return [engine for engine in EXCEL_ENGINES if _has_module(_ENGINE_MODULES[engine])]
+
+
+def excel_engine(engine=None):
+    """返回要使用的 Excel 引擎；engine 为 None 时取最快的可用引擎"""
+    if engine is None:
+        engines = available_engines()
+        if not engines:
+            raise ImportError('读取Excel需要安装 python-calamine 或 openpyxl')
+        return engines[0]
+    if engine not in EXCEL_ENGINES:
+        raise ValueError(f"未知的Excel引擎: {engine}（可选: {', '.join(EXCEL_ENGINES)}）")
+    if not _has_module(_ENGINE_MODULES[engine]):
+        raise ImportError(f'Excel引擎 {engine} 需要安装 {_ENGINE_MODULES[engine]}')
+    return engine
+
+
+def is_supported_upload(filename):
+    return filename.lower().endswith(UPLOAD_EXTENSIONS)
+
+
+def detect_format(source, filename=None):
+    """识别文件格式：'excel' / 'csv' / 'parquet'
+
+    优先按文件名（或路径）扩展名，否则按文件头：PK 为 xlsx（zip），PAR1 为 Parquet，其余按CSV。
+    """
+    name = filename or (source if isinstance(source, (str, os.PathLike)) else None)
+    if name is not None:
+        ext = os.path.splitext(str(name))[1].lower()
+        for file_format, extensions in FORMAT_EXTENSIONS.items():
+            if ext in extensions:
+                return file_format
+    if isinstance(source, (bytes, bytearray)):
+        head = bytes(source[:4])
+    elif isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            head = f.read(4)
+    else:
+        position = source.tell()
+        head = source.read(4)
+        source.seek(position)
+    if head.startswith(b'PK'):
+        return 'excel'
+    if head == b'PAR1':
+        return 'parquet'
+    return 'csv'
+
+
+def _open(source):
+    return io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+
+
+def _usecols(usecols):
+    if usecols is None:
+        return None
+    wanted = set(usecols)
+    return lambda col: col in wanted
+
+
+def _id_dtype(id_columns):
+    return {col: str for col in id_columns}
+
+
+def _id_to_str(value):
+    """员工ID转为字符串：空值为 None，整数值的浮点（17.0）转为 '17'"""
+    if value is None or value is pd.NA or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() else str(value)
+    return str(value)
+
+
+def _infer_numeric(series):
+    """与 pandas 读取结果一致：整列为空按浮点 NaN，整列可转为数字的文本列转为数值，其余列空值为 NaN"""
+    if series.isna().all():
+        return pd.Series(np.nan, index=series.index)
+    try:
+        return pd.to_numeric(series)
+    except (ValueError, TypeError):
+        return series.where(series.notna(), np.nan)
+
+
+def _is_empty(value):
+    return value is None or value == ''
+
+
+def _header_names(header, width):
+    """与 pandas 读取结果一致的列名，返回 (列名, 原表头)
+
+    空表头为 'Unnamed: {序号}'；重复表头依次加 '.1'、'.2'（跳过已有的列名，有名称的列优先）。
+    """
+    original = [header[i] if i < len(header) and not _is_empty(header[i]) else None
+                for i in range(width)]
+    names = [col if col is not None else f'Unnamed: {i}' for i, col in enumerate(original)]
+    unnamed = [i for i, col in enumerate(original) if col is None]
+    counts = {}
+    for i in [i for i, col in enumerate(original) if col is not None] + unnamed:
+        col = old = names[i]
+        count = counts.get(col, 0)
+        while count > 0:
+            counts[old] = count + 1
+            col = f'{old}.{count}'
+            count = count + 1 if col in names else counts.get(col, 0)
+        names[i] = col
+        counts[col] = count + 1
+    return names, original
+
+
+def _read_openpyxl_ro(source, sheet_names, usecols, id_columns):
+    """openpyxl 只读模式逐行取值，按表头选列后一次构造 DataFrame"""
+    from openpyxl import load_workbook
+
+    wanted = set(usecols) if usecols is not None else None
+    book = load_workbook(source, read_only=True, data_only=True, keep_links=False)
+    try:
+        frames = {}
+        for name in sheet_names:
+            if isinstance(name, int):
+                if name >= len(book.worksheets):
+                    continue
+                sheet = book.worksheets[name]
+            elif name in book.sheetnames:
+                sheet = book[name]
+            else:
+                continue
+            rows = sheet.iter_rows(values_only=True)
+            header = next(rows, ())
+            # 与 pandas 读取结果一致：列数取所有行（含表头）最后一个非空单元格的位置；
+            # 去掉末尾的空行，中间的空行保留为全空行
+            width = max((i + 1 for i, value in enumerate(header) if not _is_empty(value)), default=0)
+            data = []
+            last = 0
+            for row in rows:
+                used = max((i + 1 for i, value in enumerate(row) if not _is_empty(value)), default=0)
+                data.append(row if used else ())
+                if used:
+                    width = max(width, used)
+                    last = len(data)
+            del data[last:]
+            names, original = _header_names(header, width)
+            keep = [i for i, col in enumerate(names) if wanted is None or col in wanted]
+            data = [[row[i] if i < len(row) and row[i] != '' else None for i in keep]
+                    for row in data]
+            df = pd.DataFrame(data, columns=[names[i] for i in keep])
+            for i, col in zip(keep, df.columns):
+                # 重复的员工ID列（emp_id.1）同样按字符串读取
+                if original[i] in id_columns:
+                    df[col] = df[col].map(_id_to_str).astype(object)
+                elif df[col].dtype == object or pd.api.types.is_string_dtype(df[col]):
+                    df[col] = _infer_numeric(df[col])
+            frames[name] = df
+        return frames
+    finally:
+        book.close()
+
+
+def read_sheets(source, sheet_names, usecols=None, engine=None, id_columns=ID_COLUMNS):
+    """读取 Excel 工作簿中的多个工作表（只打开一次文件），返回 {工作表名: DataFrame}
+
+    不存在的工作表不出现在结果中；sheet_names 可以是名称或从0开始的序号。
+    """
+    engine = excel_engine(engine)
+    source = _open(source)
+    with profiling.span('excel', f'read:{engine}') as span:
+        if engine == 'openpyxl-ro':
+            frames = _read_openpyxl_ro(source, sheet_names, usecols, id_columns)
+        else:
+            with pd.ExcelFile(source, engine=engine) as book:
+                existing = [name for name in sheet_names
+                            if (isinstance(name, int) and name < len(book.sheet_names))
+                            or name in book.sheet_names]
+                frames = {name: book.parse(name, usecols=_usecols(usecols),
+                                           dtype=_id_dtype(id_columns))
+                          for name in existing}
+        span['rows'] = sum(len(df) for df in frames.values())
+    return frames
+
+
+def read_table(source, sheet_name=0, usecols=None, engine=None, filename=None,
+               id_columns=ID_COLUMNS):
+    """读取一个表格（Excel 工作表 / CSV / Parquet）为 DataFrame
+
+    source: 文件路径、bytes 或文件对象；filename 用于识别 bytes/文件对象 的格式。
+    """
+    file_format = detect_format(source, filename)
+    if file_format == 'csv':
+        with profiling.span('excel', 'read:csv') as span:
+            df = pd.read_csv(_open(source), usecols=_usecols(usecols), dtype=_id_dtype(id_columns))
+            span['rows'] = len(df)
+        return df
+    if file_format == 'parquet':
+        if not (_has_module('pyarrow') or _has_module('fastparquet')):
+            raise ImportError('读取Parquet需要安装 pyarrow 或 fastparquet')
+        with profiling.span('excel', 'read:parquet') as span:
+            df = pd.read_parquet(_open(source))
+            span['rows'] = len(df)
+        if usecols is not None:
+            df = df[[col for col in df.columns if col in set(usecols)]]
+        # 与 Excel 读取一致：空值保持为空，整数值的浮点ID（含空值的ID列为浮点）转为 '17'
+        for col in id_columns:
+            if col in df.columns:
+                df[col] = df[col].map(_id_to_str).astype(object)
+        return df
+
+    frames = read_sheets(source, [sheet_name], usecols, engine, id_columns)
+    if sheet_name not in frames:
+        raise ValueError(f'工作表不存在: {sheet_name}')
+    return frames[sheet_name]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='读取表格文件并显示使用的引擎和耗时')
+    parser.add_argument('file', nargs='?', default='20241125.xlsx')
+    parser.add_argument('--sheet', default=0, help='工作表名称或序号，默认第一个')
+    parser.add_argument('--engine', choices=EXCEL_ENGINES, help='Excel引擎，默认自动选择')
+    args = parser.parse_args()
+
+    sheet = int(args.sheet) if str(args.sheet).isdigit() else args.sheet
+    print(f"可用Excel引擎: {', '.join(available_engines()) or '无'}")
+    started = time.perf_counter()
+    df = read_table(args.file, sheet_name=sheet, engine=args.engine)
+    print(f"{args.file} [{detect_format(args.file)}] 引擎 {excel_engine(args.engine)}: "
+          f"{len(df)} 行 {len(df.columns)} 列, 耗时 {time.perf_counter() - started:.3f} 秒")
+    print(df.head())
+
+
+if __name__ == '__main__':
+    main()
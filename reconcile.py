@@ -0,0 +1,180 @@
+"""缴费对账：按费率表重算应缴金额，与 expense 中导入的金额比对
+
+对区间内每一行按 SAL 和适用费率（rates.RateStore）重算各险种金额，
+行按费率区间段分组，每组一次矩阵运算（contributions.compute_contributions），
+不逐行解析费率、不逐行计算。差额绝对值超过容差的记为差异。
+
+费率代码与 expense 列的对应见 RECONCILE_COLUMNS；MED2（大病医疗，固定金额）
+没有按基数计算的费率，不参与对账。
+
+用法: python reconcile.py [数据库路径] [--range 2024] [--tolerance 0.01] [--region 西安]
+"""
+import argparse
+import sqlite3
+import numpy as np
+import pandas as pd
+from contributions import compute_contributions
+from periods import format_period, from_period, parse_range
+from rates import DEFAULT_REGION, get_rate_store
+
+# 费率代码 -> expense 列
+RECONCILE_COLUMNS = {
+    'PEN': 'PEN',
+    'MED': 'MED1',
+    'UEM': 'UEM',
+    'INJ': 'INJ',
+    'HF': 'HF',
+    'UF': 'UF'
+}
+
+DEFAULT_TOLERANCE = 0.01
+
+_SELECT_SQL = '''
+    SELECT emp_id, year, month, SAL, {columns}
+    FROM expense
+    {where}
+    ORDER BY year, month, emp_id
+'''
+
+
+def load_expense(conn, period_range=None):
+    """读取区间内（None 为全部）的工资和待对账金额列"""
+    where, params = '', ()
+    if period_range is not None:
+        where = 'WHERE year BETWEEN ? AND ? AND year * 12 + month - 1 BETWEEN ? AND ?'
+        params = (from_period(period_range.start)[0], from_period(period_range.end)[0],
+                  period_range.start, period_range.end)
+    sql = _SELECT_SQL.format(columns=', '.join(RECONCILE_COLUMNS.values()), where=where)
+    cursor = conn.execute(sql, params)
+    columns = [desc[0] for desc in cursor.description]
+    return pd.DataFrame.from_records(cursor.fetchall(), columns=columns)
+
+
+def expected_amounts(conn, df, region=DEFAULT_REGION):
+    """按各行所属月份的费率重算应缴金额
+
+    返回 (expected, has_rates)：expected 为 (行数, 险种数) 矩阵，列顺序同 RECONCILE_COLUMNS，
+    没有生效费率的行或费率表中缺少的险种为 NaN；has_rates 标记有生效费率的行。
+    """
+    codes = list(RECONCILE_COLUMNS)
+    expected = np.full((len(df), len(codes)), np.nan)
+    if df.empty:
+        return expected, np.zeros(0, dtype=bool)
+
+    store = get_rate_store(conn)
+    _, tables = store.segments(conn, region)
+    periods = df['year'].to_numpy(dtype=np.int64) * 12 + df['month'].to_numpy(dtype=np.int64) - 1
+    segment = store.segment_index(conn, periods, region)
+    salaries = df['SAL'].to_numpy(dtype=np.float64)
+
+    for index in np.unique(segment[segment >= 0]):
+        table = tables[index]
+        rows = segment == index
+        _, amount = compute_contributions(salaries[rows], table)
+        table_codes = list(table.codes)
+        for position, code in enumerate(codes):
+            if code in table_codes:
+                expected[rows, position] = amount[:, table_codes.index(code)]
+    return expected, segment >= 0
+
+
+def reconcile(conn, period_range=None, tolerance=DEFAULT_TOLERANCE, region=DEFAULT_REGION,
+              limit=None):
+    """对账区间内（None 为全部）的缴费金额
+
+    返回：
+    {'range', 'region', 'tolerance', 'rows', 'missing_rates', 'mismatches',
+     'codes': {费率代码: {'column', 'expected', 'actual', 'variance', 'mismatches'}},
+     'employees': {'emp_id': [...], 'mismatches': [...], 'variance': [...]}  按差额绝对值降序,
+     'details': {'emp_id', 'period', 'code', 'actual', 'expected', 'variance': [...]}  至多limit条}
+    """
+    df = load_expense(conn, period_range)
+    codes = list(RECONCILE_COLUMNS)
+    expected, has_rates = expected_amounts(conn, df, region)
+    actual = df[list(RECONCILE_COLUMNS.values())].to_numpy(dtype=np.float64)
+    variance = np.round(actual - expected, 2)
+    flagged = np.abs(np.nan_to_num(variance)) > tolerance + 1e-9
+
+    checked = ~np.isnan(expected)
+    code_totals = {
+        code: {
+            'column': RECONCILE_COLUMNS[code],
+            'expected': round(float(expected[checked[:, i], i].sum()), 2),
+            'actual': round(float(actual[checked[:, i], i].sum()), 2),
+            'variance': round(float(variance[checked[:, i], i].sum()), 2),
+            'mismatches': int(flagged[:, i].sum())
+        }
+        for i, code in enumerate(codes)
+    }
+
+    row_variance = np.where(flagged, variance, 0.0)
+    by_employee = pd.DataFrame({
+        'emp_id': df['emp_id'].to_numpy(),
+        'mismatches': flagged.sum(axis=1),
+        'variance': row_variance.sum(axis=1),
+        'abs_variance': np.abs(row_variance).sum(axis=1)
+    }).groupby('emp_id', sort=False).sum()
+    by_employee = by_employee[by_employee['mismatches'] > 0].sort_values(
+        'abs_variance', ascending=False, kind='stable')
+
+    row_index, code_index = np.nonzero(flagged)
+    order = np.argsort(-np.abs(variance[row_index, code_index]), kind='stable')[:limit]
+    row_index, code_index = row_index[order], code_index[order]
+    periods = df['year'].to_numpy(dtype=np.int64) * 12 + df['month'].to_numpy(dtype=np.int64) - 1
+
+    return {
+        'range': period_range.label if period_range is not None else 'all',
+        'region': region,
+        'tolerance': tolerance,
+        'rows': len(df),
+        'missing_rates': int((~has_rates).sum()),
+        'mismatches': int(flagged.sum()),
+        'codes': code_totals,
+        'employees': {
+            'emp_id': by_employee.index.tolist(),
+            'mismatches': by_employee['mismatches'].astype(int).tolist(),
+            'variance': by_employee['variance'].round(2).tolist()
+        },
+        'details': {
+            'emp_id': df['emp_id'].to_numpy()[row_index].tolist(),
+            'period': [format_period(int(p)) for p in periods[row_index]],
+            'code': [codes[i] for i in code_index],
+            'actual': actual[row_index, code_index].tolist(),
+            'expected': expected[row_index, code_index].tolist(),
+            'variance': variance[row_index, code_index].tolist()
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='按费率表重算缴费并与expense对账')
+    parser.add_argument('db', nargs='?', default='Cluster_Expense.db')
+    parser.add_argument('--range', help='期间区间，如 2024、2024Q1、2024-01:2024-06，默认全部')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--region', default=DEFAULT_REGION)
+    parser.add_argument('--limit', type=int, default=20, help='显示的差异明细条数')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        period_range = parse_range(args.range) if args.range else None
+        result = reconcile(conn, period_range, args.tolerance, args.region, args.limit)
+    finally:
+        conn.close()
+
+    print(f"对账区间 {result['range']}（{result['region']}，容差 {result['tolerance']}）: "
+          f"{result['rows']} 行, 差异 {result['mismatches']} 项, "
+          f"无适用费率 {result['missing_rates']} 行")
+    for code, totals in result['codes'].items():
+        print(f"  {code:>4} -> {totals['column']:<5} 应缴 {totals['expected']:>14,.2f}  "
+              f"实缴 {totals['actual']:>14,.2f}  差额 {totals['variance']:>12,.2f}  "
+              f"差异 {totals['mismatches']} 项")
+    details = result['details']
+    for i in range(len(details['emp_id'])):
+        print(f"  {details['emp_id'][i]} {details['period'][i]} {details['code'][i]:>4}: "
+              f"实缴 {details['actual'][i]:.2f} 应缴 {details['expected'][i]:.2f} "
+              f"差额 {details['variance'][i]:+.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""把 Sal 工作表的月工资合并进 Sheet1
+
+Sal 为宽表（emp_id + 1..12 月列），Sheet1 为 (emp_id, year, month) 明细。
+宽表先 melt 成 (emp_id, month, salary) 长表，再按 (emp_id, month) 一次外连接：
+- 两边都有的行用 Sal 中非0工资覆盖 Sheet1 的工资列
+- 只在 Sal 中出现的 (emp_id, month) 追加为新行，其余金额列为0
+- 最后删除工资为0的行
+行顺序与原逐行实现一致：Sheet1 原有行在前，追加行按 Sal 中员工、月份顺序在后。
+"""
+import time
+import numpy as np
+import pandas as pd
+import profiling
+from readers import read_sheets
+
+MERGE_KEY = ['emp_id', 'month']
+DEFAULT_SALARY_COLUMN = 'SAL'
+
+
+def melt_salary(sal_df):
+    """Sal 宽表 -> (emp_id, month, salary) 长表，只保留非0工资
+
+    同一员工在 Sal 中出现多行时，同月以最后一行为准。
+    """
+    month_columns = [col for col in sal_df.columns if col != 'emp_id']
+    long_df = sal_df.melt(id_vars='emp_id', value_vars=month_columns,
+                          var_name='month', value_name='salary')
+    long_df['month'] = long_df['month'].astype(int)
+    long_df['salary'] = long_df['salary'].fillna(0)
+    # melt 按列展开，恢复为按员工行、再按月份的顺序
+    long_df['_row'] = np.tile(np.arange(len(sal_df)), len(month_columns))
+    long_df = long_df[long_df['salary'] != 0]
+    long_df = long_df.drop_duplicates(MERGE_KEY, keep='last')
+    first_row = long_df.groupby('emp_id', sort=False)['_row'].transform('min')
+    long_df = long_df.assign(_first=first_row).sort_values(['_first', 'month'], kind='stable')
+    return long_df.drop(columns=['_row', '_first']).reset_index(drop=True)
+
+
+def _infer_year(sheet_df):
+    if 'year' not in sheet_df.columns:
+        return None
+    years = pd.unique(sheet_df['year'][sheet_df['year'] != 0])
+    return int(years[0]) if len(years) == 1 else None
+
+
+def merge_salary(sheet_df, sal_df, salary_column=DEFAULT_SALARY_COLUMN, year=None):
+    """把 Sal 宽表的工资合并进 Sheet1 明细
+
+    year: 追加行的年份；不传时取 Sheet1 中唯一的年份（有多个年份时为0）。
+    返回 (merged_df, stats)，stats 为 {'rows_filled', 'rows_appended', 'rows_dropped'}。
+    """
+    sheet = sheet_df.fillna(0)
+    if salary_column not in sheet.columns:
+        sheet[salary_column] = 0
+    sheet['month'] = sheet['month'].astype(int)
+    if year is None:
+        year = _infer_year(sheet)
+    dtypes = sheet.dtypes
+
+    long_df = melt_salary(sal_df.fillna(0)).rename(columns={'salary': '_salary'})
+    long_df['_order'] = np.arange(len(sheet), len(sheet) + len(long_df))
+    merged = sheet.assign(_order=np.arange(len(sheet))).merge(
+        long_df, on=MERGE_KEY, how='outer', indicator=True, suffixes=('', '_new'))
+
+    matched = merged['_salary'].notna()
+    appended = (merged['_merge'] == 'right_only').to_numpy()
+    merged[salary_column] = merged['_salary'].where(matched, merged[salary_column])
+    merged['_order'] = merged['_order'].where(~appended, merged['_order_new'])
+    if year is not None and 'year' in merged.columns:
+        merged.loc[appended, 'year'] = year
+
+    merged = merged.sort_values('_order', kind='stable')
+    merged = merged.drop(columns=['_salary', '_order', '_order_new', '_merge']).fillna(0)
+    merged = merged.astype({col: dtype for col, dtype in dtypes.items()
+                            if col != salary_column and col in merged.columns},
+                           errors='ignore')
+
+    keep = (merged[salary_column] != 0).to_numpy()
+    stats = {
+        'rows_filled': int((matched.to_numpy() & ~appended).sum()),
+        'rows_appended': int(appended.sum()),
+        'rows_dropped': int((~keep).sum())
+    }
+    return merged[keep].reset_index(drop=True), stats
+
+
+def read_merged_sheet(file_path, salary_column=DEFAULT_SALARY_COLUMN):
+    """读取工作簿的 Sheet1；存在 Sal 工作表时先把工资合并进去（供导入前调用）"""
+    sheets = read_sheets(file_path, ['Sheet1', 'Sal'])
+    if 'Sal' not in sheets:
+        return sheets['Sheet1']
+    merged, _ = merge_salary(sheets['Sheet1'], sheets['Sal'], salary_column)
+    return merged
+
+
+def merge_workbook(file_path, salary_column=DEFAULT_SALARY_COLUMN, output=None):
+    """合并工作簿中的 Sal 与 Sheet1，写回 output（默认原文件）的 Sheet1，返回统计信息"""
+    started = time.perf_counter()
+    # 写回Excel，员工ID保持原来的单元格类型
+    sheets = read_sheets(file_path, ['Sheet1', 'Sal'], id_columns=())
+    merged, stats = merge_salary(sheets['Sheet1'], sheets['Sal'], salary_column)
+
+    output = output or file_path
+    with profiling.span('excel', 'write:openpyxl') as span:
+        if output == file_path:
+            with pd.ExcelWriter(output, mode='a', if_sheet_exists='replace') as writer:
+                merged.to_excel(writer, sheet_name='Sheet1', index=False)
+        else:
+            merged.to_excel(output, sheet_name='Sheet1', index=False)
+        span['rows'] = len(merged)
+
+    stats['rows'] = len(merged)
+    stats['seconds'] = round(time.perf_counter() - started, 3)
+    return stats
@@ -0,0 +1,166 @@
+"""月度汇总表 monthly_summary 的增量维护
+
+首页的月度汇总直接读取 monthly_summary，不再每次对 expense 全量 SUM。
+导入写入 expense 时，在同一事务内只重算本次涉及的 (year, month)。
+
+用法: python summary.py [数据库路径] [--rebuild]
+      默认只做一致性检查，--rebuild 按 expense 全量重建。
+"""
+import argparse
+import os
+import sqlite3
+from queries import MONTHLY_SUMMARY_SQL
+
+SUMMARY_COLUMNS = [
+    'total_salary',
+    'total_pension',
+    'total_medical',
+    'total_injury',
+    'total_unemployment',
+    'total_hf',
+    'total_union_fee',
+    'total_insurance',
+    'grand_total'
+]
+
+CREATE_SUMMARY_SQL = '''
+    CREATE TABLE IF NOT EXISTS monthly_summary (
+        year INTEGER NOT NULL,
+        month INTEGER NOT NULL,
+        row_count INTEGER NOT NULL,           -- 当月记录数
+        total_salary REAL NOT NULL,
+        total_pension REAL NOT NULL,
+        total_medical REAL NOT NULL,
+        total_injury REAL NOT NULL,
+        total_unemployment REAL NOT NULL,
+        total_hf REAL NOT NULL,
+        total_union_fee REAL NOT NULL,
+        total_insurance REAL NOT NULL,        -- 五险一金合计（不含工资、工会经费）
+        grand_total REAL NOT NULL,            -- 全部费用合计
+        PRIMARY KEY (year, month)
+    )
+'''
+
+# 与 queries.MONTHLY_SUMMARY_SQL 的聚合口径保持一致
+_INSERT_AGGREGATE_SQL = f'''
+    INSERT INTO monthly_summary (year, month, row_count, {', '.join(SUMMARY_COLUMNS)})
+    SELECT
+        year,
+        month,
+        COUNT(*),
+        ROUND(SUM(SAL), 2),
+        ROUND(SUM(PEN), 2),
+        ROUND(SUM(MED1 + MED2), 2),
+        ROUND(SUM(INJ), 2),
+        ROUND(SUM(UEM), 2),
+        ROUND(SUM(HF), 2),
+        ROUND(SUM(UF), 2),
+        ROUND(SUM(HF + PEN + UEM + MED1 + MED2 + INJ), 2),
+        ROUND(SUM(SAL + HF + PEN + UEM + MED1 + MED2 + INJ + UF), 2)
+    FROM expense
+'''
+
+
+def frame_periods(df):
+    """返回DataFrame中出现的 (year, month) 列表"""
+    periods = df[['year', 'month']].drop_duplicates()
+    return list(zip(periods['year'].tolist(), periods['month'].tolist()))
+
+
+def refresh_periods(cursor, periods):
+    """按 expense 重算指定月份的汇总行，返回重算的月份数
+
+    某月在 expense 中已无数据时，其汇总行会被删除。
+    """
+    periods = sorted({(int(year), int(month)) for year, month in periods})
+    if not periods:
+        return 0
+    cursor.executemany("DELETE FROM monthly_summary WHERE year = ? AND month = ?", periods)
+    cursor.executemany(_INSERT_AGGREGATE_SQL + '''
+        WHERE year = ? AND month = ?
+        GROUP BY year, month
+    ''', periods)
+    return len(periods)
+
+
+def rebuild_summary(cursor):
+    """按 expense 全量重建汇总表"""
+    cursor.execute("DELETE FROM monthly_summary")
+    cursor.execute(_INSERT_AGGREGATE_SQL + " GROUP BY year, month")
+
+
+def check_summary(conn, tolerance=0.005):
+    """对比汇总表与全量重算结果，返回不一致的月份
+
+    返回列表中每项为 {'year', 'month', 'column', 'stored', 'expected'}，
+    stored/expected 为 None 表示该月份只在一侧存在。一致时返回空列表。
+    """
+    columns = ['year', 'month'] + SUMMARY_COLUMNS
+    expected = {
+        (row[0], row[1]): row for row in conn.execute(MONTHLY_SUMMARY_SQL).fetchall()
+    }
+    stored = {
+        (row[0], row[1]): row for row in conn.execute(
+            f"SELECT {', '.join(columns)} FROM monthly_summary"
+        ).fetchall()
+    }
+
+    mismatches = []
+    for period in sorted(set(expected) | set(stored)):
+        if period not in stored or period not in expected:
+            mismatches.append({
+                'year': period[0],
+                'month': period[1],
+                'column': None,
+                'stored': None if period not in stored else 'present',
+                'expected': None if period not in expected else 'present'
+            })
+            continue
+        for index, column in enumerate(SUMMARY_COLUMNS, start=2):
+            stored_value = stored[period][index] or 0.0
+            expected_value = expected[period][index] or 0.0
+            if abs(stored_value - expected_value) > tolerance:
+                mismatches.append({
+                    'year': period[0],
+                    'month': period[1],
+                    'column': column,
+                    'stored': stored_value,
+                    'expected': expected_value
+                })
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description='月度汇总表一致性检查')
+    parser.add_argument('database', nargs='?', default='Cluster_Expense.db')
+    parser.add_argument('--rebuild', action='store_true', help='按expense全量重建汇总表')
+    args = parser.parse_args()
+
+    # migrations 导入本模块，在函数内导入避免循环导入
+    from migrations import LATEST_VERSION, get_schema_version
+
+    if not os.path.exists(args.database):
+        raise SystemExit(f'数据库不存在: {args.database}')
+    conn = sqlite3.connect(args.database)
+    try:
+        version = get_schema_version(conn)
+        if version < LATEST_VERSION:
+            raise SystemExit(f"表结构版本 {version} 低于当前版本 {LATEST_VERSION}，"
+                             f"请先执行 python migrations.py {args.database}")
+        if args.rebuild:
+            rebuild_summary(conn.cursor())
+            conn.commit()
+            print("汇总表已重建")
+        mismatches = check_summary(conn)
+        for item in mismatches:
+            print(f"{item['year']}-{item['month']:02d} {item['column'] or '月份缺失'}: "
+                  f"汇总表={item['stored']} 重算={item['expected']}")
+        if mismatches:
+            raise SystemExit(f"汇总表与expense不一致: {len(mismatches)} 处")
+        print("汇总表与expense一致")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""按文件内容哈希缓存解析后的工作簿
+
+同一个文件先 /preview_excel 再 /upload，或者重复上传，只解析一次：
+解析结果按内容 SHA-256 以 pickle 存放在缓存目录，超过容量时按最近使用时间淘汰。
+
+同时记录每个文件导入完成时的数据版本（query_cache.result_cache.data_version），
+重新上传已导入且之后数据没有变化的文件时可直接返回"无变化"。
+"""
+import hashlib
+import os
+import threading
+import uuid
+import pandas as pd
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_VARIANT = 'sheet0'
+
+
+def content_digest(data):
+    """文件内容的 SHA-256（十六进制）"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class WorkbookCache:
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._imported = {}   # digest -> 导入完成时的数据版本
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def configure(self, directory=None, max_bytes=None):
+        with self._lock:
+            if directory is not None:
+                self.directory = directory
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            self._evict()
+
+    def _path(self, digest, variant):
+        return os.path.join(self.directory, f'{digest}.{variant}.pkl')
+
+    def get(self, digest, variant=DEFAULT_VARIANT):
+        """返回缓存的 DataFrame，未命中返回 None"""
+        path = self._path(digest, variant)
+        try:
+            df = pd.read_pickle(path)
+            os.utime(path)   # 按访问时间淘汰
+        except FileNotFoundError:
+            df = None
+        except Exception:
+            # 写入中断等原因损坏的缓存文件直接丢弃
+            self._remove(path)
+            df = None
+        with self._lock:
+            if df is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return df
+
+    def put(self, digest, df, variant=DEFAULT_VARIANT):
+        path = self._path(digest, variant)
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._evict()
+
+    def get_or_parse(self, digest, parse, variant=DEFAULT_VARIANT):
+        """命中时返回缓存结果，否则调用 parse() 解析并缓存
+
+        返回的 DataFrame 是独立副本，调用方可以修改。
+        """
+        df = self.get(digest, variant)
+        if df is None:
+            df = parse()
+            self.put(digest, df, variant)
+        return df
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        if not os.path.isdir(self.directory):
+            return
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.pkl'):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(os.path.join(self.directory, name))
+            total -= size
+            self.evictions += 1
+
+    def mark_imported(self, digest, data_version):
+        """记录文件导入完成时的数据版本"""
+        with self._lock:
+            self._imported[digest] = data_version
+
+    def is_imported(self, digest, data_version):
+        """文件已导入，且之后数据没有任何变化"""
+        with self._lock:
+            return self._imported.get(digest) == data_version
+
+    def stats(self):
+        with self._lock:
+            entries, size = 0, 0
+            if os.path.isdir(self.directory):
+                for name in os.listdir(self.directory):
+                    if name.endswith('.pkl'):
+                        entries += 1
+                        size += os.path.getsize(os.path.join(self.directory, name))
+            return {
+                'entries': entries,
+                'bytes': size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+# 进程内共享的工作簿缓存，目录由 app.py 配置
+workbook_cache = WorkbookCache(os.path.join('uploads', 'parsed'))